@@ -1,33 +1,30 @@
 """SourceReader class for Cheetah's LegacyParser and CodeGenerator"""
+import array
+import bisect
 import re
+import sys
 
-EOLre = re.compile(r'[ \f\t]*(?:\r\n|\r|\n)')
+import _cheetah
+
+EOLre = re.compile(r'\r\n|\r|\n')
 EOLZre = re.compile(r'(?:\r\n|\r|\n|\Z)')
 
 
 WS_CHARS = ' \t'
 
 
-class SourceReader:
+class PySourceReaderCore:
+    """The position and scanning methods of `SourceReader`.
+
+    `_cheetah.SourceReaderCore` implements the same methods in C for the
+    parser's hot loop, this is the reference version (used on pypy).
+    """
+
     def __init__(self, src):
         self._src = src
-        self._srcLines = src.splitlines()
         self._breakPoint = len(self._src)
         self._pos = 0
 
-        # collect some meta-information
-        self._EOLs = []
-        pos = 0
-        while pos < len(self):
-            EOLmatch = EOLZre.search(src, pos)
-            self._EOLs.append(EOLmatch.start())
-            pos = EOLmatch.end()
-
-        self._BOLs = []
-        for pos in self._EOLs:
-            BOLpos = self.findBOL(pos)
-            self._BOLs.append(BOLpos)
-
     def src(self):
         return self._src
 
@@ -37,23 +34,6 @@ class SourceReader:
     def __getitem__(self, i):
         return self._src[i]
 
-    def lineNum(self, pos):
-        for i in range(len(self._BOLs)):
-            if pos >= self._BOLs[i] and pos <= self._EOLs[i]:
-                return i
-        raise AssertionError(f'unknown position: {pos}')
-
-    def getRowCol(self, pos=None):
-        if pos is None:
-            pos = self._pos
-        lineNum = self.lineNum(pos)
-        BOL = self._BOLs[lineNum]
-        return lineNum + 1, pos - BOL + 1
-
-    def getRowColLine(self):
-        row, col = self.getRowCol()
-        return row, col, self._srcLines[row - 1]
-
     def pos(self):
         return self._pos
 
@@ -158,3 +138,44 @@ class SourceReader:
             if not self.matchWhiteSpace():
                 break
         return self._src[start:self._pos]
+
+
+if '__pypy__' in sys.builtin_module_names:  # pragma: pypy cover
+    SourceReaderCore = PySourceReaderCore
+else:  # pragma: pypy no cover
+    SourceReaderCore = _cheetah.SourceReaderCore
+
+
+class SourceReader(SourceReaderCore):
+    def __init__(self, src):
+        super().__init__(src)
+        self._srcLines = src.splitlines()
+
+        # Line `i` spans `_BOLs[i]` to `_EOLs[i]` (the position of its line
+        # ending)
+        self._BOLs = array.array('q', (0,))
+        self._EOLs = array.array('q')
+        for match in EOLre.finditer(src):
+            self._EOLs.append(match.start())
+            self._BOLs.append(match.end())
+        if self._BOLs[-1] < len(src):
+            self._EOLs.append(len(src))
+        else:
+            self._BOLs.pop()
+
+    def lineNum(self, pos):
+        i = bisect.bisect_right(self._BOLs, pos) - 1
+        if i < 0 or pos > self._EOLs[i]:
+            raise AssertionError(f'unknown position: {pos}')
+        return i
+
+    def getRowCol(self, pos=None):
+        if pos is None:
+            pos = self.pos()
+        lineNum = self.lineNum(pos)
+        BOL = self._BOLs[lineNum]
+        return lineNum + 1, pos - BOL + 1
+
+    def getRowColLine(self):
+        row, col = self.getRowCol()
+        return row, col, self._srcLines[row - 1]
@@ -33,6 +33,7 @@ class Template:
             self,
             namespace=None,
             filter_fn=filters.markup_filter,
+            fragment_cache=None,
     ):
         """Instantiates an existing template.
 
@@ -40,6 +41,8 @@ class Template:
         :param filter_fn: Initial filter function.  A filter
             is a function which takes a single argument (the contents of a
             template variable) and may perform some output filtering.
+        :param fragment_cache: Cache for the `#cache` fragments, defaults to
+            `Cheetah.fragment_cache.DEFAULT_CACHE`.
         """
         if namespace:
             if (
@@ -68,6 +71,8 @@ class Template:
 
         self._CHEETAH__namespace = namespace or {}
         self._CHEETAH__currentFilter = filter_fn
+        # Resolved by the `#cache` code, see `Cheetah.fragment_cache`
+        self._CHEETAH__fragmentCache = fragment_cache
 
         self.transaction = None
 
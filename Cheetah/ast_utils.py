@@ -1,5 +1,11 @@
 import ast
 import collections
+import functools
+import operator
+
+
+# The same expressions, argspecs and imports recur across templates
+CACHE_SIZE = 4096
 
 
 def _to_top_level_name(name):
@@ -7,13 +13,14 @@ def _to_top_level_name(name):
     return (name.asname or name.name).partition('.')[0]
 
 
+@functools.lru_cache(maxsize=CACHE_SIZE)
 def get_imported_names(import_statement):
     ast_import = ast.parse(import_statement).body[0]
-    return [
+    return tuple(
         _to_top_level_name(name)
         for name in ast_import.names
         if _to_top_level_name(name) != '*'
-    ]
+    )
 
 
 class TargetsVisitor(ast.NodeVisitor):
@@ -55,13 +62,15 @@ class TopLevelVisitor(ast.NodeVisitor):
     visit_ExceptHandler = visit_ClassDef = visit_FunctionDef = _target_visit
 
 
+@functools.lru_cache(maxsize=CACHE_SIZE)
 def get_lvalues(expression):
     ast_obj = ast.parse(expression)
     visitor = TopLevelVisitor()
     visitor.visit(ast_obj)
-    return visitor.targets_visitor.lvalues
+    return tuple(visitor.targets_visitor.lvalues)
 
 
+@functools.lru_cache(maxsize=CACHE_SIZE)
 def get_argument_names(argspec):
     ast_obj = ast.parse(f'def _({argspec}): pass').body[0].args
     names = [name.arg for name in ast_obj.args]
@@ -80,4 +89,253 @@ def get_argument_names(argspec):
         raise SyntaxError(
             'Duplicate arguments: {}'.format(', '.join(duplicate_arguments)),
         )
-    return set(names)
+    return frozenset(names)
+
+
+IMPURE_NODES = (
+    ast.Global, ast.Nonlocal, ast.Yield, ast.YieldFrom, ast.Await,
+    ast.Import, ast.ImportFrom, ast.FunctionDef, ast.AsyncFunctionDef,
+    ast.ClassDef,
+)
+
+
+def is_pure_function(func, allowed_globals, allowed_self_attributes):
+    """Whether a method only reads its arguments, its own locals and
+    `allowed_globals`.  `self` may only be used to get one of
+    `allowed_self_attributes`.
+
+    :param ast.FunctionDef func: The method.
+    """
+    self_name = func.args.args[0].arg
+    local_names = {self_name}
+    allowed_self = set()
+    for node in ast.walk(func):
+        if node is not func and isinstance(node, IMPURE_NODES):
+            return False
+        elif isinstance(node, ast.arg):
+            local_names.add(node.arg)
+        elif isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            local_names.add(node.id)
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            local_names.add(node.name)
+        elif (
+                isinstance(node, ast.Attribute) and
+                isinstance(node.value, ast.Name) and
+                node.attr in allowed_self_attributes
+        ):
+            allowed_self.add(node.value)
+
+    readable_names = local_names | allowed_globals
+    for node in ast.walk(func):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
+            if node.id == self_name:
+                if node not in allowed_self:
+                    return False
+            elif node.id not in readable_names:
+                return False
+    return True
+
+
+class NotConstant(ValueError):
+    pass
+
+
+UNARY_OPS = {ast.Not: operator.not_, ast.USub: operator.neg, ast.UAdd: operator.pos}
+COMPARE_OPS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.Is: operator.is_,
+    ast.IsNot: operator.is_not,
+    ast.In: lambda a, b: a in b,
+    ast.NotIn: lambda a, b: a not in b,
+}
+
+
+def _constant_value(node):
+    if isinstance(node, ast.Constant):
+        return node.value
+    elif isinstance(node, ast.Tuple):
+        return tuple(_constant_value(elt) for elt in node.elts)
+    elif isinstance(node, ast.List):
+        return [_constant_value(elt) for elt in node.elts]
+    elif isinstance(node, ast.Set):
+        return frozenset(_constant_value(elt) for elt in node.elts)
+    elif isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPS:
+        return UNARY_OPS[type(node.op)](_constant_value(node.operand))
+    elif isinstance(node, ast.BoolOp):
+        # Short circuit like python does, the rest needn't be constant
+        for value_node in node.values:
+            value = _constant_value(value_node)
+            if bool(value) is isinstance(node.op, ast.Or):
+                break
+        return value
+    elif isinstance(node, ast.Compare):
+        left = _constant_value(node.left)
+        for op, comparator in zip(node.ops, node.comparators):
+            right = _constant_value(comparator)
+            # Identity of other objects isn't known until runtime
+            if (
+                    isinstance(op, (ast.Is, ast.IsNot)) and
+                    right is not None and
+                    not isinstance(right, bool)
+            ):
+                raise NotConstant(ast.dump(node))
+            if not COMPARE_OPS[type(op)](left, right):
+                return False
+            left = right
+        return True
+    elif isinstance(node, ast.IfExp):
+        if _constant_value(node.test):
+            return _constant_value(node.body)
+        else:
+            return _constant_value(node.orelse)
+    else:
+        raise NotConstant(ast.dump(node))
+
+
+def constant_value(expression):
+    """Evaluates an expression made only of literals, raises NotConstant
+    otherwise (or if evaluating it would raise).
+    """
+    if isinstance(expression, str):
+        expression = ast.parse(expression, mode='eval').body
+    try:
+        return _constant_value(expression)
+    except NotConstant:
+        raise
+    except Exception as e:
+        raise NotConstant(f'{type(e).__name__}: {e}')
+
+
+def _line_indentation(line):
+    return line[:len(line) - len(line.lstrip())]
+
+
+def _is_elif(lines, node):
+    return lines[node.lineno - 1].lstrip().startswith('elif')
+
+
+def _if_statements(tree, lines):
+    """Yields (node, is_elif, is_only_statement) for each `if` statement."""
+    for parent in ast.walk(tree):
+        for field, body in ast.iter_fields(parent):
+            if not isinstance(body, list):
+                continue
+            for node in body:
+                if isinstance(node, ast.If):
+                    is_elif = (
+                        isinstance(parent, ast.If) and
+                        field == 'orelse' and
+                        _is_elif(lines, node)
+                    )
+                    yield node, is_elif, len(body) == 1
+
+
+def _string_continuation_lines(tree):
+    ret = set()
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Constant, ast.JoinedStr)):
+            ret.update(range(node.lineno + 1, node.end_lineno + 1))
+    return ret
+
+
+def _dedent(lines, first_lineno, amount, string_lines):
+    prefix = ' ' * amount
+    return [
+        line[amount:]
+        if lineno not in string_lines and line.startswith(prefix) else
+        line
+        for lineno, line in enumerate(lines, first_lineno)
+    ]
+
+
+def _else_lineno(lines, node):
+    """Line number of the `else:` of an if statement, if it has one."""
+    if not node.orelse or _is_elif(lines, node.orelse[0]):
+        return None
+    else_lineno = node.body[-1].end_lineno + 1
+    while not lines[else_lineno - 1].lstrip().startswith('else'):
+        else_lineno += 1
+    return else_lineno
+
+
+def _is_foldable(lines, node):
+    # Only handle `if` statements whose suites start on their own line
+    else_lineno = _else_lineno(lines, node)
+    return (
+        node.body[0].lineno > node.test.end_lineno and
+        (else_lineno is None or node.orelse[0].lineno > else_lineno)
+    )
+
+
+def _fold_if(lines, node, is_elif, is_only_statement, value, string_lines):
+    """Returns the lines replacing lines node.lineno to node.end_lineno"""
+    indent = _line_indentation(lines[node.lineno - 1])
+    # Comments between the `if` line and the first statement go with the body
+    body_start = node.body[0].lineno
+    while (
+            body_start - 1 > node.test.end_lineno and
+            lines[body_start - 2].lstrip().startswith(('#', '\n'))
+    ):
+        body_start -= 1
+    body = lines[body_start - 1:node.body[-1].end_lineno]
+    end = node.end_lineno
+
+    has_elif = bool(node.orelse) and _is_elif(lines, node.orelse[0])
+    else_lineno = _else_lineno(lines, node)
+
+    if value and is_elif:
+        return [indent + 'else:\n', *body]
+    elif value:
+        amount = node.body[0].col_offset - len(indent)
+        return _dedent(body, body_start, amount, string_lines)
+    elif is_elif and has_elif:
+        return lines[node.orelse[0].lineno - 1:end]
+    elif is_elif and else_lineno is not None:
+        return lines[else_lineno - 1:end]
+    elif is_elif:
+        return []
+    elif has_elif:
+        elif_line = lines[node.orelse[0].lineno - 1]
+        return [
+            elif_line.replace('elif', 'if', 1),
+            *lines[node.orelse[0].lineno:end],
+        ]
+    elif else_lineno is not None:
+        amount = node.orelse[0].col_offset - len(indent)
+        return _dedent(
+            lines[else_lineno:end], else_lineno + 1, amount, string_lines,
+        )
+    elif is_only_statement:
+        return [indent + 'pass\n']
+    else:
+        return []
+
+
+def fold_constant_branches(source):
+    """Removes the dead branches of `if` / `elif` statements whose test is
+    constant.  This edits the text (rather than unparsing the ast) so the
+    comments of the generated code are kept.
+    """
+    while True:
+        tree = ast.parse(source)
+        lines = source.splitlines(True)
+        for node, is_elif, is_only_statement in _if_statements(tree, lines):
+            if not _is_foldable(lines, node):
+                continue
+            try:
+                value = bool(constant_value(node.test))
+            except NotConstant:
+                continue
+            lines[node.lineno - 1:node.end_lineno] = _fold_if(
+                lines, node, is_elif, is_only_statement, value,
+                _string_continuation_lines(tree),
+            )
+            source = ''.join(lines)
+            break
+        else:
+            return source
@@ -1,25 +1,167 @@
 import argparse
+import concurrent.futures
+import functools
+import json
 import os.path
+import pickle
+import py_compile
+import sys
+import traceback
 
+from Cheetah import template_finder
 from Cheetah.compile import compile_file
+from Cheetah.compile import default_target
+from Cheetah.compile import write_if_changed
+from Cheetah.dependencies import DependencyGraph
+from Cheetah.flatten import flatten_file
+from Cheetah.manifest import Manifest
+from Cheetah.manifest import template_key
+from Cheetah.watch import Dependencies
+from Cheetah.watch import get_watcher
+from Cheetah.watch import walk_templates
+
+
+BYTECODE_MODES = {
+    mode.name.lower().replace('_', '-'): mode
+    for mode in py_compile.PycInvalidationMode
+}
+
+
+class CompileError(ValueError):
+    pass
+
+
+def _compile(filename, flatten=False, **kwargs):
+    if flatten:
+        return flatten_file(filename, **kwargs)
+    else:
+        return compile_file(filename, **kwargs)
 
 
 def compile_template(filename, **kwargs):
     print(f'Compiling {filename}')
-    return compile_file(filename, **kwargs)
+    return _compile(filename, **kwargs)
+
+
+def _compile_in_worker(filename, **kwargs):
+    """Compiles a template in a worker process.  Exceptions are re-raised in
+    the parent process, those which can't be pickled as a `CompileError`.
+    """
+    try:
+        _compile(filename, **kwargs)
+    except Exception as e:
+        try:
+            pickle.dumps(e)
+        except Exception:
+            raise CompileError(f'{filename}: {type(e).__name__}: {e}')
+        raise
+
+
+def _compile_templates(filenames, jobs=1, **kwargs):
+    """Compiles templates, yielding each filename once it is compiled.
+
+    With more than one job the templates are compiled in a process pool, but
+    are still printed and yielded in order.  The first failure (in order) is
+    raised and the templates after it are abandoned.
+    """
+    if jobs == 1 or len(filenames) <= 1:
+        for filename in filenames:
+            compile_template(filename, **kwargs)
+            yield filename
+        return
+
+    jobs = jobs or os.cpu_count()
+    with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+        results = executor.map(
+            functools.partial(_compile_in_worker, **kwargs),
+            filenames,
+            chunksize=max(1, len(filenames) // (jobs * 8)),
+        )
+        for filename in filenames:
+            print(f'Compiling {filename}')
+            try:
+                next(results)
+            except BaseException:
+                executor.shutdown(cancel_futures=True)
+                raise
+            yield filename
+
+
+def _stale_templates(manifest, directory, filenames, extension, force, **kwargs):
+    """Yields (filename, key) for the templates in a directory which have to
+    be compiled.  Flattened templates also depend on their bases and are
+    always compiled.
+    """
+    for filename in sorted(filenames):
+        if filename.endswith(extension):
+            filename = os.path.join(directory, filename)
+            with open(filename, encoding='UTF-8') as f:
+                key = template_key(f.read(), **kwargs)
+            if (
+                    force or
+                    kwargs.get('flatten') or
+                    not manifest.is_fresh(
+                        filename,
+                        key,
+                        default_target(filename, kwargs.get('sourceless')),
+                    )
+            ):
+                yield filename, key
+
+
+def _compile_and_record(templates, jobs=1, **kwargs):
+    """Compiles templates, recording each compiled one in its manifest.
+
+    :param dict templates: filename => (manifest, key)
+    """
+    try:
+        for filename in _compile_templates(list(templates), jobs, **kwargs):
+            manifest, key = templates[filename]
+            manifest.record(filename, key)
+    finally:
+        for manifest in {manifest for manifest, _ in templates.values()}:
+            manifest.save()
+
+
+def _get_manifest(manifests, directory, manifest_filename):
+    """The manifest of a directory, all of them share `manifest_filename`
+    when it is set.
+
+    :param dict manifests: The manifests already read, by filename.
+    """
+    if manifest_filename is None:
+        manifest = Manifest(directory)
+    else:
+        manifest = Manifest(directory, manifest_filename)
+    return manifests.setdefault(manifest.filename, manifest)
 
 
 def _compile_files_in_directory(
         directory,
         filenames,
         extension='.tmpl',
+        force=False,
+        jobs=1,
+        manifest=None,
         **kwargs,
 ):
-    """Compiles files in a directory, returns whether there were any."""
-    for filename in filenames:
-        if filename.endswith(extension):
-            filename = os.path.join(directory, filename)
-            compile_template(filename, **kwargs)
+    """Compiles files in a directory, returns whether there were any.
+
+    Templates which haven't changed since they were last compiled are
+    skipped, unless `force` is set.
+
+    :param manifest: Where they're recorded, defaults to the directory's.
+    """
+    if manifest is None:
+        manifest = Manifest(directory)
+    stale = _stale_templates(
+        manifest, directory, filenames, extension, force, **kwargs,
+    )
+    _compile_and_record(
+        {filename: (manifest, key) for filename, key in stale},
+        jobs,
+        **kwargs,
+    )
 
     return any(filename.endswith(extension) for filename in filenames)
 
@@ -33,25 +175,173 @@ def _touch_init_if_not_exists(directory):
         open(init_py_file, 'a').close()
 
 
-def compile_directories(directories, extension='.tmpl', **kwargs):
+def compile_directories(
+        directories,
+        extension='.tmpl',
+        force=False,
+        jobs=1,
+        manifest_filename=None,
+        **kwargs,
+):
     """Compiles all templates in the given directories.  Touches __init__.py
     for each sub-package inside the directories to make the outputs importable.
 
+    Unchanged templates are skipped (see `Cheetah.manifest`), pass
+    `force=True` to recompile everything.
+
     :param tuple directories: Iterable of directories to iterate.
+    :param int jobs: Number of processes to compile with, `None` or 0 for
+        one per CPU.
+    :param manifest_filename: One manifest for all the directories, instead
+        of one in each of them.
     :param kwargs: additional arguments to pass to compiler.
     """
+    template_finder.cache_clear()
+    templates = {}
+    manifests = {}
     for directory in directories:
         for dirpath, _, filenames in os.walk(directory):
-            # Compile all the files
-            _compile_files_in_directory(
-                dirpath,
-                filenames,
-                extension=extension,
-                **kwargs,
-            )
+            manifest = _get_manifest(manifests, dirpath, manifest_filename)
+            if jobs == 1:
+                _compile_files_in_directory(
+                    dirpath, filenames, extension, force,
+                    manifest=manifest, **kwargs,
+                )
+            else:
+                stale = _stale_templates(
+                    manifest, dirpath, filenames, extension, force, **kwargs,
+                )
+                for filename, key in stale:
+                    templates[filename] = (manifest, key)
 
             _touch_init_if_not_exists(dirpath)
 
+    _compile_and_record(templates, jobs, **kwargs)
+
+
+def _templates(directories, files, extension):
+    for directory in directories:
+        for dirpath, _, filenames in os.walk(directory):
+            for filename in filenames:
+                if filename.endswith(extension):
+                    yield os.path.join(dirpath, filename)
+    yield from files
+
+
+def _escape_make(filename):
+    return filename.replace('$', '$$').replace(' ', '\\ ').replace('#', '\\#')
+
+
+def format_depfile(target, filenames):
+    """A make rule without a recipe, as written by `gcc -MD`."""
+    return '{}: {}\n'.format(
+        _escape_make(target),
+        ' \\\n  '.join(_escape_make(filename) for filename in filenames),
+    )
+
+
+def depfile_path(target):
+    """`foo/bar.py` => `foo/bar.d`"""
+    return os.path.splitext(target)[0] + '.d'
+
+
+def write_dependencies(
+        filenames,
+        depfiles=True,
+        json_filename=None,
+        sourceless=False,
+):
+    """Writes the dependencies of templates.
+
+    :param filenames: The templates.
+    :param bool depfiles: Write a depfile next to each compiled template.
+    :param json_filename: Write the graph there, as a JSON object mapping
+        each template to its compiled `target`, direct dependencies (see
+        `Cheetah.dependencies.template_dependencies`) and the `files` it
+        depends on, transitively.
+    :param bool sourceless: The templates are compiled to `.pyc` files.
+    """
+    graph = DependencyGraph()
+    ret = {}
+    for filename in sorted(filenames):
+        target = default_target(filename, sourceless)
+        files = graph.files(filename)
+        if depfiles:
+            write_if_changed(
+                depfile_path(target),
+                format_depfile(target, [os.path.normpath(filename), *files]),
+            )
+        ret[filename] = {
+            'target': target, **graph.dependencies(filename), 'files': files,
+        }
+    if json_filename is not None:
+        write_if_changed(
+            json_filename, json.dumps(ret, indent=2, sort_keys=True) + '\n',
+        )
+    return ret
+
+
+def _report_error(e):
+    sys.stderr.write(''.join(traceback.format_exception_only(type(e), e)))
+
+
+def _recompile(
+        filenames,
+        extension='.tmpl',
+        manifest_filename=None,
+        **kwargs,
+):
+    """Compiles the given templates if their output is stale."""
+    templates = {}
+    manifests = {}
+    for filename in filenames:
+        directory, basename = os.path.split(filename)
+        manifest = _get_manifest(manifests, directory, manifest_filename)
+        stale = _stale_templates(
+            manifest, directory, (basename,), extension, False, **kwargs,
+        )
+        for filename, key in stale:
+            templates[filename] = (manifest, key)
+
+    _compile_and_record(templates, **kwargs)
+
+
+def watch(directories, extension='.tmpl', watcher=None, **kwargs):
+    """Compiles the templates in the directories, then recompiles them (and
+    the templates depending on them) as they change.  Errors are reported
+    and don't stop watching.
+
+    Runs until the watcher stops, the default one (see
+    `Cheetah.watch.get_watcher`) never does.
+
+    :param kwargs: additional arguments to pass to the compiler.
+    """
+    if watcher is None:
+        watcher = get_watcher(directories, extension)
+    try:
+        try:
+            compile_directories(directories, extension=extension, **kwargs)
+        except Exception as e:
+            _report_error(e)
+        # recompiling a few templates in this (warm) process is faster
+        kwargs.pop('force', None)
+        kwargs.pop('jobs', None)
+        dependencies = Dependencies(walk_templates(directories, extension))
+        print('Watching for changes...', flush=True)
+        for changed in watcher.changes():
+            # templates may have been added or become partial templates
+            template_finder.cache_clear()
+            for filename in changed:
+                dependencies.update(filename)
+            try:
+                _recompile(
+                    dependencies.with_dependents(changed), extension, **kwargs,
+                )
+            except Exception as e:
+                _report_error(e)
+    finally:
+        watcher.close()
+
 
 def main(argv=None):
     parser = argparse.ArgumentParser()
@@ -63,7 +353,80 @@ def main(argv=None):
         '--extension', default='.tmpl',
         help='File extension to use for compiling directories',
     )
+    parser.add_argument(
+        '--flatten', action='store_true',
+        help=(
+            'Merge the `#extends` chain of each template into a single '
+            'class.  Base templates are found as `.tmpl` files in the current '
+            'directory or on sys.path.  Methods which are not reachable from '
+            'the main methods (only called with `getattr` or from python) '
+            'are dropped, see --keep'
+        ),
+    )
+    parser.add_argument(
+        '--keep', action='append', default=[], metavar='NAME',
+        help='With --flatten, keep the method NAME even if it looks unused',
+    )
+    parser.add_argument(
+        '--force', action='store_true',
+        help='Recompile templates even if they have not changed',
+    )
+    parser.add_argument(
+        '--bytecode', choices=BYTECODE_MODES,
+        help=(
+            'Also write `__pycache__` bytecode for the compiled templates, '
+            'with this kind of invalidation header (see `compileall`)'
+        ),
+    )
+    parser.add_argument(
+        '--sourceless', action='store_true',
+        help='Write `foo.pyc` instead of `foo.py` (and no `__pycache__`)',
+    )
+    parser.add_argument(
+        '--manifest', metavar='FILENAME',
+        help=(
+            'Record the compiled templates of the directories in FILENAME, '
+            'instead of a `.cheetah_manifest.json` in each directory'
+        ),
+    )
+    parser.add_argument(
+        '--watch', action='store_true',
+        help=(
+            'After compiling the directories, keep recompiling their '
+            'templates as they change'
+        ),
+    )
+    parser.add_argument(
+        '--deps', action='store_true',
+        help=(
+            'Write a make / ninja depfile next to each compiled template '
+            '(`foo.d` for `foo.py`) listing the templates it depends on'
+        ),
+    )
+    parser.add_argument(
+        '--deps-json', metavar='FILENAME',
+        help='Write the dependency graph of the templates to FILENAME',
+    )
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=1,
+        help=(
+            'Number of processes to compile with, 0 for one per CPU '
+            '(default: %(default)s)'
+        ),
+    )
     args = parser.parse_args(argv)
+    template_finder.cache_clear()
+    if args.watch and (args.deps or args.deps_json):
+        parser.error('--deps / --deps-json cannot be used with --watch')
+    if args.keep and not args.flatten:
+        parser.error('--keep can only be used with --flatten')
+    kwargs = {
+        'flatten': args.flatten,
+        'bytecode': BYTECODE_MODES.get(args.bytecode),
+        'sourceless': args.sourceless,
+    }
+    if args.keep:
+        kwargs['keep'] = tuple(args.keep)
 
     directories = [
         filename for filename in args.filenames if os.path.isdir(filename)
@@ -71,9 +434,29 @@ def main(argv=None):
     files = [
         filename for filename in args.filenames if not os.path.isdir(filename)
     ]
-    compile_directories(directories, extension=args.extension)
-    for filename in files:
-        compile_template(filename)
+    compile_kwargs = {
+        'extension': args.extension,
+        'force': args.force,
+        'jobs': args.jobs,
+        'manifest_filename': args.manifest,
+        **kwargs,
+    }
+    if not args.watch:
+        compile_directories(directories, **compile_kwargs)
+    for _ in _compile_templates(files, args.jobs, **kwargs):
+        pass
+    if args.deps or args.deps_json:
+        write_dependencies(
+            _templates(directories, files, args.extension),
+            depfiles=args.deps,
+            json_filename=args.deps_json,
+            sourceless=args.sourceless,
+        )
+    if args.watch:
+        try:
+            watch(directories, **compile_kwargs)
+        except KeyboardInterrupt:
+            pass
 
 
 if __name__ == '__main__':
@@ -1,20 +1,34 @@
+import importlib.util
+import marshal
 import os.path
+import py_compile
 import types
 
+from Cheetah import compile_cache
 from Cheetah.legacy_compiler import CLASS_NAME
 from Cheetah.legacy_compiler import LegacyCompiler
 
 
+GENERATED_FILENAME = '<generated cheetah module>'
+
+
 def compile_source(
         source,
         settings=None,
         compiler_cls=LegacyCompiler,
+        constants=None,
+        cache=None,
 ):
     """The general case for compiling from source.
 
     :param text source: Text representing the cheetah source.
     :param dict settings: Compile settings
     :param type compiler_cls: Class to use for the compiler.
+    :param dict constants: Namespace values to bake into the compiled output.
+        Placeholders for these names become literals and `#if` / `#elif`
+        branches which become constant are removed.
+    :param cache: A `Cheetah.compile_cache.CompileCache`, defaults to
+        `Cheetah.compile_cache.DEFAULT_CACHE`.
     :return: The compiled output.
     :rtype: text
     :raises TypeError: if source is not text.
@@ -22,14 +36,46 @@ def compile_source(
     if not isinstance(source, str):
         raise TypeError(f'`source` must be `str` but got {type(source)!r}')
 
-    compiler = compiler_cls(source, settings=settings)
+    if cache is None:
+        cache = compile_cache.DEFAULT_CACHE
+    if cache is not None:
+        key = compile_cache.cache_key(
+            source, settings, compiler_cls, constants,
+        )
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+
+    compiled_source = _generate(source, settings, compiler_cls, constants)
+    if cache is not None:
+        cache.set(key, (compiled_source, None))
+    return compiled_source
+
+
+def _generate(
+        source,
+        settings=None,
+        compiler_cls=LegacyCompiler,
+        constants=None,
+):
+    compiler = compiler_cls(source, settings=settings, constants=constants)
     return compiler.getModuleCode()
 
 
-def compile_file(filename, target=None, **kwargs):
+def compile_file(
+        filename,
+        target=None,
+        bytecode=None,
+        sourceless=False,
+        **kwargs,
+):
     """Compiles a file.
 
     :param text filename: Filename of the file to open
+    :param bytecode: A `py_compile.PycInvalidationMode`, also write the
+        compiled module's `__pycache__` bytecode with this kind of header.
+    :param bool sourceless: Only write the bytecode, to `foo.pyc` instead of
+        `foo.py` (an existing `foo.py` and its `__pycache__` are removed).
     :param kwargs: Keyword args passed to `compile`
     """
     if not isinstance(filename, str):
@@ -38,20 +84,93 @@ def compile_file(filename, target=None, **kwargs):
     with open(filename, encoding='UTF-8') as f:
         contents = f.read()
 
-    py_file = os.path.basename(filename).split('.', 1)[0] + '.py'
     compiled_source = compile_source(contents, **kwargs)
 
     if target is None:
-        dirname = os.path.dirname(filename)
-        target = os.path.join(dirname, py_file)
-
-    with open(target, 'w', encoding='UTF-8') as target_file:
-        target_file.write(compiled_source)
+        target = default_target(filename, sourceless)
 
+    write_compiled(target, compiled_source, bytecode, sourceless)
     return target
 
 
-def _create_module_from_source(source, filename='<generated cheetah module>'):
+def default_target(filename, sourceless=False):
+    """`foo/bar.tmpl` => `foo/bar.py` (`foo/bar.pyc` if sourceless)"""
+    py_file = os.path.basename(filename).split('.', 1)[0] + '.py'
+    if sourceless:
+        py_file += 'c'
+    return os.path.join(os.path.dirname(filename), py_file)
+
+
+def write_if_changed(filename, contents):
+    """Writes a file unless it already has these contents, which would only
+    bump its mtime (and invalidate its `__pycache__`).
+    """
+    if isinstance(contents, bytes):
+        mode, encoding = 'b', None
+    else:
+        mode, encoding = '', 'UTF-8'
+    try:
+        with open(filename, f'r{mode}', encoding=encoding) as f:
+            if f.read() == contents:
+                return
+    except (OSError, ValueError):
+        pass
+    with open(filename, f'w{mode}', encoding=encoding) as f:
+        f.write(contents)
+
+
+def _sourceless_pyc(source, filename):
+    """The `.pyc` for a module which has no `.py`.  The header is never
+    checked for those, it records the hash of the source anyway.
+    """
+    source_bytes = source.encode('UTF-8')
+    code = compile(source_bytes, filename, 'exec', dont_inherit=True)
+    return b''.join((
+        importlib.util.MAGIC_NUMBER,
+        # flags: hash based, unchecked
+        (0b01).to_bytes(4, 'little'),
+        importlib.util.source_hash(source_bytes),
+        marshal.dumps(code),
+    ))
+
+
+def _remove_source(py_file):
+    """Removes a module's `.py` and its `__pycache__` bytecode, python would
+    import them rather than its sourceless `.pyc`.
+    """
+    for filename in (
+            py_file,
+            *(
+                importlib.util.cache_from_source(py_file, optimization=opt)
+                for opt in ('', 1, 2)
+            ),
+    ):
+        try:
+            os.remove(filename)
+        except FileNotFoundError:
+            pass
+
+
+def write_compiled(target, source, bytecode=None, sourceless=False):
+    """Writes a compiled module, see `compile_file` for the arguments."""
+    if sourceless:
+        py_file = os.path.splitext(target)[0] + '.py'
+        write_if_changed(target, _sourceless_pyc(source, py_file))
+        _remove_source(py_file)
+    else:
+        write_if_changed(target, source)
+        if bytecode is not None:
+            py_compile.compile(target, doraise=True, invalidation_mode=bytecode)
+
+
+def _create_module_from_code(code, filename):
+    module = types.ModuleType('created_module')
+    module.__file__ = filename
+    exec(code, module.__dict__)
+    return module
+
+
+def _create_module_from_source(source, filename=GENERATED_FILENAME):
     """Creates a module from the given source.
 
     :param text source: Sourcecode to put into new module.
@@ -59,23 +178,50 @@ def _create_module_from_source(source, filename='<generated cheetah module>'):
     """
     assert type(source) is str
 
-    module = types.ModuleType('created_module')
-    module.__file__ = filename
     code = compile(source, filename, 'exec', dont_inherit=True)
-    exec(code, module.__dict__)
-    return module
+    return _create_module_from_code(code, filename)
+
+
+def _compile_code(source, cache=None, **kwargs):
+    """The code object of a compiled template, cached like its source."""
+    if cache is None:
+        cache = compile_cache.DEFAULT_CACHE
+    if cache is None:
+        compiled_source = compile_source(source, **kwargs)
+        return compile(
+            compiled_source, GENERATED_FILENAME, 'exec', dont_inherit=True,
+        )
+
+    if not isinstance(source, str):
+        raise TypeError(f'`source` must be `str` but got {type(source)!r}')
+    key = compile_cache.cache_key(source, **kwargs)
+    entry = cache.get(key)
+    if entry is None:
+        compiled_source = _generate(source, **kwargs)
+    elif entry[1] is None:
+        compiled_source = entry[0]
+    else:
+        return entry[1]
+    code = compile(
+        compiled_source, GENERATED_FILENAME, 'exec', dont_inherit=True,
+    )
+    cache.set(key, (compiled_source, code))
+    return code
 
 
 def compile_to_class(source, **kwargs):
     """Compile source directly to a `type` object.  Mainly used by tests.
 
     :param text source: Text representing the cheetah source
-    :param kwargs: Keyword args passed to `compile`
+    :param kwargs: Keyword args passed to `compile_source`
     :return: A `Template` class
     :rtype: type
     """
-    compiled_source = compile_source(source, **kwargs)
-    module = _create_module_from_source(compiled_source)
+    return _class_from_code(_compile_code(source, **kwargs))
+
+
+def _class_from_code(code):
+    module = _create_module_from_code(code, GENERATED_FILENAME)
     cls = getattr(module, CLASS_NAME)
     # To prevent our module from getting gc'd
     cls.__module_obj__ = module
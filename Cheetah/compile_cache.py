@@ -0,0 +1,169 @@
+"""An opt-in cache for `Cheetah.compile.compile_source` / `compile_to_class`.
+
+Compiling the same source with the same arguments again is a lookup: the
+generated python source and its code object are kept in memory (LRU) and,
+given a directory, on disk (evicting the least recently used files over a
+size cap) so they're shared between processes and runs.
+
+    from Cheetah import compile_cache
+    compile_cache.DEFAULT_CACHE = compile_cache.CompileCache('.cheetah_cache')
+
+Entries are keyed by the source, the compile arguments, the compiler (class
+and source, see `Cheetah.manifest.compiler_version`), the python version and
+the partial templates it imports with their functions (see
+`Cheetah.dependencies.partial_imports`).
+"""
+import collections
+import hashlib
+import importlib.util
+import marshal
+import os
+import threading
+
+from Cheetah.dependencies import partial_imports
+from Cheetah.legacy_compiler import LegacyCompiler
+from Cheetah.manifest import compiler_version
+
+
+# The cache of compiles which aren't given their own `cache`, off by default
+DEFAULT_CACHE = None
+
+
+def cache_key(
+        source,
+        settings=None,
+        compiler_cls=LegacyCompiler,
+        constants=None,
+):
+    """The key of a compile, arguments as for `compile_source`.
+
+    :raises ParseError: for syntax errors in its `#import` / `#from`
+        directives.
+    """
+    parts = (
+        compiler_version(),
+        importlib.util.MAGIC_NUMBER,
+        f'{compiler_cls.__module__}.{compiler_cls.__qualname__}',
+        f'{compiler_cls.parserClass.__module__}.'
+        f'{compiler_cls.parserClass.__qualname__}',
+        sorted((settings or {}).items()),
+        sorted((constants or {}).items()),
+        source,
+        partial_imports(source),
+    )
+    return hashlib.sha256(repr(parts).encode('UTF-8')).hexdigest()
+
+
+class CompileCache:
+    """Entries are (python source, code object or None) tuples.
+
+    :param directory: Where to keep entries on disk, `None` for memory only.
+    :param int maxsize: Number of entries kept in memory.
+    :param int max_bytes: Size of the entries kept on disk.
+    """
+
+    def __init__(self, directory=None, maxsize=1024, max_bytes=64 << 20):
+        self.directory = directory
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        # An estimate of the size of the files, `None` until they're listed
+        self._disk_bytes = None
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def _filename(self, key):
+        return os.path.join(self.directory, f'{key}.cache')
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+        if self.directory is None:
+            return None
+
+        filename = self._filename(key)
+        try:
+            with open(filename, 'rb') as f:
+                data = f.read()
+            os.utime(filename)
+        except OSError:
+            return None
+        magic = importlib.util.MAGIC_NUMBER
+        if not data.startswith(magic):
+            return None
+        try:
+            entry = marshal.loads(data[len(magic):])
+        except (EOFError, ValueError, TypeError):
+            return None
+        self._remember(key, entry)
+        return entry
+
+    def set(self, key, entry):
+        self._remember(key, entry)
+        if self.directory is None:
+            return
+
+        data = importlib.util.MAGIC_NUMBER + marshal.dumps(entry)
+        filename = self._filename(key)
+        tmp = f'{filename}.{os.getpid()}.{threading.get_ident()}'
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, filename)
+        except OSError:
+            return
+        if self._disk_bytes is None:
+            self._evict()
+        else:
+            self._disk_bytes += len(data)
+            if self._disk_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Lists the files and if they take more than `max_bytes` removes the
+        least recently used ones until they take 3/4 of it (so the files
+        aren't listed again for a while).
+        """
+        files = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith('.cache'):
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    files.append((st.st_mtime_ns, st.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        if total > self.max_bytes:
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes * 3 // 4:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                total -= size
+        self._disk_bytes = total
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.directory is not None:
+            for name in os.listdir(self.directory):
+                if name.endswith('.cache'):
+                    os.remove(os.path.join(self.directory, name))
+            self._disk_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,137 @@
+"""The templates each template depends on.
+
+A template depends on its `#extends` base and the templates it imports with
+`#import` / `#from`, partial templates (whose functions are called
+differently) are listed separately.  These are the `set_extends` / `addImport`
+/ `addFrom` calls the parser makes to the compiler.  Only the lines of these
+directives are parsed, which is much faster than parsing whole templates
+(directives in comments count too, they only cost recompiles).
+Like the compiler, modules are looked up in the current directory and
+`sys.path` (see `Cheetah.template_finder`).
+
+`cheetah-compile` uses these to skip unchanged templates (`Cheetah.manifest`),
+to recompile the dependents of changed templates (`--watch`) and to write
+depfiles (`--deps`).  The compile cache keys on the partial imports.
+"""
+import ast
+import os.path
+import re
+
+from Cheetah import ir
+from Cheetah.legacy_parser import ParseError
+from Cheetah.template_finder import find_template_file
+from Cheetah.template_finder import partial_template_names
+
+
+# Directives which add dependencies, not those in `##` comments
+DEPENDENCY_DIRECTIVE_RE = re.compile(r'(?<!#)#(?:extends|import|from)\b.*')
+
+
+def _dependency_nodes(source):
+    directives = '\n'.join(DEPENDENCY_DIRECTIVE_RE.findall(source))
+    if not directives:
+        return ()
+    try:
+        return ir.parse(directives)
+    except ParseError:
+        # a directive continued on the next line, or not a directive
+        return ir.parse(source)
+
+
+def _imported_modules(parts):
+    # Compiling the template reports `$placeholders` and syntax errors
+    if not all(isinstance(part, str) for part in parts):
+        return
+    try:
+        node = ast.parse(''.join(parts)).body[0]
+    except SyntaxError:
+        return
+    if isinstance(node, ast.Import):
+        for alias in node.names:
+            yield alias.name
+    elif not node.level:
+        yield node.module
+        # `#from pkg import template` imports a submodule
+        for alias in node.names:
+            yield f'{node.module}.{alias.name}'
+
+
+def template_dependencies(source):
+    """The templates a template depends on directly, by module name.
+
+    Partial templates may have been compiled and have no `.tmpl` file.
+
+    :return: `{'extends': name or None, 'imports': [...], 'partials': [...]}`
+    :raises ParseError: for syntax errors.
+    """
+    extends = None
+    imports = set()
+    partials = set()
+    for node in _dependency_nodes(source):
+        if node.kind == 'set_extends':
+            if find_template_file(node.args[0]) is not None:
+                extends = node.args[0]
+        elif node.kind in ('addImport', 'addFrom'):
+            for module_name in _imported_modules(node.args[0]):
+                if partial_template_names(module_name) is not None:
+                    partials.add(module_name)
+                elif find_template_file(module_name) is not None:
+                    imports.add(module_name)
+    return {
+        'extends': extends,
+        'imports': sorted(imports),
+        'partials': sorted(partials),
+    }
+
+
+def partial_imports(source):
+    """The partial templates a template imports and their functions, sorted.
+
+    The compiled template depends on them: calls to partial template
+    functions pass `self`.  They are found relative to the current directory
+    and `sys.path`, so keys of compiled output include them.
+    """
+    return [
+        (module_name, sorted(partial_template_names(module_name)))
+        for module_name in template_dependencies(source)['partials']
+    ]
+
+
+def template_files(dependencies):
+    """The `.tmpl` files of `template_dependencies`, sorted."""
+    module_names = [*dependencies['imports'], *dependencies['partials']]
+    if dependencies['extends'] is not None:
+        module_names.append(dependencies['extends'])
+    filenames = {find_template_file(name) for name in module_names}
+    filenames.discard(None)
+    return sorted(filenames)
+
+
+class DependencyGraph:
+    """The dependencies of templates, their files are read once."""
+
+    def __init__(self):
+        self._dependencies = {}
+
+    def dependencies(self, filename):
+        """`template_dependencies` of a template file."""
+        filename = os.path.normpath(filename)
+        try:
+            return self._dependencies[filename]
+        except KeyError:
+            with open(filename, encoding='UTF-8') as f:
+                ret = template_dependencies(f.read())
+            self._dependencies[filename] = ret
+            return ret
+
+    def files(self, filename):
+        """The `.tmpl` files a template depends on, transitively, sorted."""
+        seen = set()
+        todo = [filename]
+        while todo:
+            for dependency in template_files(self.dependencies(todo.pop())):
+                if dependency not in seen:
+                    seen.add(dependency)
+                    todo.append(dependency)
+        seen.discard(os.path.normpath(filename))
+        return sorted(seen)
@@ -0,0 +1,189 @@
+"""Flatten a template and its `#extends` chain into a single class.
+
+Each level of `#extends` costs an MRO walk for every method lookup and a
+`super()` call for every `#super`.  When the base templates are available at
+build time, their methods can be merged into the leaf template's class:
+overridden methods are resolved statically and methods which can't be reached
+are dropped.  The result is a drop-in replacement for the leaf module.
+"""
+import ast
+import re
+
+from Cheetah.compile import default_target
+from Cheetah.compile import write_compiled
+from Cheetah.legacy_compiler import CLASS_NAME
+from Cheetah.legacy_compiler import format_class_def
+from Cheetah.legacy_compiler import format_module_code
+from Cheetah.legacy_compiler import LegacyCompiler
+from Cheetah.template_finder import find_template_source
+
+
+SELF_ATTRIBUTE_RE = re.compile(r'\bself\.([A-Za-z_][A-Za-z0-9_]*)\b')
+
+
+class FlattenError(ValueError):
+    pass
+
+
+def _import_bindings(import_statement):
+    """Yields (name, what the name is bound to) for an import statement."""
+    node = ast.parse(import_statement).body[0]
+    for alias in node.names:
+        if isinstance(node, ast.Import):
+            if alias.asname:
+                yield alias.asname, alias.name
+            else:
+                top_level = alias.name.partition('.')[0]
+                yield top_level, top_level
+        elif alias.name != '*':
+            module = '.' * node.level + (node.module or '')
+            yield alias.asname or alias.name, f'{module}:{alias.name}'
+
+
+def _merge_imports(compilers):
+    bindings = {}
+    import_statements = []
+    for compiler in compilers:
+        for statement in compiler._importStatements:
+            if statement in import_statements:
+                continue
+            original = compiler._original_imports.get(statement, statement)
+            for name, target in _import_bindings(original):
+                if bindings.setdefault(name, target) != target:
+                    raise FlattenError(
+                        f'Cannot flatten: `{name}` refers to both '
+                        f'{bindings[name]} and {target}',
+                    )
+            import_statements.append(statement)
+    return import_statements
+
+
+def _reachable(method_defs, roots):
+    seen = set()
+    todo = [name for name in roots if name in method_defs]
+    while todo:
+        name = todo.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        todo.extend(
+            referenced
+            for referenced in SELF_ATTRIBUTE_RE.findall(method_defs[name])
+            if referenced in method_defs
+        )
+    return seen
+
+
+def flatten_source(
+        source,
+        settings=None,
+        compiler_cls=LegacyCompiler,
+        get_source=find_template_source,
+        keep=(),
+        drop_unused=True,
+):
+    """Compile a template with its template base classes merged in.
+
+    :param text source: Text representing the cheetah source of the leaf.
+    :param dict settings: Compile settings (used for every level).
+    :param type compiler_cls: Class to use for the compiler.
+    :param get_source: Function taking an `#extends` module name and
+        returning its cheetah source, or `None` to stop flattening there.
+    :param keep: Names of methods which must be kept even if they are not
+        reachable from the main methods of the chain.
+    :param bool drop_unused: Whether to drop unreachable methods.
+    :return: The compiled output.
+    :rtype: text
+    """
+    if not isinstance(source, str):
+        raise TypeError(f'`source` must be `str` but got {type(source)!r}')
+
+    # Leaf first
+    chain = []
+    seen_modules = set()
+    while source is not None:
+        compiler = compiler_cls(source, settings=settings)
+        chain.append((compiler, compiler.compileClass()))
+        extends_name = compiler._extends_name
+        if extends_name is None:
+            break
+        elif extends_name in seen_modules:
+            raise FlattenError(f'Cannot flatten: cyclic #extends {extends_name}')
+        seen_modules.add(extends_name)
+        source = get_source(extends_name)
+    chain.reverse()
+
+    attrs = {}
+    methods = {}
+    super_targets = {}
+    main_method_names = set()
+    for level, (compiler, class_compiler) in enumerate(chain):
+        for attr in class_compiler._attrs:
+            attrs[attr.partition(' = ')[0]] = attr
+        main_method_names.add(class_compiler._main_method.methodName())
+
+        for method in class_compiler._finishedMethodsList:
+            name = method.methodName()
+            overridden = methods.get(name)
+            if method._usesSuper and overridden is not None:
+                # Keep the overridden method around under a private name
+                overridden_name = f'_{name}__flattened{level}'
+                overridden.setMethodName(overridden_name)
+                methods[overridden_name] = overridden
+                super_targets[method] = (name, overridden_name)
+            methods[name] = method
+
+    method_defs = {}
+    for name, method in methods.items():
+        method_def = method.methodDef()
+        if method in super_targets:
+            original_name, target = super_targets[method]
+            method_def = method_def.replace(
+                f'super({CLASS_NAME}, self).{original_name}(',
+                f'self.{target}(',
+            )
+        method_defs[name] = method_def
+
+    if drop_unused:
+        reachable = _reachable(method_defs, main_method_names | set(keep))
+        method_defs = {
+            name: method_def
+            for name, method_def in method_defs.items()
+            if name in reachable
+        }
+
+    compilers = [compiler for compiler, _ in chain]
+    return format_module_code(
+        _merge_imports(compilers),
+        # The root of the chain extends a class we couldn't flatten
+        compilers[0]._base_import,
+        format_class_def(
+            list(attrs.values()), '\n\n'.join(method_defs.values()),
+        ),
+    )
+
+
+def flatten_file(
+        filename,
+        target=None,
+        bytecode=None,
+        sourceless=False,
+        **kwargs,
+):
+    """Flattens and compiles a file.
+
+    :param text filename: Filename of the leaf template.
+    :param bytecode: See `Cheetah.compile.compile_file`.
+    :param bool sourceless: See `Cheetah.compile.compile_file`.
+    :param kwargs: Keyword args passed to `flatten_source`
+    """
+    with open(filename, encoding='UTF-8') as f:
+        contents = f.read()
+
+    if target is None:
+        target = default_target(filename, sourceless)
+
+    write_compiled(
+        target, flatten_source(contents, **kwargs), bytecode, sourceless,
+    )
+    return target
@@ -0,0 +1,135 @@
+"""Caches for the output of `#cache` ... `#end cache` fragments.
+
+A cache is any object with these methods:
+
+    get(key) -> the cached text or None
+    set(key, value, ttl) -> store the text, `ttl` is in seconds (or None)
+
+Keys are text.  Templates use `DEFAULT_CACHE` unless they are given a
+`fragment_cache`.  This module (and sqlite3, once a `SqliteCache` is made)
+is only imported by templates with `#cache` directives.
+"""
+import collections
+import hashlib
+import threading
+import time
+
+
+def fragment_key(module_name, source_hash, line, col, filter_fn, key):
+    """Returns the cache key for a fragment.
+
+    The compiled module and the hash of the template's source are part of the
+    key so redeploying a changed template invalidates its fragments.  `key`
+    (the `key=` of the directive) should have a stable `repr`.
+    """
+    if hasattr(filter_fn, '__qualname__'):
+        filter_id = (filter_fn.__module__, filter_fn.__qualname__)
+    else:
+        # callable objects, like `functools.partial`s, by their arguments
+        filter_type = type(filter_fn)
+        filter_id = (
+            filter_type.__module__, filter_type.__qualname__, repr(filter_fn),
+        )
+    parts = (module_name, source_hash, line, col, filter_id, key)
+    return hashlib.sha256(repr(parts).encode('UTF-8')).hexdigest()
+
+
+def template_cache(fragment_cache):
+    """The cache of a template given this `fragment_cache`."""
+    return DEFAULT_CACHE if fragment_cache is None else fragment_cache
+
+
+class MemoryCache:
+    """A bounded in-memory LRU cache."""
+
+    def __init__(self, maxsize=1024, clock=time.monotonic):
+        self.maxsize = maxsize
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires <= self._clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = None if ttl is None else self._clock() + ttl
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SqliteCache:
+    """A cache stored in a local sqlite database, shared between processes."""
+
+    def __init__(self, filename, clock=time.time):
+        self.filename = filename
+        self._clock = clock
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS fragments ('
+                '    key TEXT PRIMARY KEY, value TEXT, expires REAL'
+                ')',
+            )
+
+    def _connection(self):
+        # sqlite connections can't be shared between threads
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            import sqlite3
+            connection = self._local.connection = sqlite3.connect(
+                self.filename, timeout=30,
+            )
+        return connection
+
+    def get(self, key):
+        row = self._connection().execute(
+            'SELECT value, expires FROM fragments WHERE key = ?', (key,),
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires = row
+        if expires is not None and expires <= self._clock():
+            return None
+        return value
+
+    def set(self, key, value, ttl=None):
+        expires = None if ttl is None else self._clock() + ttl
+        with self._connection() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO fragments (key, value, expires) '
+                'VALUES (?, ?, ?)',
+                (key, value, expires),
+            )
+
+    def purge_expired(self):
+        """Remove the expired fragments from the database."""
+        with self._connection() as connection:
+            connection.execute(
+                'DELETE FROM fragments WHERE expires <= ?', (self._clock(),),
+            )
+
+    def clear(self):
+        with self._connection() as connection:
+            connection.execute('DELETE FROM fragments')
+
+
+DEFAULT_CACHE = MemoryCache()
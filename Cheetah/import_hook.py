@@ -0,0 +1,110 @@
+"""Import `.tmpl` files directly: `foo.tmpl` is imported as the module `foo`.
+
+Templates are compiled on first import and their bytecode is cached in
+`__pycache__/foo.tmpl.<tag>.pyc`, keyed by `Cheetah.manifest.template_key`
+(the template's source, the compiler and the partial templates it imports),
+so later imports only read and hash the template.
+
+    from Cheetah import import_hook
+    import_hook.install()
+
+Directories of `sys.path` (and packages) are searched in order as usual, the
+finder of each looks for a template before a `.py` module of the same name:
+stale compiled output next to a template is never imported.
+"""
+import importlib.machinery
+import importlib.util
+import marshal
+import os
+import sys
+
+from Cheetah.compile import compile_source
+from Cheetah.manifest import template_key
+
+
+EXTENSION = '.tmpl'
+
+
+def cache_path(path):
+    """`foo/bar.tmpl` => `foo/__pycache__/bar.tmpl.cpython-311.pyc`"""
+    return importlib.util.cache_from_source(path + '.py')
+
+
+def _read_cache(path, key):
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    header = importlib.util.MAGIC_NUMBER + key
+    if not data.startswith(header):
+        return None
+    try:
+        return marshal.loads(data[len(header):])
+    except (EOFError, ValueError, TypeError):
+        return None
+
+
+def _write_cache(path, key, code):
+    if sys.dont_write_bytecode:
+        return
+    data = importlib.util.MAGIC_NUMBER + key + marshal.dumps(code)
+    tmp = f'{path}.{os.getpid()}'
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+class TemplateFileLoader(importlib.machinery.SourceFileLoader):
+    """Loads a module by compiling a `.tmpl` file."""
+
+    def get_code(self, fullname):
+        path = self.get_filename(fullname)
+        with open(path, encoding='UTF-8') as f:
+            source = f.read()
+        key = template_key(source).encode()
+        cache = cache_path(path)
+
+        code = _read_cache(cache, key)
+        if code is None:
+            code = compile(
+                compile_source(source), path, 'exec', dont_inherit=True,
+            )
+            _write_cache(cache, key, code)
+        return code
+
+
+# The loaders of the regular path based import, with templates found before
+# `.py` modules
+LOADER_DETAILS = (
+    (
+        importlib.machinery.ExtensionFileLoader,
+        importlib.machinery.EXTENSION_SUFFIXES,
+    ),
+    (TemplateFileLoader, [EXTENSION]),
+    (importlib.machinery.SourceFileLoader, importlib.machinery.SOURCE_SUFFIXES),
+    (
+        importlib.machinery.SourcelessFileLoader,
+        importlib.machinery.BYTECODE_SUFFIXES,
+    ),
+)
+
+_path_hook = importlib.machinery.FileFinder.path_hook(*LOADER_DETAILS)
+
+
+def install():
+    """Makes `.tmpl` files importable, idempotent."""
+    if _path_hook not in sys.path_hooks:
+        sys.path_hooks.insert(0, _path_hook)
+        # directories already have a finder, without templates
+        sys.path_importer_cache.clear()
+
+
+def uninstall():
+    if _path_hook in sys.path_hooks:
+        sys.path_hooks.remove(_path_hook)
+        sys.path_importer_cache.clear()
@@ -0,0 +1,157 @@
+"""An intermediate representation of templates for the compiler.
+
+`LegacyParser` drives a compiler through callbacks: `addStrConst` for text,
+`addPlaceholder`, `add<Directive>` for directives, `startMethodDef` /
+`closeDef` / `closeBlock` for `#def` and `#block` and a few more.  `parse`
+records those calls as a tuple of `Node`s.  An ordered pipeline of passes
+(see `PASSES` and the `passes` compiler setting) rewrites the nodes and
+`LegacyCompiler` generates the code from the result.
+
+Parsing only depends on the source (and the parser class) so the nodes are
+cached: recompiling a template with different settings or constants skips
+the parser.
+"""
+import collections
+import functools
+import sys
+
+from Cheetah.legacy_parser import LegacyParser
+from Cheetah.legacy_parser import ParseError
+from Cheetah.SourceReader import SourceReader
+
+
+# Number of parsed sources to keep
+PARSE_CACHE_SIZE = 128
+
+# `kind` is the name of the compiler callback, `pos` the position of the
+# parser in the source when it was called.
+Node = collections.namedtuple('Node', ('kind', 'args', 'pos'))
+
+TEXT = 'addStrConst'
+WHITESPACE_BEFORE_DIRECTIVE = 'handleWSBeforeDirective'
+COMMENT = 'addComment'
+METHOD_DEF = 'startMethodDef'
+
+
+class _Recorder:
+    """Stands in for the compiler, recording the callbacks as nodes."""
+
+    def __init__(self):
+        self.parser = None
+        self.nodes = []
+
+    def __getattr__(self, kind):
+        def record(*args):
+            self.nodes.append(Node(kind, args, self.parser.pos()))
+        # Only look up each callback once
+        setattr(self, kind, record)
+        return record
+
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse(source, parser_cls=LegacyParser):
+    """Returns the nodes for a template's source.
+
+    :param type parser_cls: The parser, see `LegacyCompiler.parserClass`.
+    :raises ParseError: for syntax errors.
+    """
+    recorder = _Recorder()
+    recorder.parser = parser_cls(source, compiler=recorder)
+    recorder.parser.parse()
+    return tuple(recorder.nodes)
+
+
+def get_defined_method_names(source, parser_cls=LegacyParser):
+    """Names of the `#def`s / `#block`s of a template.
+
+    This reuses the (cached) nodes of the template's parse, compiling a
+    partial template doesn't parse it a second time.
+    """
+    return {
+        node.args[0]
+        for node in parse(source, parser_cls)
+        if node.kind == METHOD_DEF
+    }
+
+
+def parse_error(source, node, e):
+    """Returns the `ParseError` for an exception raised by the compiler while
+    generating the code for a node.
+    """
+    return ParseError(
+        SourceReader(source), f'{type(e).__name__}: {e}\n', pos=node.pos,
+    ).with_traceback(sys.exc_info()[2])
+
+
+def _truncate_to_bol(text):
+    bol = max(text.rfind('\n') + 1, text.rfind('\r') + 1, 0)
+    return text[:bol]
+
+
+def _merge(texts):
+    text = ''.join(node.args[0] for node in texts)
+    return texts[0]._replace(args=(text,))
+
+
+def merge_text(nodes):
+    """Merges consecutive text nodes.
+
+    The whitespace which `handleWSBeforeDirective` would remove from the
+    text just before a directive is removed here.
+    """
+    ret = []
+    texts = []
+
+    def flush():
+        if not texts:
+            return
+        # A later `handleWSBeforeDirective` truncates the last pending text
+        # to the beginning of its line, merging it must not change where
+        # that line begins.
+        if '\n' in texts[-1].args[0] or '\r' in texts[-1].args[0]:
+            ret.append(_merge(texts))
+        else:
+            if len(texts) > 1:
+                ret.append(_merge(texts[:-1]))
+            ret.append(texts[-1])
+        del texts[:]
+
+    for node in nodes:
+        if node.kind == TEXT:
+            texts.append(node)
+        elif node.kind == WHITESPACE_BEFORE_DIRECTIVE and texts:
+            last = texts[-1]
+            texts[-1] = last._replace(args=(_truncate_to_bol(last.args[0]),))
+        else:
+            flush()
+            ret.append(node)
+    flush()
+    return tuple(ret)
+
+
+def strip_comments(nodes):
+    """Drops `##` comments, which are otherwise copied to the generated
+    code.
+    """
+    return tuple(node for node in nodes if node.kind != COMMENT)
+
+
+PASSES = {
+    'merge_text': merge_text,
+    'strip_comments': strip_comments,
+}
+
+
+def run_passes(nodes, pass_names):
+    """Runs the passes named in `pass_names`, in order, over the nodes."""
+    for name in pass_names:
+        try:
+            compiler_pass = PASSES[name]
+        except KeyError:
+            raise ValueError(
+                '{!r} is not a compiler pass (expected one of: {})'.format(
+                    name, ', '.join(sorted(PASSES)),
+                ),
+            )
+        nodes = compiler_pass(nodes)
+    return nodes
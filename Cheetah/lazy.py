@@ -0,0 +1,59 @@
+"""Import modules without executing them until they are used.
+
+Used by the code generated with the `lazyImports` compiler setting, and by
+applications which import many template modules at startup but only render
+a few of them.
+"""
+import importlib.machinery
+import importlib.util
+import sys
+
+
+# Loaders whose modules are plain module objects `LazyLoader` can swap in
+LAZY_LOADERS = (
+    importlib.machinery.SourceFileLoader,
+    importlib.machinery.SourcelessFileLoader,
+)
+
+
+def lazy_import(name):
+    """Like `importlib.import_module`, but the module is only executed when
+    one of its attributes is first used.  Its parent packages are imported
+    right away, modules which aren't loaded from `.py` / `.pyc` files are
+    imported as usual.
+    """
+    try:
+        return sys.modules[name]
+    except KeyError:
+        pass
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f'No module named {name!r}', name=name)
+    # importing the parent packages may have imported the module itself
+    elif name in sys.modules or not isinstance(spec.loader, LAZY_LOADERS):
+        return importlib.import_module(name)
+
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+
+    parent, _, child = name.rpartition('.')
+    if parent:
+        setattr(sys.modules[parent], child, module)
+    return module
+
+
+def lazy_from(module_name, name):
+    """`from module_name import name`, lazily if `name` is a submodule."""
+    module = importlib.import_module(module_name)
+    try:
+        return getattr(module, name)
+    except AttributeError:
+        if not hasattr(module, '__path__'):
+            raise ImportError(
+                f'cannot import name {name!r} from {module_name!r}',
+                name=module_name,
+            )
+    return lazy_import(f'{module_name}.{name}')
@@ -11,18 +11,26 @@ import ast
 import builtins
 import contextlib
 import copy
+import hashlib
 import re
 import textwrap
 import warnings
 
+from Cheetah import ir
+from Cheetah.ast_utils import fold_constant_branches
 from Cheetah.ast_utils import get_argument_names
 from Cheetah.ast_utils import get_imported_names
 from Cheetah.ast_utils import get_lvalues
+from Cheetah.ast_utils import is_pure_function
+from Cheetah.ir import get_defined_method_names
 from Cheetah.legacy_parser import brace_ends
 from Cheetah.legacy_parser import brace_starts
 from Cheetah.legacy_parser import CheetahVar
+from Cheetah.legacy_parser import IDENT_RE
 from Cheetah.legacy_parser import LegacyParser
+from Cheetah.legacy_parser import ParseError
 from Cheetah.SettingsManager import SettingsManager
+from Cheetah.template_finder import partial_template_names
 
 
 INDENT = 4 * ' '
@@ -34,22 +42,130 @@ BUILTIN_NAMES = frozenset(dir(builtins))
 DEFAULT_COMPILER_SETTINGS = {
     # All #import statements are hoisted to the top of the module
     'useLegacyImportMode': True,
+    # Promise that no subclass overrides this template's #def / #block
+    # methods.  Small blocks and argument-less #defs called as $self.foo()
+    # are then inlined into their callers.
+    'final': False,
+    # Memoize the output of #defs which only read their arguments, literals
+    # and PURE_BUILTINS.  #@memoize / #@no_memoize force / prevent it.
+    'memoizePureDefs': False,
+    # Names of the `Cheetah.ir.PASSES` to run, in order, before generating
+    # the code.  #compiler-settings come too late to change them.
+    'passes': ('merge_text',),
+    # Hoisted #import / #from of modules don't execute the modules until
+    # they are first used (see `Cheetah.lazy`).  #extends and names which
+    # aren't modules are still imported right away.
+    'lazyImports': False,
 }
 
+# Maximum number of generated chunks in a method body which may be inlined
+INLINE_MAX_CHUNKS = 50
+
+# Builtins which #defs may use and still be memoized
+PURE_BUILTINS = frozenset((
+    'abs', 'all', 'any', 'ascii', 'bin', 'bool', 'bytes', 'chr', 'dict',
+    'divmod', 'enumerate', 'float', 'format', 'frozenset', 'hex', 'int',
+    'isinstance', 'len', 'list', 'max', 'min', 'oct', 'ord', 'range', 'repr',
+    'reversed', 'round', 'set', 'slice', 'sorted', 'str', 'sum', 'tuple',
+    'zip',
+    # Exception classes may be caught and raised
+    *(
+        name for name, value in vars(builtins).items()
+        if isinstance(value, type) and issubclass(value, BaseException)
+    ),
+))
+# Names and attributes of `self` used by the code generated for every method
+GENERATED_NAMES = frozenset(('io', 'NO_CONTENT'))
+GENERATED_SELF_ATTRIBUTES = frozenset((
+    'transaction', '_CHEETAH__currentFilter', '_CHEETAH__namespace',
+))
+MEMOIZE_DECORATORS = {'@memoize': True, '@no_memoize': False}
+
 CLASS_NAME = 'YelpCheetahTemplate'
 BASE_CLASS_NAME = 'YelpCheetahBaseClass'
 
 
 UNESCAPE_NEWLINES = re.compile(r'(?<!\\)((\\\\)*)\\n')
+# The first token of a literal argument, which can't be a template
+LITERAL_ARGUMENT_RE = re.compile(
+    r'''^(?:[rbfuRBFU]{0,2}['"]|[0-9\[{-]|(?:True|False|None)$)''',
+)
 
 
-def _cheetah_var_to_text(var, local_vars, global_vars):
+def _cheetah_var_to_text(var, local_vars, global_vars, constants):
     if var.name in local_vars | global_vars | BUILTIN_NAMES:
         return var.name
+    elif var.name in constants:
+        value = constants[var.name]
+        # Parenthesize numbers so `$n.real` / `-$n ** 2` keep their meaning
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return f'({value!r})'
+        else:
+            return repr(value)
     else:
         return f'VFNS("{var.name}", NS)'
 
 
+class _For:
+    """A `for ... in` of a comprehension."""
+
+    def __init__(self, for_index):
+        self.for_index = for_index
+        self.in_index = None
+        self.lvalues = None
+        # Whether its locals are available to the rest of the brace
+        self.done = False
+
+
+class _Brace:
+    """An open brace for `_process_comprehensions`."""
+
+    def __init__(self, pending_parent):
+        # The closest enclosing brace which has no `for` yet
+        self.pending_parent = pending_parent
+        self.fors = []
+        # Locals available to the part of the brace being read
+        self.names = set()
+        # Indices of the CheetahVars before the first `for`
+        self.elt_vars = []
+
+    def start_clause(self):
+        for for_ in self.fors:
+            if not for_.done:
+                for_.done = True
+                if for_.lvalues is not None:
+                    self.names.update(for_.lvalues)
+
+    def end_target(self, expr_parts, in_index):
+        for for_ in self.fors:
+            if for_.in_index is None:
+                for_.in_index = in_index
+                lvalue_expr = ''.join(
+                    expr_parts[for_.for_index:in_index],
+                ) + 'in (): pass'
+                lvalue_expr = lvalue_expr.replace('\n', ' ')
+                for_.lvalues = get_lvalues(lvalue_expr)
+
+    def close(self, expr_parts):
+        names = set()
+        for for_ in self.fors:
+            # A `for` without an `in` is not valid python
+            assert for_.in_index is not None, for_.in_index
+            names.update(for_.lvalues)
+        for i in self.elt_vars:
+            if expr_parts[i].name in names:
+                expr_parts[i] = expr_parts[i].name
+            elif self.pending_parent is not None:
+                self.pending_parent.elt_vars.append(i)
+
+
+def _pending_brace(braces):
+    for brace in reversed(braces):
+        if not brace.fors:
+            return brace
+    return None
+
+
 def _process_comprehensions(expr_parts):
     """Comprehensions are a unique part of python's syntax which
     references variables earlier in the source than they are declared.
@@ -92,115 +208,104 @@ def _process_comprehensions(expr_parts):
         - y_iter: [x]
         - y_if: [x, y]
 
-    The approximate algorithm:
-        Search for a `for` token.
-        Search left for a brace, if there is none abandon -- this is a for
-            loop and not a comprehension.
-        While searching left, if a `for` token is encountered, record its
-            position
-        Search forward for `in`, `for`, `if` and the right boundary
-        Process `for ... in` + (): pass looking for introduced locals
-            For example, 'for (x, y) in' will look for locals in
-            `for (x, y) in (): pass` and finds `x` and `y` as lvalues
-        Process tokens in `elt` and the rest of the expression (if applicable)
-            For each CheetahVar encountered, if it is in the locals detected
-                replace it with the raw variable
+    The algorithm, in a single pass over the parts:
+        Keep a stack of the open braces.
+        A `for` token directly inside a brace starts a comprehension, `for`
+            tokens outside of any brace are for loops and ignored.
+        On the `in` after a `for`, process `for ... in` + (): pass looking
+            for introduced locals.  For example, 'for (x, y) in' will look
+            for locals in `for (x, y) in (): pass` and finds `x` and `y`
+        On the `if` / `for` after a `for ... in`, its locals become
+            available to the rest of the brace.
+        For each CheetahVar encountered, replace it with the raw variable if
+            it is in the available locals of one of the open braces.
+            Otherwise, if it is before the first `for` of an open brace (in
+            `elt`), decide when that brace is closed and all of its locals
+            are known.
     """
-    def _search(parts, index, direction):
-        """Helper for searching forward / backward.
-        Yields (index, token, brace_depth)
-        """
-        assert direction in (1, -1), direction
-
-        def in_bounds(index):
-            return index >= 0 and index < len(parts)
-
-        if direction == 1:
-            starts = brace_starts
-            ends = brace_ends
-        else:
-            starts = brace_ends
-            ends = brace_starts
-
-        brace_depth = 0
-        index += direction
-        while in_bounds(index) and brace_depth >= 0:
-            token = parts[index]
-            if token in starts:
-                brace_depth += 1
-            elif token in ends:
-                brace_depth -= 1
-            yield index, token, brace_depth
-            index += direction
-
     expr_parts = list(expr_parts)
-    for i in range(len(expr_parts)):
-        if expr_parts[i] != 'for':
+    braces = []
+    for i, token in enumerate(expr_parts):
+        if isinstance(token, CheetahVar):
+            if any(token.name in brace.names for brace in braces):
+                expr_parts[i] = token.name
+            else:
+                pending = _pending_brace(braces)
+                if pending is not None:
+                    pending.elt_vars.append(i)
+        elif token in brace_starts:
+            braces.append(_Brace(_pending_brace(braces)))
+        elif token in brace_ends:
+            if braces:
+                braces.pop().close(expr_parts)
+        elif not braces:
             continue
+        elif token == 'for':
+            braces[-1].start_clause()
+            braces[-1].fors.append(_For(i))
+        elif token == 'if':
+            braces[-1].start_clause()
+        elif token == 'in':
+            braces[-1].end_target(expr_parts, i)
 
-        # A diagram of the below indices:
-        # (Considering the first `for`)
-        # [(x, y) for x in (1,) if x for y in (2,)]
-        # |       |     |       |                 |
-        # |       |     |       +- next_index     +- right_boundary
-        # |       |     +- in_index
-        # |       +- for_index + first_for_index
-        # +- left_boundary
-        #
-        #  (Considering the second `for`)
-        # [(x, y) for x in (1,) if x for y in (2,)]
-        # |       |                  |     |      |
-        # |       |                  |     |      +- right_boundary
-        # |       +- first_for_index |     +- in_index
-        # +- left_boundary           +- for_index
-        # (next_index is None)
-
-        first_for_index = for_index = i
-
-        # Search for the left boundary or abandon (if it is a for loop)
-        for i, token, depth in _search(expr_parts, for_index, direction=-1):
-            if depth == 0 and token == 'for':
-                first_for_index = i
-            elif depth == -1:
-                left_boundary = i
-                break
-        else:
-            continue
+    return tuple(expr_parts)
 
-        in_index = None
-        next_index = None
-        for i, token, depth in _search(expr_parts, for_index, direction=1):
-            if in_index is None and depth == 0 and token == 'in':
-                in_index = i
-            elif next_index is None and depth == 0 and token in {'if', 'for'}:
-                next_index = i
-            elif depth == -1:
-                right_boundary = i
-                break
-        else:
-            raise AssertionError('unreachable')
 
-        # Defensive assertion is required, slicing with [:None] is valid
-        assert in_index is not None, in_index
-        lvalue_expr = ''.join(expr_parts[for_index:in_index]) + 'in (): pass'
-        lvalue_expr = lvalue_expr.replace('\n', ' ')
-        lvalues = get_lvalues(lvalue_expr)
+def _check_constant(name, value):
+    try:
+        roundtrip = ast.literal_eval(repr(value))
+    except (ValueError, SyntaxError):
+        ok = False
+    else:
+        ok = type(roundtrip) is type(value) and roundtrip == value
+    if not ok:
+        raise ValueError(
+            f'Constant {name}={value!r} cannot be written as a literal',
+        )
 
-        replace_ranges = [range(left_boundary, first_for_index)]
-        if next_index is not None:
-            replace_ranges.append(range(next_index, right_boundary))
 
-        for replace_range in replace_ranges:
-            for i in replace_range:
-                token = expr_parts[i]
-                if isinstance(token, CheetahVar) and token.name in lvalues:
-                    expr_parts[i] = token.name
+def _is_blank(part):
+    return isinstance(part, str) and not part.strip()
 
-    return tuple(expr_parts)
 
+def _pass_self_to_partials(expr_parts, partial_names):
+    """`$partial(x)` => `partial(self, x)`
 
-def _expr_to_text(expr_parts, **kwargs):
+    Partial template functions otherwise find `self` in their caller's frame.
+    `self` is only inserted when there are no arguments or the first one is
+    a literal: a placeholder may be a template passed explicitly and a
+    keyword argument may be `self=`, those calls are left to `default_self`.
+    """
+    if not partial_names:
+        return expr_parts
+
+    ret = []
+    for i, part in enumerate(expr_parts):
+        ret.append(part)
+        if (
+                part == '(' and
+                i > 0 and
+                isinstance(expr_parts[i - 1], CheetahVar) and
+                expr_parts[i - 1].name in partial_names
+        ):
+            first = next(
+                (p for p in expr_parts[i + 1:] if not _is_blank(p)), None,
+            )
+            if first == ')':
+                ret.append('self')
+            elif (
+                    isinstance(first, str) and
+                    LITERAL_ARGUMENT_RE.match(first)
+            ):
+                ret.append('self, ')
+    return tuple(ret)
+
+
+def _expr_to_text(expr_parts, partial_names, **kwargs):
     expr_parts = _process_comprehensions(expr_parts)
+    expr_parts = _pass_self_to_partials(
+        expr_parts, partial_names - kwargs['local_vars'],
+    )
     return ''.join(
         _cheetah_var_to_text(part, **kwargs)
         if isinstance(part, CheetahVar) else
@@ -211,7 +316,7 @@ def _expr_to_text(expr_parts, **kwargs):
 
 def _prepare_argspec(argspec):
     argspec = 'self, ' + argspec if argspec else 'self'
-    return argspec, get_argument_names(argspec)
+    return argspec, set(get_argument_names(argspec))
 
 
 class MethodCompiler:
@@ -222,6 +327,7 @@ class MethodCompiler:
             argspec,
             initialMethodComment,
             decorators=None,
+            memoize=None,
     ):
         self._methodName = methodName
         self._class_compiler = class_compiler
@@ -233,13 +339,22 @@ class MethodCompiler:
         self._isGenerator = False
         self._argspec, self._local_vars = _prepare_argspec(argspec)
         self._decorators = decorators or []
+        # None: memoize if pure (and enabled), True / False: forced
+        self._memoize = memoize
+        self._openCaches = []
+        self._usesSuper = False
+        self._referencedNames = set()
+        self._bodyChunks = None
+        # (expression, ir node) of the placeholders, checked when finished
+        self._placeholders = []
 
     def cleanupState(self):
         """Called by the containing class compiler instance"""
+        self._checkPlaceholders()
         self.commitStrConst()
 
         self._indentLev = 2
-        mainBodyChunks = self._methodBodyChunks
+        mainBodyChunks = self._bodyChunks = self._methodBodyChunks
         self._methodBodyChunks = []
         self._addAutoSetupCode()
         self._methodBodyChunks.extend(mainBodyChunks)
@@ -347,18 +462,99 @@ class MethodCompiler:
         self._local_vars.update(get_lvalues(expr))
 
     def _expr_to_text(self, expr):
-        return _expr_to_text(
+        text = _expr_to_text(
             expr,
             local_vars=self._local_vars,
             global_vars=self._class_compiler._compiler._global_vars,
+            constants=self._class_compiler._compiler._constants,
+            partial_names=self._class_compiler._compiler._partial_names,
+        )
+        self._referencedNames.update(IDENT_RE.findall(text))
+        return text
+
+    def isInlinable(self):
+        """Whether the body of this (finished) method can be pasted into its
+        callers in a `final` template.
+        """
+        return (
+            self._argspec == 'self' and
+            not self._decorators and
+            not self._isGenerator and
+            not self._hasReturnStatement and
+            not self._usesSuper and
+            len(self._bodyChunks) <= INLINE_MAX_CHUNKS
+        )
+
+    def isPure(self):
+        """Whether the output of this (finished) method only depends on its
+        arguments and the current filter.
+        """
+        if (
+                self._decorators or
+                self._isGenerator or
+                self._hasReturnStatement or
+                self._usesSuper
+        ):
+            return False
+        class_def = ast.parse('class _:\n' + self.methodDef()).body[0]
+        func = class_def.body[0]
+        return is_pure_function(
+            func,
+            allowed_globals=PURE_BUILTINS | GENERATED_NAMES,
+            allowed_self_attributes=GENERATED_SELF_ATTRIBUTES,
+        )
+
+    def inlineMethod(self, methodCompiler, line_col=None):
+        """Paste the body of a finished method in place of calling it.
+
+        Returns False (and does nothing) when the inlined body could refer to
+        one of our local variables.
+        """
+        if methodCompiler._referencedNames & (self._local_vars - {'self'}):
+            return False
+
+        self.addChunk(
+            f'## CHEETAH: inlined self.{methodCompiler.methodName()}()',
         )
+        if line_col is not None:
+            self._append_line_col_comment(line_col)
+
+        base_indentation = '\n' + INDENT * 2
+        for chunk in methodCompiler._bodyChunks:
+            assert chunk.startswith(base_indentation), chunk
+            self._methodBodyChunks.append(
+                '\n' + self.indentation() + chunk[len(base_indentation):],
+            )
+        self._referencedNames.update(methodCompiler._referencedNames)
+        return True
 
     def addPlaceholder(self, expr, rawPlaceholder, line_col):
+        if self._class_compiler.inlineMethodCall(expr, line_col):
+            return
         expr = self._expr_to_text(expr).lstrip()
-        assert ast.parse(expr)
+        self._placeholders.append((expr, self._class_compiler._compiler._node))
         self.addFilteredChunk(expr, rawPlaceholder, line_col)
         self._append_line_col_comment(line_col)
 
+    def _checkPlaceholders(self):
+        """Checks that the placeholders are valid python with a single
+        parse, only parsing them one by one to find the error.
+        """
+        try:
+            ast.parse('\n'.join(expr for expr, _ in self._placeholders))
+        except SyntaxError:
+            for expr, node in self._placeholders:
+                try:
+                    ast.parse(expr)
+                except SyntaxError as e:
+                    raise ir.parse_error(
+                        self._class_compiler._compiler._original_source,
+                        node,
+                        e,
+                    )
+            else:
+                raise AssertionError('unreachable')
+
     def _add_with_line_col(self, expr, line_col):
         expr = self._expr_to_text(expr).lstrip()
         self._update_locals(expr)
@@ -419,6 +615,61 @@ class MethodCompiler:
 
     addElif = addElse
 
+    def startCache(self, key_expr, ttl_expr, line_col):
+        """Start a `#cache` fragment: replay its output when it is cached,
+        otherwise capture it.
+        """
+        compiler = self._class_compiler._compiler
+        compiler.addRuntimeImport(
+            'from Cheetah.fragment_cache import fragment_key as FRAGMENT_KEY',
+            'FRAGMENT_KEY',
+        )
+        compiler.addRuntimeImport(
+            'from Cheetah.fragment_cache import template_cache as '
+            'FRAGMENT_CACHE',
+            'FRAGMENT_CACHE',
+        )
+        key = self._expr_to_text(key_expr).strip() if key_expr else 'None'
+        ttl = self._expr_to_text(ttl_expr).strip() if ttl_expr else 'None'
+        n = self._class_compiler.nextFragmentId()
+        self._openCaches.append((n, ttl))
+
+        self.commitStrConst()
+        self.addChunk(
+            f'_fragmentKey{n} = FRAGMENT_KEY('
+            f'__name__, {compiler.sourceHash()!r}, {line_col[0]}, '
+            f'{line_col[1]}, self._CHEETAH__currentFilter, {key})',
+        )
+        self._append_line_col_comment(line_col)
+        self.addChunk(
+            f'_fragmentCache{n} = '
+            f'FRAGMENT_CACHE(self._CHEETAH__fragmentCache)',
+        )
+        self.addChunk(f'_fragment{n} = _fragmentCache{n}.get(_fragmentKey{n})')
+        self.addChunk(f'if _fragment{n} is None:')
+        self.indent()
+        self.addChunk(
+            f'_fragmentTrans{n}, self.transaction = '
+            f'self.transaction, io.StringIO()',
+        )
+        self.addChunk('try:')
+        self.indent()
+
+    def endCache(self):
+        self.commitStrConst()
+        n, ttl = self._openCaches.pop()
+        self.addChunk(f'_fragment{n} = self.transaction.getvalue()')
+        self.dedent()
+        self.addChunk('finally:')
+        self.indent()
+        self.addChunk(f'self.transaction = _fragmentTrans{n}')
+        self.dedent()
+        self.addChunk(
+            f'_fragmentCache{n}.set(_fragmentKey{n}, _fragment{n}, {ttl})',
+        )
+        self.dedent()
+        self.addChunk(f'self.transaction.write(_fragment{n})')
+
     def _addAutoSetupCode(self):
         self.addChunk(self._initialMethodComment)
 
@@ -469,9 +720,12 @@ class ClassCompiler:
         self._compiler = compiler
         self._mainMethodName = main_method_name
         self._decoratorsForNextMethod = []
+        self._memoizeNextMethod = None
         self._activeMethodsList = []        # stack while parsing/generating
         self._attrs = []
         self._finishedMethodsList = []      # store by order
+        self._inlinedMethodNames = set()
+        self._fragmentCount = 0
 
         self._main_method = self._spawnMethodCompiler(
             main_method_name,
@@ -500,8 +754,10 @@ class ClassCompiler:
             argspec=argspec,
             initialMethodComment=initialMethodComment,
             decorators=self._decoratorsForNextMethod,
+            memoize=self._memoizeNextMethod,
         )
         self._decoratorsForNextMethod = []
+        self._memoizeNextMethod = None
         self._activeMethodsList.append(methodCompiler)
         return methodCompiler
 
@@ -513,24 +769,106 @@ class ClassCompiler:
 
     def _swallowMethodCompiler(self, methodCompiler):
         methodCompiler.cleanupState()
+        if self._shouldMemoize(methodCompiler):
+            self._compiler.addRuntimeImport(
+                'from Cheetah.memoize import memoize as MEMOIZE', 'MEMOIZE',
+            )
+            methodCompiler._decorators.append('@MEMOIZE')
         self._finishedMethodsList.append(methodCompiler)
         return methodCompiler
 
-    startMethodDef = _spawnMethodCompiler
+    def _shouldMemoize(self, methodCompiler):
+        if methodCompiler._memoize is not None:
+            if methodCompiler._memoize and (
+                    methodCompiler._isGenerator or
+                    methodCompiler._hasReturnStatement
+            ):
+                raise AssertionError(
+                    '@memoize cannot be used with #return or #yield',
+                )
+            return methodCompiler._memoize
+        return (
+            self._compiler.setting('memoizePureDefs') and
+            methodCompiler is not self._main_method and
+            # Better to inline those
+            not (
+                self._compiler.setting('final') and
+                methodCompiler.isInlinable()
+            ) and
+            methodCompiler.isPure()
+        )
+
+    def startMethodDef(self, methodName, argspec, initialMethodComment):
+        if methodName in self._inlinedMethodNames:
+            raise AssertionError(
+                f'{methodName} was already inlined, it cannot be redefined '
+                f'in a final template',
+            )
+        return self._spawnMethodCompiler(
+            methodName, argspec, initialMethodComment,
+        )
+
+    def _inlineMethod(self, methodCompiler, line_col=None):
+        if not (
+                self._compiler.setting('final') and
+                methodCompiler.isInlinable() and
+                self._getActiveMethodCompiler().inlineMethod(
+                    methodCompiler, line_col,
+                )
+        ):
+            return False
+        self._inlinedMethodNames.add(methodCompiler.methodName())
+        return True
+
+    def inlineMethodCall(self, expr, line_col):
+        """Inline a `$self.foo()` placeholder in a final template.
+
+        Returns whether the call was inlined.
+        """
+        if (
+                not self._compiler.setting('final') or
+                len(expr) != 4 or
+                expr[0] != CheetahVar('self') or
+                not isinstance(expr[1], str) or
+                not expr[1].startswith('.') or
+                expr[2:] != ('(', ')')
+        ):
+            return False
+
+        methodName = expr[1][1:]
+        for methodCompiler in reversed(self._finishedMethodsList):
+            if methodCompiler.methodName() == methodName:
+                return self._inlineMethod(methodCompiler, line_col)
+        return False
+
+    def nextFragmentId(self):
+        self._fragmentCount += 1
+        return self._fragmentCount
 
     def addDecorator(self, decorator_expr):
         """Set the decorator to be used with the next method in the source.
 
         See _spawnMethodCompiler() and MethodCompiler for the details of how
         this is used.
+
+        `@memoize` and `@no_memoize` (unless those names were imported) force
+        or prevent memoization of the method instead.
         """
-        self._decoratorsForNextMethod.append(decorator_expr)
+        if (
+                decorator_expr in MEMOIZE_DECORATORS and
+                decorator_expr[1:] not in self._compiler._global_vars
+        ):
+            self._memoizeNextMethod = MEMOIZE_DECORATORS[decorator_expr]
+        else:
+            self._decoratorsForNextMethod.append(decorator_expr)
 
     def addAttribute(self, attr_expr):
         self._attrs.append(attr_expr)
 
     def addSuper(self, argspec):
-        methodName = self._getActiveMethodCompiler().methodName()
+        methodCompiler = self._getActiveMethodCompiler()
+        methodCompiler._usesSuper = True
+        methodName = methodCompiler.methodName()
         self.addFilteredChunk(
             f'super({CLASS_NAME}, self).{methodName}({argspec})',
         )
@@ -547,44 +885,57 @@ class ClassCompiler:
         self._swallowMethodCompiler(methCompiler)
 
         # insert the code to call the block
-        self.addChunk(f'self.{methodName}()')
+        if not self._inlineMethod(methCompiler):
+            self.addChunk(f'self.{methodName}()')
 
     def class_def(self):
-        return '\n'.join((
-            f'class {CLASS_NAME}({BASE_CLASS_NAME}):\n',
-            self.attributes(),
-            self.methodDefs(),
-        ))
+        return format_class_def(self._attrs, self.methodDefs())
 
     def methodDefs(self):
         return '\n\n'.join(
             method.methodDef() for method in self._finishedMethodsList
         )
 
-    def attributes(self):
-        if self._attrs:
-            return '\n'.join(INDENT + attr for attr in self._attrs) + '\n'
-        else:
-            return ''
+
+def format_attributes(attrs):
+    if attrs:
+        return '\n'.join(INDENT + attr for attr in attrs) + '\n'
+    else:
+        return ''
+
+
+def format_class_def(attrs, method_defs):
+    return '\n'.join((
+        f'class {CLASS_NAME}({BASE_CLASS_NAME}):\n',
+        format_attributes(attrs),
+        method_defs,
+    ))
 
 
 class LegacyCompiler(SettingsManager):
     parserClass = LegacyParser
     classCompilerClass = ClassCompiler
 
-    def __init__(self, source, settings=None):
+    def __init__(self, source, settings=None, constants=None):
         super().__init__()
         if settings:
             self.updateSettings(settings)
 
+        constants = dict(constants or {})
+        for name, value in constants.items():
+            _check_constant(name, value)
+
         assert isinstance(source, str), 'the yelp-cheetah compiler requires text, not bytes.'
 
         if source == '':
             warnings.warn('You supplied an empty string for the source!')
 
         self._original_source = source
-        self._parser = self.parserClass(source, compiler=self)
+        self._constants = constants
         self._class_compiler = None
+        # The ir node being generated
+        self._node = None
+        self._extends_name = None
         self._base_import = 'from Cheetah.Template import {} as {}'.format(
             CLASS_NAME, BASE_CLASS_NAME,
         )
@@ -594,6 +945,10 @@ class LegacyCompiler(SettingsManager):
             'from Cheetah.Template import NO_CONTENT',
         ]
         self._global_vars = {'io', 'NO_CONTENT', 'VFNS'}
+        # `lazyImports` statement => the import statement it replaces
+        self._original_imports = {}
+        # Functions of partial templates, called with an explicit `self`
+        self._partial_names = set()
 
     def __getattr__(self, name):
         """Provide one-way access to the methods and attributes of the
@@ -637,6 +992,7 @@ class LegacyCompiler(SettingsManager):
                 'yelp_cheetah only supports extends by module name',
             )
 
+        self._extends_name = extends_name
         self._base_import = 'from {} import {} as {}'.format(
             extends_name, CLASS_NAME, BASE_CLASS_NAME,
         )
@@ -645,9 +1001,20 @@ class LegacyCompiler(SettingsManager):
         # Partial templates expose their functions as globals, find all the
         # defined functions and add them to known global vars.
         if extends_name == 'Cheetah.partial_template':
-            self._global_vars.update(
-                get_defined_method_names(self._original_source),
+            method_names = get_defined_method_names(
+                self._original_source, self.parserClass,
             )
+            self._global_vars.update(method_names)
+            self._partial_names.update(method_names)
+
+    def addRuntimeImport(self, import_statement, name):
+        """Import `name` for the generated code, once it is needed."""
+        if name not in self._global_vars:
+            self._importStatements.append(import_statement)
+            self._global_vars.add(name)
+
+    def sourceHash(self):
+        return hashlib.sha1(self._original_source.encode('UTF-8')).hexdigest()
 
     def add_compiler_settings(self):
         settings_str = self.getStrConst()
@@ -657,65 +1024,153 @@ class LegacyCompiler(SettingsManager):
     def _add_import_statement(self, expr, line_col):
         imp_statement = ''.join(expr)
         imported_names = get_imported_names(imp_statement)
+        self._partial_names.update(get_partial_names(imp_statement))
 
         if not self._methodBodyChunks or self.setting('useLegacyImportMode'):
             # In the case where we are importing inline in the middle of a
             # source block we don't want to inadvertantly import the module at
             # the top of the file either
-            self._importStatements.append(imp_statement)
+            if self.setting('lazyImports'):
+                lazy_statement = self._lazy_import_statement(imp_statement)
+                self._original_imports[lazy_statement] = imp_statement
+                self._importStatements.append(lazy_statement)
+            else:
+                self._importStatements.append(imp_statement)
         self.addImportedVarNames(imported_names, raw_statement=imp_statement)
 
     addFrom = addImport = _add_import_statement
 
+    def _lazy_import_statement(self, import_statement):
+        """Rewrites an import to use `Cheetah.lazy`.  Relative and `*`
+        imports are left alone.
+        """
+        node = ast.parse(import_statement).body[0]
+        lines = []
+        if isinstance(node, ast.Import):
+            self.addRuntimeImport(
+                'from Cheetah.lazy import lazy_import as LAZY_IMPORT',
+                'LAZY_IMPORT',
+            )
+            for alias in node.names:
+                if alias.asname:
+                    lines.append(f'{alias.asname} = LAZY_IMPORT({alias.name!r})')
+                elif '.' in alias.name:
+                    # `import a.b` binds the (already imported) package `a`
+                    lines.append(f'LAZY_IMPORT({alias.name!r})')
+                    lines.append(f'import {alias.name.partition(".")[0]}')
+                else:
+                    lines.append(f'{alias.name} = LAZY_IMPORT({alias.name!r})')
+        elif node.level or any(alias.name == '*' for alias in node.names):
+            lines.append(import_statement)
+        else:
+            self.addRuntimeImport(
+                'from Cheetah.lazy import lazy_from as LAZY_FROM', 'LAZY_FROM',
+            )
+            for alias in node.names:
+                lines.append(
+                    f'{alias.asname or alias.name} = '
+                    f'LAZY_FROM({node.module!r}, {alias.name!r})',
+                )
+        return '\n'.join(lines)
+
     # methods for module code wrapping
 
-    def getModuleCode(self):
+    def _callback(self, kind):
+        """Returns the compiler which handles a kind of `ir.Node`, without
+        going through the `__getattr__`s.
+        """
+        if hasattr(type(self), kind):
+            return self
+        elif hasattr(self.classCompilerClass, kind):
+            return self._class_compiler
+        else:
+            return None  # the active method compiler
+
+    def generate(self, nodes):
+        """Generate the code for the nodes of a template."""
+        class_compiler = self._class_compiler
+        active_methods = class_compiler._activeMethodsList
+        callbacks = {}
+        try:
+            for node in nodes:
+                try:
+                    target = callbacks[node.kind]
+                except KeyError:
+                    target = callbacks[node.kind] = self._callback(node.kind)
+                if target is None:
+                    target = active_methods[-1]
+                self._node = node
+                getattr(target, node.kind)(*node.args)
+        except ParseError:
+            raise
+        except Exception as e:
+            raise ir.parse_error(self._original_source, node, e)
+
+    def compileClass(self):
+        """Parse the source, returning the finished ClassCompiler."""
+        nodes = ir.run_passes(
+            ir.parse(self._original_source, self.parserClass),
+            self.setting('passes'),
+        )
         class_compiler = self._spawnClassCompiler()
         with self._set_class_compiler(class_compiler):
-            self._parser.parse()
+            self.generate(nodes)
             class_compiler.cleanupState()
+        return class_compiler
 
-        moduleDef = textwrap.dedent(
-            """
-            from __future__ import absolute_import
-            from __future__ import unicode_literals
-            {imports}
-            {base_import}
-
+    def getModuleCode(self):
+        class_compiler = self.compileClass()
+        module_code = format_module_code(
+            self._importStatements,
+            self._base_import,
+            class_compiler.class_def(),
+        )
+        if self._constants:
+            module_code = fold_constant_branches(module_code)
+        return module_code
 
-            # This is compiled yelp_cheetah sourcecode
-            __YELP_CHEETAH__ = True
 
+def format_module_code(import_statements, base_import, class_def):
+    moduleDef = textwrap.dedent(
+        """
+        from __future__ import absolute_import
+        from __future__ import unicode_literals
+        {imports}
+        {base_import}
 
-            {class_def}
-            if __name__ == '__main__':
-                from os import environ
-                from sys import stdout
-                stdout.write({class_name}(namespace=environ).respond())
-            """,
-        ).strip().format(
-            imports='\n'.join(self._importStatements),
-            base_import=self._base_import,
-            class_def=class_compiler.class_def(),
-            class_name=CLASS_NAME,
-        ) + '\n'
 
-        return moduleDef
+        # This is compiled yelp_cheetah sourcecode
+        __YELP_CHEETAH__ = True
 
 
-def get_defined_method_names(original_source):
-    class CollectsMethodNamesCompiler:
-        def __init__(self):
-            self.method_names = set()
+        {class_def}
+        if __name__ == '__main__':
+            from os import environ
+            from sys import stdout
+            stdout.write({class_name}(namespace=environ).respond())
+        """,
+    ).strip().format(
+        imports='\n'.join(import_statements),
+        base_import=base_import,
+        class_def=class_def,
+        class_name=CLASS_NAME,
+    ) + '\n'
 
-        # Trivially allow anything outside of startMethodDef
-        def __getattr__(self, name):
-            return lambda *args, **kwargs: None
+    return moduleDef
 
-        # Collect our function names
-        def startMethodDef(self, method_name, *args):
-            self.method_names.add(method_name)
 
-    compiler = CollectsMethodNamesCompiler()
-    LegacyParser(original_source, compiler=compiler).parse()
-    return compiler.method_names
+def get_partial_names(import_statement):
+    """Names of the partial template functions imported by a `from ...
+    import ...`, not the other names of the partial templates' modules.
+    """
+    node = ast.parse(import_statement).body[0]
+    if not isinstance(node, ast.ImportFrom) or node.level:
+        return set()
+    function_names = partial_template_names(node.module)
+    if function_names is None:
+        return set()
+    return {
+        alias.asname or alias.name
+        for alias in node.names
+        if alias.name in function_names
+    }
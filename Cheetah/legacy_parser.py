@@ -44,6 +44,8 @@ DIRECTIVE_START_RE = re.compile(
     escape_lookbehind + re.escape('#') + r'(?=([A-Za-z_]|@[A-Za-z_]))',
 )
 DIRECTIVE_END_RE = re.compile(escape_lookbehind + re.escape('#'))
+# Every top level token starts with one of these
+TOKEN_START_RE = re.compile(r'[$#]')
 
 
 directiveNamesAndParsers = {
@@ -79,12 +81,15 @@ directiveNamesAndParsers = {
     'py': None,
     'attr': 'eatAttr',
     'block': 'eatBlock',
+    'cache': 'eatCache',
     'end': 'eatEndDirective',
 }
 
 CLOSABLE_DIRECTIVES = frozenset({
-    'block', 'compiler-settings', 'def', 'for', 'if', 'try', 'while', 'with',
+    'block', 'cache', 'compiler-settings', 'def', 'for', 'if', 'try', 'while',
+    'with',
 })
+CACHE_ARGUMENTS = frozenset(('key', 'ttl'))
 INDENTING_DIRECTIVES = frozenset({
     'compiler-settings', 'else', 'elif', 'except', 'finally', 'for', 'if',
     'try', 'while', 'with',
@@ -105,6 +110,13 @@ class ParseError(ValueError):
         stream.setPos(min(len(stream) - 1, pos))
         self.msg = msg
 
+    def __reduce__(self):
+        # The stream is often the parser, which can't be pickled
+        return (
+            _rebuild_parse_error,
+            (type(self), self.stream.src(), self.msg, self.stream.pos()),
+        )
+
     def __str__(self):
         stream = self.stream
         report = ''
@@ -155,6 +167,10 @@ def fail_with_our_parse_error(func):
     return inner
 
 
+def _rebuild_parse_error(cls, src, msg, pos):
+    return cls(SourceReader(src), msg, pos=pos)
+
+
 class UnknownDirectiveError(ParseError):
     pass
 
@@ -438,10 +454,21 @@ class LegacyParser(_LowLevelParser):
     # non-directive eat methods
 
     def eatPlainText(self):
-        start = self.pos()
-        while not self.atEnd() and not self.matchTopLevelToken():
-            self.advance()
-        text = self.readTo(self.pos(), start=start)
+        start = pos = self.pos()
+        src = self.src()
+        end = self.breakPoint()
+        # Jump from `$` / `#` to the next `$` / `#` until one starts a token
+        while True:
+            match = TOKEN_START_RE.search(src, pos, end)
+            if match is None:
+                pos = end
+                break
+            pos = match.start()
+            self.setPos(pos)
+            if self.matchTopLevelToken():
+                break
+            pos += 1
+        text = self.readTo(pos, start=start)
         text = text.replace('\\$', '$').replace('\\#', '#')
         self._compiler.addStrConst(text)
 
@@ -571,7 +598,7 @@ class LegacyParser(_LowLevelParser):
         pos = self.pos()
         directiveName = False
         for key in CLOSABLE_DIRECTIVES:
-            if self.find(key, pos) == pos:
+            if self.src().startswith(key, pos):
                 directiveName = key
                 break
         if not directiveName:
@@ -589,6 +616,8 @@ class LegacyParser(_LowLevelParser):
             self._compiler.add_compiler_settings()
         elif directiveName == 'block':
             self._compiler.closeBlock()
+        elif directiveName == 'cache':
+            self._compiler.endCache()
         else:
             assert directiveName in {'while', 'for', 'if', 'try', 'with'}
             self._compiler.commitStrConst()
@@ -762,6 +791,71 @@ class LegacyParser(_LowLevelParser):
         self._eatRestOfDirectiveTag(isLineClearToStartToken, endOfFirstLine)
         self._compiler.addSuper(argspec)
 
+    def eatCache(self):
+        isLineClearToStartToken = self.isLineClearToStartToken()
+        endOfFirstLinePos = self.findEOL()
+        line_col = self.getRowCol()
+        self.getDirectiveStartToken()
+        self.advance(len('cache'))
+        self.getWhiteSpace()
+        arguments = self._get_keyword_arguments(CACHE_ARGUMENTS)
+        if not self.atEnd() and self.peek() == ':':
+            self.advance()
+        self._eatRestOfDirectiveTag(isLineClearToStartToken, endOfFirstLinePos)
+        self.pushToOpenDirectivesStack('cache')
+        self._compiler.startCache(
+            arguments.get('key'), arguments.get('ttl'), line_col,
+        )
+
+    def _get_keyword_arguments(self, names):
+        """Reads `name=expr name=expr` and returns {name: expr parts}"""
+        start_pos = self.pos()
+        expr = self.get_unbraced_expression(stop_chars=':')
+        tokens = [
+            (i, part) for i, part in enumerate(expr)
+            if not isinstance(part, str) or part.strip()
+        ]
+
+        # (name, index of the name, index of the start of the value)
+        starts = []
+        depth = 0
+        for j, (i, part) in enumerate(tokens):
+            if part in brace_starts:
+                depth += 1
+            elif part in brace_ends:
+                depth -= 1
+            elif (
+                    depth == 0 and
+                    isinstance(part, str) and
+                    IDENT_RE.fullmatch(part) and
+                    j + 1 < len(tokens) and
+                    tokens[j + 1][1] == '='
+            ):
+                starts.append((part, i, tokens[j + 1][0] + 1))
+
+        if tokens and (not starts or starts[0][1] != tokens[0][0]):
+            raise ParseError(self, 'Expected name=expression', pos=start_pos)
+
+        arguments = {}
+        ends = [name_index for _, name_index, _ in starts[1:]] + [len(expr)]
+        for (name, _, value_start), end in zip(starts, ends):
+            if name not in names or name in arguments:
+                raise ParseError(
+                    self,
+                    'Invalid argument: {} (expected one of: {})'.format(
+                        name, ', '.join(sorted(names)),
+                    ),
+                    pos=start_pos,
+                )
+            value = expr[value_start:end]
+            if all(isinstance(p, str) and not p.strip() for p in value):
+                raise ParseError(
+                    self, f'Expected an expression for {name}=',
+                    pos=start_pos,
+                )
+            arguments[name] = value
+        return arguments
+
     def eatSlurp(self):
         if self.isLineClearToStartToken():
             self._compiler.handleWSBeforeDirective()
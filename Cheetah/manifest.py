@@ -0,0 +1,102 @@
+"""Skip recompiling templates which haven't changed.
+
+Each directory of templates gets a manifest file mapping the templates'
+filenames to a key: a hash of everything the compiled output depends on.
+That is the template's source, the compiler itself, the compile settings and
+the partial templates it imports with their functions (which are called
+differently, see `Cheetah.dependencies.partial_imports`).  Directories can share
+one manifest instead (`cheetah-compile --manifest`), kept outside of them.
+"""
+import functools
+import glob
+import hashlib
+import json
+import os.path
+
+import _cheetah
+
+from Cheetah.dependencies import partial_imports
+
+
+MANIFEST_FILENAME = '.cheetah_manifest.json'
+
+
+@functools.lru_cache(maxsize=None)
+def compiler_version():
+    """A hash of the compiler's source and of the `_cheetah` extension (the
+    parser's `SourceReaderCore`), so a new compiler recompiles everything.
+    """
+    sha = hashlib.sha256()
+    pattern = os.path.join(os.path.dirname(__file__), '*.py')
+    for filename in (*sorted(glob.glob(pattern)), _cheetah.__file__):
+        with open(filename, 'rb') as f:
+            sha.update(f.read())
+    return sha.hexdigest()
+
+
+def template_key(source, **kwargs):
+    """The key of a template's compiled output.
+
+    :param text source: The template's source.
+    :param kwargs: The arguments it is compiled with.
+    :raises ParseError: for syntax errors in its `#import` / `#from`
+        directives.
+    """
+    sha = hashlib.sha256()
+    for part in (
+            compiler_version(),
+            repr(sorted(kwargs.items())),
+            repr(partial_imports(source)),
+            source,
+    ):
+        sha.update(part.encode('UTF-8'))
+        sha.update(b'\0')
+    return sha.hexdigest()
+
+
+class Manifest:
+    """The keys of the templates compiled in a directory.
+
+    :param filename: A manifest file to use instead of the directory's,
+        which other directories may share: it keys templates by their path
+        relative to it.
+    """
+
+    def __init__(self, directory, filename=None):
+        if filename is None:
+            self.filename = os.path.join(directory, MANIFEST_FILENAME)
+            self._root = None
+        else:
+            self.filename = filename
+            self._root = os.path.dirname(os.path.abspath(filename))
+        try:
+            with open(self.filename, encoding='UTF-8') as f:
+                self._keys = json.load(f)
+        except (OSError, ValueError):
+            self._keys = {}
+        self._changed = False
+
+    def _name(self, filename):
+        if self._root is None:
+            return os.path.basename(filename)
+        else:
+            return os.path.relpath(os.path.abspath(filename), self._root)
+
+    def is_fresh(self, filename, key, target):
+        """Whether `target` was compiled from `filename` with this key."""
+        return (
+            self._keys.get(self._name(filename)) == key and
+            os.path.exists(target)
+        )
+
+    def record(self, filename, key):
+        name = self._name(filename)
+        if self._keys.get(name) != key:
+            self._keys[name] = key
+            self._changed = True
+
+    def save(self):
+        if self._changed:
+            with open(self.filename, 'w', encoding='UTF-8') as f:
+                json.dump(self._keys, f, indent=0, sort_keys=True)
+            self._changed = False
@@ -0,0 +1,92 @@
+"""Memoization of the output of `#def`s.
+
+The compiler decorates pure `#def`s (see the `memoizePureDefs` setting) and
+`#def`s marked with `#@memoize` with `memoize`.  Only calls whose arguments
+are simple values (None, bool, numbers, text, bytes and tuples / frozensets
+of those) are memoized, other calls go straight to the method.
+"""
+import collections
+import functools
+import threading
+
+from Cheetah.Template import NO_CONTENT
+
+
+DEFAULT_MAXSIZE = 256
+
+_VALUE_TYPES = frozenset((type(None), bool, int, str, bytes))
+
+
+class NotAValue(TypeError):
+    pass
+
+
+def value_key(obj):
+    """Returns a key for a simple value which, unlike the value itself, does
+    not compare equal to values rendering differently (`1` / `True` / `1.0`).
+    """
+    tp = type(obj)
+    if tp is tuple:
+        return (tp, tuple(value_key(o) for o in obj))
+    elif tp is frozenset:
+        return (tp, frozenset(value_key(o) for o in obj))
+    elif tp is float:
+        # -0.0 == 0.0 and nan != nan
+        return (tp, repr(obj))
+    elif tp in _VALUE_TYPES:
+        return (tp, obj)
+    else:
+        raise NotAValue(tp)
+
+
+def memoize(func=None, *, maxsize=DEFAULT_MAXSIZE):
+    """Decorate a template method with a bounded LRU cache of its output.
+
+    The output also depends on the current filter, which is part of the key.
+    """
+    if func is None:
+        return functools.partial(memoize, maxsize=maxsize)
+
+    cache = collections.OrderedDict()
+    lock = threading.Lock()
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        try:
+            key = (
+                self._CHEETAH__currentFilter,
+                value_key(args),
+                value_key(tuple(sorted(kwargs.items()))),
+            )
+            hash(key)
+        except TypeError:
+            return func(self, *args, **kwargs)
+
+        with lock:
+            output = cache.get(key)
+            if output is not None:
+                cache.move_to_end(key)
+
+        if output is None:
+            transaction, self.transaction = self.transaction, None
+            try:
+                output = func(self, *args, **kwargs)
+            finally:
+                self.transaction = transaction
+            with lock:
+                cache[key] = output
+                if len(cache) > maxsize:
+                    cache.popitem(last=False)
+
+        if not self.transaction:
+            return output
+        else:
+            self.transaction.write(output)
+            return NO_CONTENT
+
+    def cache_clear():
+        with lock:
+            cache.clear()
+
+    wrapper.cache_clear = cache_clear
+    return wrapper
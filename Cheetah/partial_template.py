@@ -1,14 +1,29 @@
 import functools
 import inspect
 import sys
+import threading
 import types
 
+import _cheetah
+
+from Cheetah import filters
 from Cheetah.Template import Template
 
 
 NO_ARGUMENT = object()
 
 
+def py_get_caller_self():
+    """Returns `self` from the frame which called our caller."""
+    return inspect.currentframe().f_back.f_back.f_locals['self']
+
+
+if '__pypy__' in sys.builtin_module_names:  # pragma: pypy cover
+    get_caller_self = py_get_caller_self
+else:  # pragma: pypy no cover
+    get_caller_self = _cheetah.get_caller_self
+
+
 class PartialMethodNotCalledFromTemplate(TypeError):
     pass
 
@@ -26,6 +41,8 @@ def default_self(func):
 
     If explicit 'self' is passed into the function it is used.
     Otherwise the function looks for self in the previous stack frame.
+    Templates importing partial templates pass `self` explicitly (see
+    `Cheetah.legacy_compiler.get_partial_names`).
     """
 
     @functools.wraps(func)
@@ -41,7 +58,7 @@ def default_self(func):
             ):
                 args = (self,) + args
             try:
-                self = inspect.currentframe().f_back.f_locals['self']
+                self = get_caller_self()
             except KeyError:
                 _raise_not_called_from_template()
         try:
@@ -100,3 +117,49 @@ class PartialTemplateType(type):
 
 class YelpCheetahTemplate(Template, metaclass=PartialTemplateType):
     pass
+
+
+class RenderContext:
+    """Calls partial functions outside of a template.
+
+    The context is meant to be created once and shared: each thread renders
+    against its own reused template.
+
+        context = RenderContext()
+        html = context.render(partial_function, arg)
+    """
+
+    def __init__(self, filter_fn=filters.markup_filter, fragment_cache=None):
+        self.filter_fn = filter_fn
+        self.fragment_cache = fragment_cache
+        self._local = threading.local()
+
+    def get_template(self):
+        """Returns the template used by the current thread."""
+        try:
+            return self._local.template
+        except AttributeError:
+            template = self._local.template = Template(
+                filter_fn=self.filter_fn, fragment_cache=self.fragment_cache,
+            )
+            return template
+
+    def render(self, func, *args, **kwargs):
+        """Call a partial function and return its output as text."""
+        try:
+            template = self._local.template
+        except AttributeError:
+            template = self.get_template()
+        transaction = template.transaction
+        # Render into a fresh transaction, a call which raised may also have
+        # left its transaction behind.
+        template.transaction = None
+        try:
+            return func(template, *args, **kwargs)
+        finally:
+            template.transaction = transaction
+
+
+DEFAULT_CONTEXT = RenderContext()
+# Render a partial function outside of a template using `DEFAULT_CONTEXT`
+render_partial = DEFAULT_CONTEXT.render
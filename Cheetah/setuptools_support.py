@@ -40,16 +40,16 @@ def _datafiles(directories):
     return datafiles
 
 
-def _get_run_method(base, directories):
+def _get_run_method(base, directories, jobs=1):
     def run(self):
-        compile_directories(directories)
+        compile_directories(directories, jobs=jobs)
         base.run(self)
     return run
 
 
-def _get_build_py_cls(base, directories):
+def _get_build_py_cls(base, directories, jobs=1):
     class build_py(base):
-        run = _get_run_method(base, directories)
+        run = _get_run_method(base, directories, jobs)
 
     return build_py
 
@@ -65,7 +65,9 @@ def setup_callback(dist, attr, value):
     for directory in directories:
         assert not os.path.isabs(directory), directory
     build_py_base = dist.cmdclass.get('build_py', _build_py)
-    dist.cmdclass['build_py'] = _get_build_py_cls(build_py_base, directories)
+    dist.cmdclass['build_py'] = _get_build_py_cls(
+        build_py_base, directories, value.get('jobs', 1),
+    )
     dist.packages = dist.packages or []
     dist.packages.extend(_packages(directories))
     _update_many(_datafiles(directories), dist.package_data)
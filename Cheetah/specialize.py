@@ -0,0 +1,88 @@
+"""Specialized variants of a template for a few namespace values.
+
+Values such as the locale or the site theme only take a handful of values but
+every render re-evaluates the `#if` branches on them.  A variant is compiled
+for each combination with those values baked in as constants (see the
+`constants` argument of `compile_source`) and a dispatcher picks the variant
+matching the namespace when the template is instantiated.  Any other
+namespace gets the generic template.
+"""
+from Cheetah.compile import compile_to_class
+
+
+def _freeze(value):
+    """A hashable stand-in for a value: `1 == True` but they render
+    differently, and constants may be lists, dicts or sets.
+    """
+    if isinstance(value, (list, tuple)):
+        frozen = tuple(_freeze(item) for item in value)
+    elif isinstance(value, dict):
+        # in order, it is rendered in order
+        frozen = tuple((_freeze(k), _freeze(v)) for k, v in value.items())
+    elif isinstance(value, (set, frozenset)):
+        frozen = frozenset(_freeze(item) for item in value)
+    else:
+        frozen = value
+    return (type(value), frozen)
+
+
+def _key(values):
+    return tuple(_freeze(value) for value in values)
+
+
+class VariantDispatcher:
+    """Instantiates the variant of a template compiled for the values of
+    `names` in the namespace, falling back to the generic template.
+    """
+
+    def __init__(self, names, variants, generic):
+        """
+        :param names: Namespace names the variants are keyed on.
+        :param variants: Iterable of (values, template class) where `values`
+            is a tuple aligned with `names`.
+        :param type generic: Template class used for other namespaces.
+        """
+        self.names = tuple(names)
+        self.variants = {
+            _key(values): cls for values, cls in variants
+        }
+        self.generic = generic
+
+    def select(self, namespace=None):
+        """Returns the template class to use for a namespace."""
+        namespace = namespace or {}
+        if not all(name in namespace for name in self.names):
+            return self.generic
+        try:
+            key = _key(namespace[name] for name in self.names)
+            return self.variants.get(key, self.generic)
+        except TypeError:  # unhashable value, not a constant anyway
+            return self.generic
+
+    def __call__(self, namespace=None, **kwargs):
+        return self.select(namespace)(namespace, **kwargs)
+
+
+def compile_variants(source, names, values, **kwargs):
+    """Compile a template specialized for each tuple of values.
+
+    :param text source: Text representing the cheetah source.
+    :param names: Namespace names to specialize on.
+    :param values: Iterable of tuples of values aligned with `names`.
+    :param kwargs: Keyword args passed to `compile_to_class`
+    :return: A dispatcher which is called like a template class.
+    :rtype: VariantDispatcher
+    """
+    names = tuple(names)
+    variants = [
+        (
+            values_tuple,
+            compile_to_class(
+                source,
+                constants=dict(zip(names, values_tuple, strict=True)),
+                **kwargs,
+            ),
+        )
+        for values_tuple in map(tuple, values)
+    ]
+    return VariantDispatcher(names, variants, compile_to_class(source, **kwargs))
@@ -0,0 +1,150 @@
+"""Find the modules a template refers to while it is being compiled, and the
+compiled template modules of packages (`discover_modules`).
+
+While compiling nothing is imported, templates are found by looking for their
+`.tmpl` (or compiled `.py`) files in the current directory and `sys.path`.
+The compiled output of a template which `#from` imports partial template
+functions depends on them: run compiles from the directory the templates'
+modules are relative to.  The keys of compiled output (see
+`Cheetah.manifest` and `Cheetah.compile_cache`) include the partial
+templates found and their functions, output compiled elsewhere isn't reused.
+
+Where a module's template is and whether it is a partial template are
+cached, `cache_clear` forgets them.  The compile entry points
+(`cheetah-compile`, `compile_directories`) call it, long running processes
+compiling with `compile_source` should too when the templates, the current
+directory or `sys.path` change.
+"""
+import ast
+import functools
+import os.path
+import pkgutil
+import re
+import sys
+
+from Cheetah.ir import get_defined_method_names
+from Cheetah.legacy_parser import ParseError
+
+
+PARTIAL_TEMPLATE_EXTENDS_RE = re.compile(
+    r'^#extends[ \t]+Cheetah\.partial_template[ \t]*$', re.MULTILINE,
+)
+PARTIAL_TEMPLATE_IMPORT_RE = re.compile(
+    r'^from Cheetah\.partial_template import ', re.MULTILINE,
+)
+
+
+def find_module_file(module_name, extension, search_path=None):
+    """Returns the filename for a module with the given extension or `None`.
+
+    :param text module_name: Dotted module name, as passed to `#extends`.
+    :param text extension: For instance `.tmpl`.
+    :param search_path: Directories to search, defaults to the current
+        directory and `sys.path`.
+    """
+    if module_name.startswith('.'):
+        return None
+    if search_path is None:
+        search_path = (os.curdir, *sys.path)
+    relative = os.path.join(*module_name.split('.')) + extension
+    for directory in search_path:
+        filename = os.path.join(directory, relative)
+        if os.path.isfile(filename):
+            return filename
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def find_template_file(module_name):
+    """The normalized filename of a module's `.tmpl` file or `None`, looked
+    up in the current directory and `sys.path`.
+    """
+    filename = find_module_file(module_name, '.tmpl')
+    if filename is None:
+        return None
+    return os.path.normpath(filename)
+
+
+def _read(filename):
+    with open(filename, encoding='UTF-8') as f:
+        return f.read()
+
+
+def find_template_source(module_name, search_path=None):
+    """Returns the source of the `.tmpl` file for a module name or `None` if
+    the module is not a template (for instance `Cheetah.Template`).
+
+    :param text module_name: Dotted module name, as passed to `#extends`.
+    :param search_path: Directories to search, defaults to the current
+        directory and `sys.path`.
+    """
+    filename = find_module_file(module_name, '.tmpl', search_path)
+    if filename is None:
+        return None
+    return _read(filename)
+
+
+def _compiled_method_names(source):
+    # The template's class is the only one in its module
+    for node in ast.parse(source).body:
+        if isinstance(node, ast.ClassDef):
+            return {
+                child.name
+                for child in node.body
+                if isinstance(child, ast.FunctionDef)
+            }
+    return set()
+
+
+@functools.lru_cache(maxsize=None)
+def partial_template_names(module_name):
+    """The names of the functions of a partial template (a template which
+    `#extends Cheetah.partial_template`) or `None` for other modules, going
+    by its `.tmpl` or compiled `.py`.
+    """
+    source = find_template_source(module_name)
+    if source is not None:
+        if not PARTIAL_TEMPLATE_EXTENDS_RE.search(source):
+            return None
+        try:
+            return frozenset(get_defined_method_names(source))
+        except ParseError:  # compiling the partial template reports it
+            return frozenset()
+    filename = find_module_file(module_name, '.py')
+    if filename is None:
+        return None
+    source = _read(filename)
+    if not PARTIAL_TEMPLATE_IMPORT_RE.search(source):
+        return None
+    return frozenset(_compiled_method_names(source))
+
+
+def is_partial_template_module(module_name):
+    """Whether a module is a partial template."""
+    return partial_template_names(module_name) is not None
+
+
+def cache_clear():
+    """Forgets which modules are (partial) templates."""
+    find_template_file.cache_clear()
+    partial_template_names.cache_clear()
+
+
+def trivial(_):
+    return True
+
+
+def discover_modules(package, module_match_func=trivial):
+    """Yields modules matching module_match_func
+
+    :param package: A python package (something with __init__.py)
+    :param module_match_func: Function taking a module and returning True if
+        the module is to be included in the output.
+    """
+    for _, module_name, _ in pkgutil.walk_packages(
+            package.__path__,
+            prefix=package.__name__ + '.',
+    ):
+        module = __import__(module_name, fromlist=['__trash'], level=0)
+        if module_match_func(module):
+            yield module
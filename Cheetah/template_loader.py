@@ -0,0 +1,144 @@
+"""Compile templates to classes on demand, keeping a bounded number of them.
+
+Every `Cheetah.compile.compile_to_class` call creates a new class (and
+module) which lives as long as anything refers to it.  Services compiling
+templates from configuration or user input would rather use a loader:
+
+    loader = TemplateLoader(('templates',), maxsize=256)
+    cls = loader.load('emails.welcome')  # templates/emails/welcome.tmpl
+    cls = loader.from_source(source)
+
+Identical sources (with the same compile arguments) share a class.  The
+`maxsize` most recently used classes are kept by the loader, the others are
+only kept while they (or their instances) are used elsewhere: a template
+which is loaded again before it is collected isn't compiled again.  Classes
+refer to themselves through their module, they are collected by the cycle
+collector rather than as soon as they're unused.
+"""
+import collections
+import marshal
+import os
+import threading
+import weakref
+
+from Cheetah import compile_cache
+from Cheetah.compile import _class_from_code
+from Cheetah.compile import _compile_code
+from Cheetah.template_finder import find_module_file
+
+
+LoaderStats = collections.namedtuple(
+    'LoaderStats',
+    (
+        'hits', 'misses', 'evictions',
+        # Number of classes kept by the loader / still alive
+        'cached', 'alive',
+        # Size of the (marshalled) code of the classes still alive
+        'code_bytes',
+    ),
+)
+
+
+class TemplateLoader:
+    """Resolves template names and sources to compiled classes.
+
+    :param search_path: Directories to look for `.tmpl` files in, defaults
+        to the current directory and `sys.path`.
+    :param int maxsize: Number of classes kept by the loader.
+    :param cache: A `Cheetah.compile_cache.CompileCache` for the compiles,
+        defaults to `Cheetah.compile_cache.DEFAULT_CACHE`.
+    :param kwargs: Keyword args passed to `compile_source`
+    """
+
+    def __init__(self, search_path=None, maxsize=128, cache=None, **kwargs):
+        self.search_path = search_path
+        self.maxsize = maxsize
+        self.cache = cache
+        self.compile_kwargs = kwargs
+        self._lock = threading.Lock()
+        self._classes = collections.OrderedDict()
+        self._alive = weakref.WeakValueDictionary()
+        self._code_bytes = weakref.WeakKeyDictionary()
+        # filename => ((mtime, size), key) of the templates loaded by name
+        self._files = {}
+        self._hits = self._misses = self._evictions = 0
+
+    def _get(self, key):
+        cls = self._alive.get(key)
+        if cls is not None:
+            self._hits += 1
+            self._remember(key, cls)
+        return cls
+
+    def _remember(self, key, cls):
+        self._classes[key] = cls
+        self._classes.move_to_end(key)
+        while len(self._classes) > self.maxsize:
+            self._classes.popitem(last=False)
+            self._evictions += 1
+
+    def _load(self, key, source):
+        with self._lock:
+            cls = self._get(key)
+            if cls is None:
+                self._misses += 1
+                code = _compile_code(
+                    source, cache=self.cache, **self.compile_kwargs,
+                )
+                cls = _class_from_code(code)
+                self._alive[key] = cls
+                self._code_bytes[cls] = len(marshal.dumps(code))
+                self._remember(key, cls)
+            return cls
+
+    def from_source(self, source):
+        """The class of a template source."""
+        if not isinstance(source, str):
+            raise TypeError(f'`source` must be `str` but got {type(source)!r}')
+        key = compile_cache.cache_key(source, **self.compile_kwargs)
+        return self._load(key, source)
+
+    def load(self, name):
+        """The class of a template by (dotted) name, recompiled when its
+        file changes.
+
+        :raises ModuleNotFoundError: if there's no such template.
+        """
+        filename = find_module_file(name, '.tmpl', self.search_path)
+        if filename is None:
+            raise ModuleNotFoundError(f'No template named {name!r}', name=name)
+        st = os.stat(filename)
+        stamp = (st.st_mtime_ns, st.st_size)
+
+        with self._lock:
+            known_stamp, key = self._files.get(filename, (None, None))
+            if known_stamp == stamp:
+                cls = self._get(key)
+                if cls is not None:
+                    return cls
+
+        with open(filename, encoding='UTF-8') as f:
+            source = f.read()
+        key = compile_cache.cache_key(source, **self.compile_kwargs)
+        with self._lock:
+            self._files[filename] = (stamp, key)
+        return self._load(key, source)
+
+    def stats(self):
+        with self._lock:
+            return LoaderStats(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                cached=len(self._classes),
+                alive=len(self._alive),
+                code_bytes=sum(self._code_bytes.values()),
+            )
+
+    def clear(self):
+        """Forgets the classes, those still used elsewhere aren't reused."""
+        with self._lock:
+            self._classes.clear()
+            self._alive.clear()
+            self._code_bytes.clear()
+            self._files.clear()
@@ -0,0 +1,76 @@
+"""Import templates ahead of time, in the master process of a pre-fork server.
+
+Workers which import templates after they are forked each get their own
+copy of the modules.  The modules a master imports before forking are
+shared copy-on-write, until the garbage collector of a worker touches their
+objects' headers.  `warmup` imports every template module of some packages
+and then moves everything (see `gc.freeze`) out of the collector's reach:
+
+    import gc
+    gc.disable()  # early, avoids freeing memory which would leave holes
+    ...
+    result = warmup((myapp.templates,), namespaces={
+        'myapp.templates.home': {'user': None},
+    })
+    log.info('warmed up %d templates in %.3fs', result.templates, result.seconds)
+    # fork the workers, which call `gc.enable()`
+"""
+import collections
+import gc
+import time
+
+from Cheetah.legacy_compiler import CLASS_NAME
+from Cheetah.template_finder import discover_modules
+
+
+WarmupResult = collections.namedtuple(
+    'WarmupResult',
+    ('modules', 'templates', 'rendered', 'frozen', 'seconds'),
+)
+
+
+def is_template_module(module):
+    return getattr(module, '__YELP_CHEETAH__', False)
+
+
+def warmup(packages, namespaces=None, freeze=True):
+    """Imports all the modules in template packages.
+
+    :param packages: Python packages (something with __init__.py) of compiled
+        templates.
+    :param dict namespaces: Module name => namespace, these templates are
+        instantiated and rendered once with it (as a smoke test, and to run
+        the code which only runs on first use).
+    :param bool freeze: Call `gc.freeze()` once everything is imported.
+    :return: A `WarmupResult`, with the number of modules imported, of
+        templates among them, of templates rendered, of objects frozen
+        and the time it took.
+    :raises ValueError: if some of the `namespaces` are not for templates
+        of the packages.
+    """
+    namespaces = namespaces or {}
+    start = time.perf_counter()
+    modules = templates = 0
+    rendered = set()
+    for package in packages:
+        for module in discover_modules(package):
+            modules += 1
+            if not is_template_module(module):
+                continue
+            templates += 1
+            if module.__name__ in namespaces:
+                cls = getattr(module, CLASS_NAME)
+                cls(namespace=namespaces[module.__name__]).respond()
+                rendered.add(module.__name__)
+    missing = set(namespaces) - rendered
+    if missing:
+        raise ValueError(f'Not templates: {", ".join(sorted(missing))}')
+    if freeze:
+        gc.freeze()
+    return WarmupResult(
+        modules=modules,
+        templates=templates,
+        rendered=len(rendered),
+        frozen=gc.get_freeze_count(),
+        seconds=time.perf_counter() - start,
+    )
@@ -0,0 +1,192 @@
+"""Notice changed templates, for `cheetah-compile --watch`.
+
+Changes are noticed with inotify on Linux, by polling elsewhere.  A changed
+template has to be recompiled along with the templates which depend on it
+(see `Cheetah.dependencies`): flattening inlines the templates a template
+`#extends` and calls to partial templates are compiled differently.
+"""
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+from Cheetah.dependencies import template_dependencies
+from Cheetah.dependencies import template_files
+
+# How long to wait for more changes after one, editors write files in
+# several steps
+SETTLE_TIME = .01
+POLL_INTERVAL = .05
+
+# <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct('iIII')
+
+
+def walk_templates(directories, extension='.tmpl'):
+    for directory in directories:
+        for dirpath, _, filenames in os.walk(directory):
+            for filename in filenames:
+                if filename.endswith(extension):
+                    yield os.path.abspath(os.path.join(dirpath, filename))
+
+
+class InotifyWatcher:
+    """Watches directories (recursively) with inotify, through ctypes."""
+
+    MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+    def __init__(self, directories, extension='.tmpl'):
+        self.extension = extension
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (
+            ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32,
+        )
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self._directories = {}
+        for directory in directories:
+            for dirpath, _, _ in os.walk(directory):
+                self._watch(dirpath)
+
+    def _watch(self, directory):
+        wd = self._add_watch(self.fd, os.fsencode(directory), self.MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f'cannot watch {directory}')
+        self._directories[wd] = os.path.abspath(directory)
+
+    def _read(self):
+        """Returns the changed templates of the queued events."""
+        changed = set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+        pos = 0
+        while pos < len(data):
+            wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, pos)
+            pos += INOTIFY_EVENT.size
+            name = os.fsdecode(data[pos:pos + length].rstrip(b'\0'))
+            pos += length
+            directory = self._directories.get(wd)
+            if directory is None:  # the queue overflowed
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                try:
+                    self._watch(path)
+                except FileNotFoundError:  # already moved / removed again
+                    continue
+                changed.update(walk_templates((path,), self.extension))
+            elif (
+                    name.endswith(self.extension) and
+                    mask & (IN_CLOSE_WRITE | IN_MOVED_TO)
+            ):
+                changed.add(path)
+        return changed
+
+    def changes(self):
+        """Yields the sets of templates which changed, forever."""
+        while True:
+            select.select((self.fd,), (), ())
+            changed = self._read()
+            while select.select((self.fd,), (), (), SETTLE_TIME)[0]:
+                changed |= self._read()
+            if changed:
+                yield changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Watches directories by comparing their templates' mtimes."""
+
+    def __init__(self, directories, extension='.tmpl', interval=POLL_INTERVAL):
+        self.directories = directories
+        self.extension = extension
+        self.interval = interval
+        self._mtimes = self._scan()
+
+    def _scan(self):
+        mtimes = {}
+        for filename in walk_templates(self.directories, self.extension):
+            try:
+                st = os.stat(filename)
+            except OSError:
+                continue
+            mtimes[filename] = (st.st_mtime_ns, st.st_size)
+        return mtimes
+
+    def changes(self):
+        """Yields the sets of templates which changed, forever."""
+        while True:
+            time.sleep(self.interval)
+            mtimes = self._scan()
+            changed = {
+                filename
+                for filename, mtime in mtimes.items()
+                if self._mtimes.get(filename) != mtime
+            }
+            self._mtimes = mtimes
+            if changed:
+                yield changed
+
+    def close(self):
+        pass
+
+
+def get_watcher(directories, extension='.tmpl'):
+    """inotify if it is available, polling otherwise."""
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(directories, extension)
+        except (AttributeError, OSError):
+            pass
+    return PollingWatcher(directories, extension)
+
+
+class Dependencies:
+    """Which templates depend on which other templates."""
+
+    def __init__(self, filenames=()):
+        self._dependents = {}
+        self._dependencies = {}
+        for filename in filenames:
+            self.update(filename)
+
+    def update(self, filename):
+        """(Re)reads the dependencies of a template."""
+        for dependency in self._dependencies.pop(filename, ()):
+            self._dependents[dependency].discard(filename)
+        try:
+            with open(filename, encoding='UTF-8') as f:
+                found = template_files(template_dependencies(f.read()))
+        except (OSError, ValueError):  # including `ParseError`
+            return
+        dependencies = {os.path.abspath(dependency) for dependency in found}
+        self._dependencies[filename] = dependencies
+        for dependency in dependencies:
+            self._dependents.setdefault(dependency, set()).add(filename)
+
+    def with_dependents(self, filenames):
+        """The templates and (transitively) the templates depending on them,
+        sorted.
+        """
+        todo = list(filenames)
+        seen = set(todo)
+        while todo:
+            for dependent in self._dependents.get(todo.pop(), ()):
+                if dependent not in seen:
+                    seen.add(dependent)
+                    todo.append(dependent)
+        return sorted(seen)
@@ -2,6 +2,9 @@
 
 static PyObject* NotFound;
 static PyObject* _builtins_module;
+static PyObject* _f_back_str;
+static PyObject* _f_locals_str;
+static PyObject* _self_str;
 
 
 static inline PyObject* _ns_lookup(char* key, PyObject* ns) {
@@ -110,13 +113,528 @@ static PyObject* value_from_search_list(PyObject* _, PyObject* args) {
 }
 
 
+/* Returns `self` from the frame which called the calling python function.
+ * This is what partial template functions use when `self` isn't passed.
+ */
+static PyObject* get_caller_self(PyObject* _, PyObject* noargs) {
+    PyObject* frame = (PyObject*)PyEval_GetFrame();
+    PyObject* caller;
+    PyObject* locals;
+    PyObject* ret;
+
+    if (!frame) {
+        PyErr_SetObject(PyExc_KeyError, _self_str);
+        return NULL;
+    }
+
+    caller = PyObject_GetAttr(frame, _f_back_str);
+    if (!caller) {
+        return NULL;
+    }
+    if (caller == Py_None) {
+        Py_DECREF(caller);
+        PyErr_SetObject(PyExc_KeyError, _self_str);
+        return NULL;
+    }
+
+    locals = PyObject_GetAttr(caller, _f_locals_str);
+    Py_DECREF(caller);
+    if (!locals) {
+        return NULL;
+    }
+
+    ret = PyObject_GetItem(locals, _self_str);
+    Py_DECREF(locals);
+    return ret;
+}
+
+
+/* The scanning core of `Cheetah.SourceReader.SourceReader`, see
+ * `Cheetah.SourceReader.PySourceReaderCore` for the reference version.
+ */
+typedef struct {
+    PyObject_HEAD
+    PyObject* src;
+    Py_UCS4* chars;
+    Py_ssize_t length;
+    Py_ssize_t pos;
+    Py_ssize_t break_point;
+} SourceReaderCore;
+
+
+static int SourceReaderCore_init(SourceReaderCore* self, PyObject* args, PyObject* kwargs) {
+    static char* kwlist[] = {"src", NULL};
+    PyObject* src;
+    Py_UCS4* chars;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "U", kwlist, &src)) {
+        return -1;
+    }
+    if (!(chars = PyUnicode_AsUCS4Copy(src))) {
+        return -1;
+    }
+    PyMem_Free(self->chars);
+    Py_XDECREF(self->src);
+    Py_INCREF(src);
+    self->src = src;
+    self->chars = chars;
+    self->length = PyUnicode_GetLength(src);
+    self->pos = 0;
+    self->break_point = self->length;
+    return 0;
+}
+
+
+static void SourceReaderCore_dealloc(SourceReaderCore* self) {
+    PyTypeObject* tp = Py_TYPE(self);
+    freefunc tp_free = (freefunc)PyType_GetSlot(tp, Py_tp_free);
+    Py_XDECREF(self->src);
+    PyMem_Free(self->chars);
+    tp_free(self);
+    Py_DECREF(tp);
+}
+
+
+static inline int _is_eol(Py_UCS4 c) {
+    return c == '\n' || c == '\r';
+}
+
+
+static inline int _is_ws(Py_UCS4 c) {
+    return c == ' ' || c == '\t';
+}
+
+
+static int _check_pos(SourceReaderCore* self, Py_ssize_t pos) {
+    if (pos > self->break_point) {
+        PyErr_Format(
+            PyExc_AssertionError,
+            "pos (%zd) is invalid: beyond the stream's end (%zd)",
+            pos, self->break_point - 1
+        );
+        return -1;
+    } else if (pos < 0) {
+        PyErr_Format(
+            PyExc_AssertionError, "pos (%zd) is invalid: less than 0", pos
+        );
+        return -1;
+    }
+    return 0;
+}
+
+
+static PyObject* _char_at(SourceReaderCore* self, Py_ssize_t pos) {
+    if (pos >= self->length) {
+        PyErr_SetString(PyExc_IndexError, "string index out of range");
+        return NULL;
+    }
+    return PyUnicode_FromOrdinal(self->chars[pos]);
+}
+
+
+/* Like `src[start:end]` */
+static PyObject* _slice(SourceReaderCore* self, Py_ssize_t start, Py_ssize_t end) {
+    return PySequence_GetSlice(self->src, start, end);
+}
+
+
+/* Position of the end of the line at or after `pos`: (start, end) of the
+ * line ending, both `length` at the end of the source.
+ */
+static void _find_eol(SourceReaderCore* self, Py_ssize_t pos, Py_ssize_t* start, Py_ssize_t* end) {
+    while (pos < self->length && !_is_eol(self->chars[pos])) {
+        pos++;
+    }
+    *start = *end = pos;
+    if (pos < self->length) {
+        if (
+            self->chars[pos] == '\r' &&
+            pos + 1 < self->length &&
+            self->chars[pos + 1] == '\n'
+        ) {
+            *end = pos + 2;
+        } else {
+            *end = pos + 1;
+        }
+    }
+}
+
+
+static Py_ssize_t _find_bol(SourceReaderCore* self, Py_ssize_t pos) {
+    if (pos > self->length) {
+        pos = self->length;
+    }
+    while (pos > 0 && !_is_eol(self->chars[pos - 1])) {
+        pos--;
+    }
+    return pos;
+}
+
+
+static PyObject* SourceReaderCore_src(SourceReaderCore* self, PyObject* noargs) {
+    Py_INCREF(self->src);
+    return self->src;
+}
+
+
+static Py_ssize_t SourceReaderCore_len(SourceReaderCore* self) {
+    return self->break_point;
+}
+
+
+static PyObject* SourceReaderCore_getitem(SourceReaderCore* self, PyObject* key) {
+    return PyObject_GetItem(self->src, key);
+}
+
+
+static PyObject* SourceReaderCore_pos(SourceReaderCore* self, PyObject* noargs) {
+    return PyLong_FromSsize_t(self->pos);
+}
+
+
+static PyObject* SourceReaderCore_setPos(SourceReaderCore* self, PyObject* arg) {
+    Py_ssize_t pos = PyLong_AsSsize_t(arg);
+    if (pos == -1 && PyErr_Occurred()) {
+        return NULL;
+    }
+    if (_check_pos(self, pos)) {
+        return NULL;
+    }
+    self->pos = pos;
+    Py_RETURN_NONE;
+}
+
+
+static PyObject* SourceReaderCore_validPos(SourceReaderCore* self, PyObject* arg) {
+    Py_ssize_t pos = PyLong_AsSsize_t(arg);
+    if (pos == -1 && PyErr_Occurred()) {
+        return NULL;
+    }
+    return PyBool_FromLong(pos <= self->break_point && pos >= 0);
+}
+
+
+static PyObject* SourceReaderCore_checkPos(SourceReaderCore* self, PyObject* arg) {
+    Py_ssize_t pos = PyLong_AsSsize_t(arg);
+    if (pos == -1 && PyErr_Occurred()) {
+        return NULL;
+    }
+    if (_check_pos(self, pos)) {
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+
+static PyObject* SourceReaderCore_breakPoint(SourceReaderCore* self, PyObject* noargs) {
+    return PyLong_FromSsize_t(self->break_point);
+}
+
+
+static PyObject* SourceReaderCore_setBreakPoint(SourceReaderCore* self, PyObject* arg) {
+    Py_ssize_t pos = PyLong_AsSsize_t(arg);
+    if (pos == -1 && PyErr_Occurred()) {
+        return NULL;
+    }
+    if (pos > self->length) {
+        PyErr_Format(
+            PyExc_AssertionError,
+            "New breakpoint (%zd) is invalid: beyond the end of stream's "
+            "source string (%zd)",
+            pos, self->length
+        );
+        return NULL;
+    } else if (pos < 0) {
+        PyErr_Format(
+            PyExc_AssertionError,
+            "New breakpoint (%zd) is invalid: less than 0", pos
+        );
+        return NULL;
+    }
+    self->break_point = pos;
+    Py_RETURN_NONE;
+}
+
+
+static PyObject* SourceReaderCore_atEnd(SourceReaderCore* self, PyObject* noargs) {
+    return PyBool_FromLong(self->pos >= self->break_point);
+}
+
+
+static PyObject* SourceReaderCore_peek(SourceReaderCore* self, PyObject* args) {
+    Py_ssize_t offset = 0;
+    if (!PyArg_ParseTuple(args, "|n", &offset)) {
+        return NULL;
+    }
+    if (_check_pos(self, self->pos + offset)) {
+        return NULL;
+    }
+    return _char_at(self, self->pos + offset);
+}
+
+
+static PyObject* SourceReaderCore_getc(SourceReaderCore* self, PyObject* noargs) {
+    Py_ssize_t pos = self->pos;
+    PyObject* ret;
+    if (!(pos + 1 <= self->break_point && pos + 1 >= 0)) {
+        PyErr_SetNone(PyExc_AssertionError);
+        return NULL;
+    }
+    if (!(ret = _char_at(self, pos))) {
+        return NULL;
+    }
+    self->pos += 1;
+    return ret;
+}
+
+
+static PyObject* SourceReaderCore_advance(SourceReaderCore* self, PyObject* args) {
+    Py_ssize_t offset = 1;
+    if (!PyArg_ParseTuple(args, "|n", &offset)) {
+        return NULL;
+    }
+    if (_check_pos(self, self->pos + offset)) {
+        return NULL;
+    }
+    self->pos += offset;
+    Py_RETURN_NONE;
+}
+
+
+static PyObject* _read_to(SourceReaderCore* self, Py_ssize_t to, PyObject* start_obj) {
+    Py_ssize_t start = self->pos;
+    if (_check_pos(self, to)) {
+        return NULL;
+    }
+    if (start_obj != Py_None) {
+        start = PyLong_AsSsize_t(start_obj);
+        if (start == -1 && PyErr_Occurred()) {
+            return NULL;
+        }
+    }
+    self->pos = to;
+    return _slice(self, start, to);
+}
+
+
+static PyObject* SourceReaderCore_readTo(SourceReaderCore* self, PyObject* args, PyObject* kwargs) {
+    static char* kwlist[] = {"to", "start", NULL};
+    Py_ssize_t to;
+    PyObject* start = Py_None;
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "n|O", kwlist, &to, &start)) {
+        return NULL;
+    }
+    return _read_to(self, to, start);
+}
+
+
+static PyObject* SourceReaderCore_readToEOL(SourceReaderCore* self, PyObject* args, PyObject* kwargs) {
+    static char* kwlist[] = {"start", "gobble", NULL};
+    PyObject* start = Py_None;
+    int gobble = 1;
+    Py_ssize_t eol_start, eol_end;
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|Op", kwlist, &start, &gobble)) {
+        return NULL;
+    }
+    _find_eol(self, self->pos, &eol_start, &eol_end);
+    return _read_to(self, gobble ? eol_end : eol_start, start);
+}
+
+
+static PyObject* SourceReaderCore_find(SourceReaderCore* self, PyObject* args) {
+    PyObject* it;
+    Py_ssize_t pos;
+    if (!PyArg_ParseTuple(args, "Un", &it, &pos)) {
+        return NULL;
+    }
+    return PyObject_CallMethod(self->src, "find", "On", it, pos);
+}
+
+
+static PyObject* SourceReaderCore_findBOL(SourceReaderCore* self, PyObject* args) {
+    PyObject* pos_obj = Py_None;
+    Py_ssize_t pos = self->pos;
+    if (!PyArg_ParseTuple(args, "|O", &pos_obj)) {
+        return NULL;
+    }
+    if (pos_obj != Py_None) {
+        pos = PyLong_AsSsize_t(pos_obj);
+        if (pos == -1 && PyErr_Occurred()) {
+            return NULL;
+        }
+    }
+    return PyLong_FromSsize_t(_find_bol(self, pos));
+}
+
+
+static PyObject* SourceReaderCore_findEOL(SourceReaderCore* self, PyObject* args, PyObject* kwargs) {
+    static char* kwlist[] = {"gobble", NULL};
+    int gobble = 0;
+    Py_ssize_t eol_start, eol_end;
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|p", kwlist, &gobble)) {
+        return NULL;
+    }
+    _find_eol(self, self->pos, &eol_start, &eol_end);
+    return PyLong_FromSsize_t(gobble ? eol_end : eol_start);
+}
+
+
+static PyObject* SourceReaderCore_isLineClearToStartToken(SourceReaderCore* self, PyObject* noargs) {
+    Py_ssize_t bol = _find_bol(self, self->pos);
+    Py_ssize_t i;
+    Py_UCS4 c;
+    PyObject* line;
+    PyObject* ret;
+
+    if (bol == self->pos) {
+        Py_RETURN_TRUE;
+    }
+    for (i = bol; i < self->pos; i++) {
+        c = self->chars[i];
+        if (c >= 128) {
+            /* Leave unicode whitespace to `str.isspace` */
+            if (!(line = _slice(self, bol, self->pos))) {
+                return NULL;
+            }
+            ret = PyObject_CallMethod(line, "isspace", NULL);
+            Py_DECREF(line);
+            return ret;
+        }
+        if (!(c == ' ' || (c >= '\t' && c <= '\r') || (c >= 0x1c && c <= 0x1f))) {
+            Py_RETURN_FALSE;
+        }
+    }
+    Py_RETURN_TRUE;
+}
+
+
+static PyObject* SourceReaderCore_matchWhiteSpace(SourceReaderCore* self, PyObject* noargs) {
+    return PyBool_FromLong(
+        self->pos < self->break_point &&
+        self->pos < self->length &&
+        _is_ws(self->chars[self->pos])
+    );
+}
+
+
+static PyObject* SourceReaderCore_getWhiteSpace(SourceReaderCore* self, PyObject* args, PyObject* kwargs) {
+    static char* kwlist[] = {"maximum", NULL};
+    PyObject* maximum = Py_None;
+    Py_ssize_t start = self->pos;
+    Py_ssize_t end = self->break_point;
+    Py_ssize_t max_end;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|O", kwlist, &maximum)) {
+        return NULL;
+    }
+    if (maximum != Py_None) {
+        max_end = PyLong_AsSsize_t(maximum);
+        if (max_end == -1 && PyErr_Occurred()) {
+            return NULL;
+        }
+        max_end += start;
+        if (max_end < end) {
+            end = max_end;
+        }
+    }
+    if (end > self->length) {
+        end = self->length;
+    }
+    while (self->pos < end && _is_ws(self->chars[self->pos])) {
+        self->pos++;
+    }
+    return _slice(self, start, self->pos);
+}
+
+
+static PyMethodDef SourceReaderCore_methods[] = {
+    {"src", (PyCFunction)SourceReaderCore_src, METH_NOARGS},
+    {"pos", (PyCFunction)SourceReaderCore_pos, METH_NOARGS},
+    {"setPos", (PyCFunction)SourceReaderCore_setPos, METH_O},
+    {"validPos", (PyCFunction)SourceReaderCore_validPos, METH_O},
+    {"checkPos", (PyCFunction)SourceReaderCore_checkPos, METH_O},
+    {"breakPoint", (PyCFunction)SourceReaderCore_breakPoint, METH_NOARGS},
+    {"setBreakPoint", (PyCFunction)SourceReaderCore_setBreakPoint, METH_O},
+    {"atEnd", (PyCFunction)SourceReaderCore_atEnd, METH_NOARGS},
+    {"peek", (PyCFunction)SourceReaderCore_peek, METH_VARARGS},
+    {"getc", (PyCFunction)SourceReaderCore_getc, METH_NOARGS},
+    {"advance", (PyCFunction)SourceReaderCore_advance, METH_VARARGS},
+    {
+        "readTo",
+        (PyCFunction)(void(*)(void))SourceReaderCore_readTo,
+        METH_VARARGS | METH_KEYWORDS
+    },
+    {
+        "readToEOL",
+        (PyCFunction)(void(*)(void))SourceReaderCore_readToEOL,
+        METH_VARARGS | METH_KEYWORDS
+    },
+    {"find", (PyCFunction)SourceReaderCore_find, METH_VARARGS},
+    {"findBOL", (PyCFunction)SourceReaderCore_findBOL, METH_VARARGS},
+    {
+        "findEOL",
+        (PyCFunction)(void(*)(void))SourceReaderCore_findEOL,
+        METH_VARARGS | METH_KEYWORDS
+    },
+    {
+        "isLineClearToStartToken",
+        (PyCFunction)SourceReaderCore_isLineClearToStartToken,
+        METH_NOARGS
+    },
+    {"matchWhiteSpace", (PyCFunction)SourceReaderCore_matchWhiteSpace, METH_NOARGS},
+    {
+        "getWhiteSpace",
+        (PyCFunction)(void(*)(void))SourceReaderCore_getWhiteSpace,
+        METH_VARARGS | METH_KEYWORDS
+    },
+    {NULL, NULL}
+};
+
+
+static PyType_Slot SourceReaderCore_slots[] = {
+    {Py_tp_new, PyType_GenericNew},
+    {Py_tp_init, SourceReaderCore_init},
+    {Py_tp_dealloc, SourceReaderCore_dealloc},
+    {Py_tp_methods, SourceReaderCore_methods},
+    {Py_sq_length, SourceReaderCore_len},
+    {Py_mp_length, SourceReaderCore_len},
+    {Py_mp_subscript, SourceReaderCore_getitem},
+    {0, NULL}
+};
+
+
+static PyType_Spec SourceReaderCore_spec = {
+    "_cheetah.SourceReaderCore",
+    sizeof(SourceReaderCore),
+    0,
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE,
+    SourceReaderCore_slots
+};
+
+
 static PyObject* _setup_module(PyObject* module) {
+    PyObject* source_reader_core;
     if (module) {
         NotFound = PyErr_NewException("_cheetah.NotFound", PyExc_LookupError, NULL);
         PyModule_AddObject(module, "NotFound", NotFound);
 
+        source_reader_core = PyType_FromSpec(&SourceReaderCore_spec);
+        if (!source_reader_core) {
+            Py_DECREF(module);
+            return NULL;
+        }
+        PyModule_AddObject(module, "SourceReaderCore", source_reader_core);
+
         _builtins_module = PyImport_ImportModule("builtins");
-        if (!_builtins_module) {
+        _f_back_str = PyUnicode_InternFromString("f_back");
+        _f_locals_str = PyUnicode_InternFromString("f_locals");
+        _self_str = PyUnicode_InternFromString("self");
+        if (
+            !_builtins_module ||
+            !_f_back_str ||
+            !_f_locals_str ||
+            !_self_str
+        ) {
             Py_DECREF(module);
             module = NULL;
         }
@@ -140,6 +658,11 @@ static struct PyMethodDef methods[] = {
         (PyCFunction)value_from_search_list,
         METH_VARARGS
     },
+    {
+        "get_caller_self",
+        (PyCFunction)get_caller_self,
+        METH_NOARGS
+    },
     {NULL, NULL}
 };
 
@@ -0,0 +1,8 @@
+from Cheetah import ir
+from Cheetah.compile import compile_source
+from constants import LONG_SRC
+
+
+def run():
+    ir.parse.cache_clear()
+    compile_source(LONG_SRC)
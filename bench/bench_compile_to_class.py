@@ -0,0 +1,9 @@
+from Cheetah import ir
+from Cheetah.compile import compile_to_class
+from constants import COMPILE_SRC
+
+
+def run():
+    # Time the parser too
+    ir.parse.cache_clear()
+    compile_to_class(COMPILE_SRC)
@@ -0,0 +1,12 @@
+from Cheetah.compile import compile_to_class
+from Cheetah.Template import Template
+from constants import FRAGMENT_SRC
+from constants import ITERATIONS
+
+
+fragment = compile_to_class(FRAGMENT_SRC).fragment
+namespace = {'request': None}
+
+
+def run():
+    [fragment(Template(namespace), 'hi') for _ in range(ITERATIONS)]
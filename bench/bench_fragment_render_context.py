@@ -0,0 +1,11 @@
+from Cheetah.compile import compile_to_class
+from Cheetah.partial_template import render_partial
+from constants import FRAGMENT_SRC
+from constants import ITERATIONS
+
+
+fragment = compile_to_class(FRAGMENT_SRC).fragment
+
+
+def run():
+    [render_partial(fragment, 'hi') for _ in range(ITERATIONS)]
@@ -0,0 +1,6 @@
+from Cheetah.compile import compile_to_class
+from constants import PARTIAL_EXPLICIT_SELF_SRC
+
+
+tmpl = compile_to_class(PARTIAL_EXPLICIT_SELF_SRC)()
+run = tmpl.respond
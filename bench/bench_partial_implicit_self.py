@@ -0,0 +1,6 @@
+from Cheetah.compile import compile_to_class
+from constants import PARTIAL_IMPLICIT_SELF_SRC
+
+
+tmpl = compile_to_class(PARTIAL_IMPLICIT_SELF_SRC)()
+run = tmpl.respond
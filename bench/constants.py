@@ -39,3 +39,78 @@ WRITE_SRC = (
     '$x\n'
     '#end for\n'
 )
+
+
+PARTIAL_EXPLICIT_SELF_SRC = (
+    '#from constants import ITERATIONS\n'
+    '#from partial_functions import render\n'
+    '#for _ in range(ITERATIONS)\n'
+    '#py $render($self, 1)\n'
+    '#end for\n'
+)
+
+# `render` is looked up dynamically so `self` comes from the caller's frame
+PARTIAL_IMPLICIT_SELF_SRC = (
+    '#from constants import ITERATIONS\n'
+    '#from partial_functions import render\n'
+    '#py dynamic_render = render\n'
+    '#for _ in range(ITERATIONS)\n'
+    '#py $dynamic_render(1)\n'
+    '#end for\n'
+)
+
+FRAGMENT_SRC = (
+    '#def fragment(text)\n'
+    '<li>$text</li>\n'
+    '#end def\n'
+)
+
+# A page of directives and placeholders, for compile times
+COMPILE_SRC = (
+    '#import os.path\n' +
+    ''.join(
+        f'#def item{i}(item)\n'
+        '<div class="item">\n'
+        '    <h2>$item.title</h2>\n'
+        '    #if $item.visible\n'
+        '        <p>${item.body}</p>\n'
+        '    #else\n'
+        '        <p>hidden $os.path.basename($item.path)</p>\n'
+        '    #end if\n'
+        '    #for x in $item.children\n'
+        '        <li>$x $x.upper()</li>\n'
+        '    #end for\n'
+        '</div>\n'
+        '#end def\n'
+        for i in range(ITERATIONS)
+    )
+)
+
+# Mostly static HTML, about 2MB
+LARGE_TEXT_SRC = (
+    '<table class="prices">\n' +
+    (
+        '    <tr>\n'
+        '        <td class="name">Item number #1 of the catalog</td>\n'
+        '        <td class="price">costs $ 5 or \\$10 per unit</td>\n'
+        '        <td class="description">\n'
+        '            Lorem ipsum dolor sit amet, consectetur adipiscing elit,\n'
+        '            sed do eiusmod tempor incididunt ut labore et dolore.\n'
+        '        </td>\n'
+        '    </tr>\n'
+    ) * 5000 +
+    '</table>\n'
+    '$footer\n'
+)
+
+# 10k lines with a placeholder or a directive on each
+LONG_SRC = (
+    '<table>\n' +
+    (
+        '#for row in $rows\n'
+        '    <tr><td>$row.name</td><td>$row.price</td></tr>\n'
+        '#end for\n'
+        '<p>$footer</p>\n'
+    ) * 2500 +
+    '</table>\n'
+)
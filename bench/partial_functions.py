@@ -0,0 +1,6 @@
+from Cheetah.partial_template import default_self
+
+
+@default_self
+def render(self, x):
+    return x
@@ -0,0 +1,85 @@
+"""Time to first request and peak RSS of a worker which imports many
+template modules at startup but only renders one of them, with and without
+the `lazyImports` compiler setting.
+
+    python bench/startup.py [number of templates]
+"""
+import contextlib
+import io
+import os.path
+import subprocess
+import sys
+import tempfile
+
+from Cheetah.cheetah_compile import compile_directories
+
+
+BEST_OF = 5
+
+WIDGET_SRC = (
+    '#import json\n'
+    '#def render(x)\n'
+    '<div class="widget">$json.dumps($x)</div>\n'
+    '#for i in range(3)\n'
+    '<span>$i</span>\n'
+    '#end for\n'
+    '#end def\n'
+    '$self.render($name)\n'
+)
+
+WORKER = '''\
+import resource
+import time
+
+start = time.perf_counter()
+from templates.page import YelpCheetahTemplate
+YelpCheetahTemplate(namespace={'name': 'world'}).respond()
+print(
+    (time.perf_counter() - start) * 1000,
+    resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+)
+'''
+
+
+def _write_templates(directory, count, lazy):
+    templates = os.path.join(directory, 'templates')
+    os.makedirs(templates)
+    for i in range(count):
+        with open(os.path.join(templates, f'widget{i}.tmpl'), 'w') as f:
+            f.write(WIDGET_SRC)
+    with open(os.path.join(templates, 'page.tmpl'), 'w') as f:
+        for i in range(count):
+            f.write(f'#from templates import widget{i}\n')
+        f.write(
+            '$widget0.YelpCheetahTemplate(namespace={"name": $name}).respond()\n',
+        )
+    with contextlib.redirect_stdout(io.StringIO()):
+        compile_directories(
+            [templates], settings={'lazyImports': lazy}, jobs=None,
+        )
+
+
+def _run_worker(directory):
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    out = subprocess.check_output(
+        (sys.executable, '-c', WORKER), cwd=directory, env=env,
+    ).decode()
+    ms, rss = out.split()
+    return float(ms), int(rss)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    print(f'{count} templates, best of {BEST_OF}')
+    for lazy in (False, True):
+        with tempfile.TemporaryDirectory() as directory:
+            _write_templates(directory, count, lazy)
+            # The first run writes the bytecode
+            _run_worker(directory)
+            ms, rss = min(_run_worker(directory) for _ in range(BEST_OF))
+        print(f'lazyImports={lazy!s:5}  {ms:8.1f}ms  {rss / 1024:6.1f}MiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -25,7 +25,7 @@ setup(
             "_cheetah",
             ["_cheetah.c"],
             py_limited_api=True,
-            define_macros=[('Py_LIMITED_API', None)],
+            define_macros=[('Py_LIMITED_API', '0x030A0000')],
         ),
     ],
     cmdclass=cmdclass,
@@ -7,6 +7,7 @@ from Cheetah.compile import _create_module_from_source
 from Cheetah.compile import compile_source
 from Cheetah.compile import compile_to_class
 from Cheetah.legacy_parser import brace_pairs
+from Cheetah.legacy_parser import ParseError
 from Cheetah.Template import Template
 from testing.util import run_python
 
@@ -231,7 +232,7 @@ def test_optimization_partial_template_functions():
     from testing.templates.src.optimize_name import foo
     assert foo(Template()).strip() == '25'
     src = open('testing/templates/src/optimize_name.py').read()
-    assert ' _v = bar(5) #' in src
+    assert ' _v = bar(self, 5) #' in src
 
 
 @pytest.mark.parametrize(('start', 'end'), tuple(brace_pairs.items()))
@@ -314,3 +315,229 @@ def test_comprehension_with_newlines():
         '] #'
     )
     assert expected in src
+
+
+def test_optimize_many_comprehensions():
+    comprehension = '[$x + $y for x in (1,) if $x for y in ($x,)]'
+    src = compile_source('#py z = ' + ' + '.join((comprehension,) * 2000))
+    expected = '[x + y for x in (1,) if x for y in (x,)]'
+    assert src.count(expected) == 2000
+    assert 'VFNS(' not in src
+
+
+def test_optimize_comprehension_with_many_fors():
+    fors = ''.join(
+        f'for v{i} in ($v{max(i - 1, 0)},) if $v{i} ' for i in range(500)
+    )
+    src = compile_source(f'#py z = [$v499 {fors}]')
+    # only the first iterable is outside of the comprehension's scope
+    assert src.count('VFNS(') == 1
+    assert 'z = [v499 for v0 in (VFNS("v0", NS),) if v0 for v1 in (v0,)' in src
+    assert ' for v499 in (v498,) if v499 ] #' in src
+
+
+def test_optimize_deeply_nested_comprehensions():
+    expr = '$x'
+    for i in range(150):
+        expr = f'[{expr} + $v{i} for v{i} in ($x,)]'
+    src = compile_source(f'#py z = [{expr} for x in (1,)]')
+    assert 'VFNS(' not in src
+    assert ' + v149 for v149 in (x,)] for x in (1,)] #' in src
+
+
+FINAL_SETTINGS = {'final': True}
+
+
+def test_final_inlines_blocks():
+    tmpl = (
+        '#block header\n'
+        '<h1>$title</h1>\n'
+        '#block subtitle: <h2>sub</h2>\n'
+        '#end block\n'
+    )
+    src = compile_source(tmpl, settings=FINAL_SETTINGS)
+    assert '        self.header()\n' not in src
+    assert '        self.subtitle()\n' not in src
+    assert '## CHEETAH: inlined self.header()' in src
+    cls = compile_to_class(tmpl, settings=FINAL_SETTINGS)
+    expected = compile_to_class(tmpl)({'title': 'hi'}).respond()
+    assert cls({'title': 'hi'}).respond() == expected
+    # The block methods are still available to callers
+    assert cls().subtitle() == '<h2>sub</h2>'
+
+
+def test_final_not_enabled_by_default():
+    src = compile_source('#block header: hi\n')
+    assert '        self.header()\n' in src
+
+
+def test_final_inlines_def_without_arguments():
+    tmpl = (
+        '#def greeting()\n'
+        'Hello $name\n'
+        '#end def\n'
+        '#def other(): other\n'
+        '$self.greeting()$self.greeting()\n'
+    )
+    src = compile_source(tmpl, settings=FINAL_SETTINGS)
+    assert '_v = self.greeting()' not in src
+    cls = compile_to_class(tmpl, settings=FINAL_SETTINGS)
+    assert cls({'name': 'bob'}).respond() == 'Hello bob\nHello bob\n\n'
+
+
+@pytest.mark.parametrize(
+    'tmpl',
+    (
+        # defs with arguments are called
+        '#def foo(x): $x\n$self.foo(1)\n',
+        # defs defined after the call are not known yet
+        '$self.foo()\n#def foo(): hi\n',
+        # returning / generating functions are not bodies
+        '#def foo()\n#return 1\n#end def\n$self.foo()\n',
+        '#def foo()\n#yield 1\n#end def\n$self.foo()\n',
+        # decorated functions may do anything
+        '#@dummy\n#def foo(): hi\n$self.foo()\n',
+        # super needs the real method
+        '#block foo\n#super\n#end block\n',
+    ),
+)
+def test_final_not_inlined(tmpl):
+    src = compile_source(tmpl, settings=FINAL_SETTINGS)
+    assert 'inlined' not in src
+    assert 'self.foo(' in src
+
+
+def test_final_does_not_inline_into_shadowing_locals():
+    tmpl = (
+        '#for x in range(2)\n'
+        '#block foo: $x\n'
+        '#end for\n'
+    )
+    src = compile_source(tmpl, settings=FINAL_SETTINGS)
+    assert 'inlined' not in src
+    cls = compile_to_class(tmpl, settings=FINAL_SETTINGS)
+    assert cls({'x': 'ns'}).respond() == 'nsns'
+
+
+def test_final_does_not_leak_inlined_locals():
+    tmpl = (
+        '#block foo\n'
+        '#py x = 1\n'
+        '$x\n'
+        '#end block\n'
+        '$x\n'
+    )
+    src = compile_source(tmpl, settings=FINAL_SETTINGS)
+    assert 'inlined' in src
+    cls = compile_to_class(tmpl, settings=FINAL_SETTINGS)
+    assert cls({'x': 'ns'}).respond() == '1\nns\n'
+
+
+def test_final_cannot_redefine_inlined_method():
+    with pytest.raises(ParseError) as excinfo:
+        compile_source(
+            '#block foo: hi\n#def foo(): bye\n',
+            settings=FINAL_SETTINGS,
+        )
+    assert 'foo was already inlined' in str(excinfo.value)
+
+
+MEMOIZE_SETTINGS = {'memoizePureDefs': True}
+
+
+def test_memoize_pure_defs():
+    src = (
+        '#def star(n, size=16)\n'
+        '<i class="star-$n" width="$size">#for i in range($n)#*#end for#</i>#slurp\n'
+        '#end def\n'
+        '$self.star(2) $self.star(2, size=len("ab"))\n'
+    )
+    compiled = compile_source(src, settings=MEMOIZE_SETTINGS)
+    assert '    @MEMOIZE\n    def star(' in compiled
+    assert 'from Cheetah.memoize import memoize as MEMOIZE\n' in compiled
+
+    cls = compile_to_class(src, settings=MEMOIZE_SETTINGS)
+    expected = '<i class="star-2" width="16">**</i> <i class="star-2" width="2">**</i>\n'
+    assert cls().respond() == expected
+    assert cls().respond() == expected
+
+
+def test_memoize_pure_defs_exception_names_are_locals():
+    compiled = compile_source(
+        '#def foo(x)\n'
+        '#try\n'
+        '${int(x)}\n'
+        '#except ValueError as e\n'
+        '$e\n'
+        '#end try\n'
+        '#end def\n',
+        settings=MEMOIZE_SETTINGS,
+    )
+    assert '    @MEMOIZE\n    def foo(' in compiled
+
+
+def test_memoize_pure_defs_not_enabled_by_default():
+    compiled = compile_source('#def foo(x)\n$x\n#end def\n')
+    assert 'MEMOIZE' not in compiled
+
+
+@pytest.mark.parametrize(
+    'tmpl',
+    (
+        # Reads the namespace
+        '#def foo(x)\n$x $y\n#end def\n',
+        # Reads self
+        '#def foo(x)\n$x $self.y\n#end def\n',
+        # Calls a function which isn't known to be pure
+        '#def foo(x)\n$x ${print(x)}\n#end def\n',
+        # Reads a global
+        '#import os\n#def foo(x)\n$os.sep\n#end def\n',
+        '#def foo(x)\n#py import os\n$x\n#end def\n',
+        '#def foo(x)\n#return x\n#end def\n',
+        '#def foo(x)\n#yield x\n#end def\n',
+        '#@staticmethod_like\n#def foo(x)\n$x\n#end def\n',
+        '#def foo(x)\n#super(x)\n#end def\n',
+        '#@no_memoize\n#def foo(x)\n$x\n#end def\n',
+        # The main method
+        '$len("x")\n',
+    ),
+)
+def test_memoize_pure_defs_not_memoized(tmpl):
+    compiled = compile_source(tmpl, settings=MEMOIZE_SETTINGS)
+    assert '@MEMOIZE' not in compiled
+
+
+def test_memoize_forced():
+    src = '#@memoize\n#def foo(x)\n$x $y\n#end def\n'
+    compiled = compile_source(src)
+    assert '    @MEMOIZE\n    def foo(' in compiled
+    cls = compile_to_class(src)
+    assert cls({'y': 1}).foo(0) == '0 1\n'
+    # The namespace was read: the output is now stale, as requested
+    assert cls({'y': 2}).foo(0) == '0 1\n'
+
+
+def test_memoize_forced_with_return():
+    with pytest.raises(ParseError) as excinfo:
+        compile_source('#@memoize\n#def foo(x)\n#return x\n#end def\n')
+    assert '@memoize cannot be used with #return or #yield' in str(
+        excinfo.value,
+    )
+
+
+def test_memoize_imported_name_is_a_regular_decorator():
+    compiled = compile_source(
+        '#from functools import cache as memoize\n'
+        '#@memoize\n'
+        '#def foo(x)\n$x\n#end def\n',
+    )
+    assert '    @memoize\n    def foo(' in compiled
+    assert 'MEMOIZE' not in compiled
+
+
+def test_memoize_final_prefers_inlining():
+    src = '#block foo\nhi\n#end block\n'
+    settings = dict(MEMOIZE_SETTINGS, final=True)
+    compiled = compile_source(src, settings=settings)
+    assert '@MEMOIZE' not in compiled
+    assert '@MEMOIZE' in compile_source(src, settings=MEMOIZE_SETTINGS)
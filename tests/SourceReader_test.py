@@ -0,0 +1,162 @@
+import _cheetah
+import pytest
+
+from Cheetah.SourceReader import PySourceReaderCore
+from Cheetah.SourceReader import SourceReader
+
+
+@pytest.fixture(params=(PySourceReaderCore, _cheetah.SourceReaderCore))
+def core(request):
+    yield request.param
+
+
+def _assertion_message(func, *args):
+    with pytest.raises(AssertionError) as excinfo:
+        func(*args)
+    return str(excinfo.value)
+
+
+def test_src_and_len(core):
+    reader = core('hello')
+    assert reader.src() == 'hello'
+    assert len(reader) == 5
+    assert reader[1] == 'e'
+    assert reader[1:3] == 'el'
+    reader.setBreakPoint(3)
+    assert len(reader) == 3
+    assert reader.breakPoint() == 3
+
+
+def test_positions(core):
+    reader = core('hello')
+    assert reader.pos() == 0
+    reader.setPos(5)
+    assert reader.pos() == 5
+    assert reader.atEnd()
+    assert reader.validPos(5)
+    assert not reader.validPos(6)
+    assert not reader.validPos(-1)
+    reader.checkPos(0)
+    assert _assertion_message(reader.setPos, 6) == (
+        "pos (6) is invalid: beyond the stream's end (4)"
+    )
+    assert _assertion_message(reader.checkPos, -1) == (
+        'pos (-1) is invalid: less than 0'
+    )
+
+
+def test_set_break_point(core):
+    reader = core('hello')
+    assert _assertion_message(reader.setBreakPoint, 6) == (
+        "New breakpoint (6) is invalid: beyond the end of stream's source "
+        'string (5)'
+    )
+    assert _assertion_message(reader.setBreakPoint, -1) == (
+        'New breakpoint (-1) is invalid: less than 0'
+    )
+    reader.setBreakPoint(2)
+    reader.setPos(2)
+    assert reader.atEnd()
+    assert reader.peek() == 'l'
+    with pytest.raises(AssertionError):
+        reader.getc()
+
+
+def test_peek_getc_advance(core):
+    reader = core('abc')
+    assert reader.peek() == 'a'
+    assert reader.peek(2) == 'c'
+    assert reader.getc() == 'a'
+    reader.advance()
+    assert reader.getc() == 'c'
+    with pytest.raises(AssertionError):
+        reader.getc()
+    with pytest.raises(IndexError):
+        reader.peek()
+    with pytest.raises(AssertionError):
+        reader.advance()
+    with pytest.raises(AssertionError):
+        reader.peek(-4)
+
+
+def test_read_to(core):
+    reader = core('hello world')
+    assert reader.readTo(5) == 'hello'
+    assert reader.readTo(to=11, start=6) == 'world'
+    assert reader.pos() == 11
+    with pytest.raises(AssertionError):
+        reader.readTo(12)
+
+
+@pytest.mark.parametrize('eol', ('\n', '\r\n', '\r'))
+def test_eols(core, eol):
+    src = f'ab{eol}cd'
+    reader = core(src)
+    reader.setPos(1)
+    assert reader.findEOL() == 2
+    assert reader.findEOL(gobble=True) == 2 + len(eol)
+    assert reader.readToEOL(gobble=False) == 'b'
+    assert reader.readToEOL() == eol
+    assert reader.findBOL() == reader.pos() == 2 + len(eol)
+    assert reader.findBOL(len(src)) == 2 + len(eol)
+    assert reader.findBOL(1) == 0
+    assert reader.readToEOL(start=0) == src
+    assert reader.findEOL(gobble=True) == len(src)
+
+
+def test_find(core):
+    reader = core('a$b$c')
+    assert reader.find('$', 0) == 1
+    assert reader.find('$', 2) == 3
+    assert reader.find('#', 0) == -1
+
+
+@pytest.mark.parametrize(
+    ('src', 'expected'),
+    (
+        ('#', True),
+        ('  \t#', True),
+        ('a\n  #', True),
+        ('a #', False),
+        ('　#', True),
+        ('é #', False),
+    ),
+)
+def test_is_line_clear_to_start_token(core, src, expected):
+    reader = core(src)
+    reader.setPos(len(src) - 1)
+    assert reader.isLineClearToStartToken() is expected
+
+
+def test_whitespace(core):
+    reader = core('a \t\tb ')
+    assert not reader.matchWhiteSpace()
+    assert reader.getWhiteSpace() == ''
+    reader.advance()
+    assert reader.matchWhiteSpace()
+    assert reader.getWhiteSpace(maximum=1) == ' '
+    assert reader.getWhiteSpace() == '\t\t'
+    assert reader.getc() == 'b'
+    reader.setBreakPoint(5)
+    assert not reader.matchWhiteSpace()
+    assert reader.getWhiteSpace() == ''
+
+
+def test_source_reader_rows_and_cols():
+    reader = SourceReader('ab\ncd\r\n\nef')
+    assert reader.getRowCol(0) == (1, 1)
+    assert reader.getRowCol(4) == (2, 2)
+    assert reader.getRowCol(7) == (3, 1)
+    reader.setPos(9)
+    assert reader.getRowColLine() == (4, 2, 'ef')
+    with pytest.raises(AssertionError):
+        reader.lineNum(100)
+
+
+@pytest.mark.parametrize(
+    ('src', 'pos'), (('', 0), ('a\n', 2), ('a\r\nb', 2), ('a', -1)),
+)
+def test_source_reader_unknown_position(src, pos):
+    with pytest.raises(AssertionError) as excinfo:
+        SourceReader(src).lineNum(pos)
+    assert str(excinfo.value) == f'unknown position: {pos}'
@@ -1731,6 +1731,20 @@ def test_comment_directive_ambiguity():
     assert cls().respond().strip() == '1 2'
 
 
+@pytest.mark.parametrize(
+    ('src', 'expected'),
+    (
+        ('costs $ 5 or \\$10 #1 \\#if', 'costs $ 5 or $10 #1 #if'),
+        ('trailing $', 'trailing $'),
+        ('trailing #', 'trailing #'),
+        ('$$x $#1', '$1 $#1'),
+        ('#if True: a $ b $x # c\nd', 'a $ b 1 # c\nd'),
+    ),
+)
+def test_plain_text_around_tokens(src, expected):
+    assert compile_to_class(src)({'x': 1}).respond() == expected
+
+
 def test_trivial_implements_template():
     cls = compile_to_class('#implements respond')
     assert cls().respond() == ''
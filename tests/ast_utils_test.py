@@ -1,8 +1,13 @@
+import textwrap
+
 import pytest
 
+from Cheetah.ast_utils import constant_value
+from Cheetah.ast_utils import fold_constant_branches
 from Cheetah.ast_utils import get_argument_names
 from Cheetah.ast_utils import get_imported_names
 from Cheetah.ast_utils import get_lvalues
+from Cheetah.ast_utils import NotConstant
 
 
 @pytest.mark.parametrize(
@@ -96,3 +101,141 @@ def test_raise_on_duplicate_arguments():
     with pytest.raises(SyntaxError) as excinfo:
         get_argument_names('self, self')
     assert excinfo.value.args == ('Duplicate arguments: self',)
+
+
+@pytest.mark.parametrize(
+    ('expression', 'expected'),
+    (
+        ("'en' == 'en'", True),
+        ("'en' in ('fr', 'de')", False),
+        ('not (1)', False),
+        ('1 < 2 < 3', True),
+        ('False and x', False),
+        ('True or x', True),
+        ('None is None', True),
+        ("[1] == [1]", True),
+        ("'a' if True else x", 'a'),
+        ("x if False else 'b'", 'b'),
+        ('1 and 2', 2),
+        ('{1, 2} == {2, 1}', True),
+    ),
+)
+def test_constant_value(expression, expected):
+    assert constant_value(expression) == expected
+
+
+@pytest.mark.parametrize(
+    'expression', ('x', 'True and x', "'a' < 1", "'a' is 'a'", 'f()'),
+)
+def test_constant_value_not_constant(expression):
+    with pytest.raises(NotConstant):
+        constant_value(expression)
+
+
+def _fold(source):
+    return fold_constant_branches(textwrap.dedent(source))
+
+
+def test_fold_constant_branches_true():
+    ret = _fold(
+        """\
+        if 1 == 1: # comment
+            # body comment
+            x = 1
+            y = '''a
+            b'''
+        else:
+            x = 2
+        """,
+    )
+    assert ret == "# body comment\nx = 1\ny = '''a\n    b'''\n"
+
+
+def test_fold_constant_branches_false_with_elif():
+    ret = _fold(
+        """\
+        if False:
+            x = 1
+        elif y:
+            x = 2
+        else:
+            x = 3
+        """,
+    )
+    assert ret == 'if y:\n    x = 2\nelse:\n    x = 3\n'
+
+
+def test_fold_constant_branches_elifs():
+    ret = _fold(
+        """\
+        if y:
+            x = 1
+        elif False:
+            x = 2
+        elif True:
+            x = 3
+        elif z:
+            x = 4
+        """,
+    )
+    assert ret == 'if y:\n    x = 1\nelse:\n    x = 3\n'
+
+
+def test_fold_constant_branches_nested_only_statement():
+    ret = _fold(
+        """\
+        for x in y:
+            if 0:
+                pass
+        if 1:
+            if 'a' != 'a':
+                z = 1
+            else:
+                z = 2
+        """,
+    )
+    assert ret == 'for x in y:\n    pass\nz = 2\n'
+
+
+def test_fold_constant_branches_not_constant():
+    src = 'if x:\n    y = 1\nif True: y = 2\n'
+    assert fold_constant_branches(src) == src
+
+
+def test_fold_constant_branches_comment_before_else():
+    ret = _fold(
+        """\
+        x = 0
+        if False:
+            x = 1
+            # comment
+        else:
+            x = 2
+        """,
+    )
+    assert ret == 'x = 0\nx = 2\n'
+
+
+def test_fold_constant_branches_false_elif():
+    ret = _fold(
+        """\
+        if y:
+            x = 1
+        elif False:
+            x = 2
+        else:
+            x = 3
+        if y:
+            x = 4
+        elif False:
+            x = 5
+        x = 6
+        if False:
+            x = 7
+        """,
+    )
+    assert ret == (
+        'if y:\n    x = 1\nelse:\n    x = 3\n'
+        'if y:\n    x = 4\n'
+        'x = 6\n'
+    )
@@ -1,12 +1,24 @@
+import json
 import os.path
+import subprocess
+import sys
 
 import pytest
 
+from Cheetah import cheetah_compile
 from Cheetah.cheetah_compile import _compile_files_in_directory
+from Cheetah.cheetah_compile import _compile_in_worker
 from Cheetah.cheetah_compile import _touch_init_if_not_exists
 from Cheetah.cheetah_compile import compile_directories
 from Cheetah.cheetah_compile import compile_template
+from Cheetah.cheetah_compile import CompileError
+from Cheetah.cheetah_compile import depfile_path
+from Cheetah.cheetah_compile import format_depfile
 from Cheetah.cheetah_compile import main
+from Cheetah.cheetah_compile import watch
+from Cheetah.cheetah_compile import write_dependencies
+from Cheetah.legacy_parser import ParseError
+from Cheetah.manifest import MANIFEST_FILENAME
 from testing.util import run_python
 
 
@@ -129,3 +141,384 @@ def test_compile_directories_does_not_put_init_in_pycache(tmpdir):
     os.mkdir(pycache_dir)
     compile_directories([tmpdir.strpath])
     assert not os.path.exists(os.path.join(pycache_dir, '__init__.py'))
+
+
+def _mtime_ns(path):
+    return os.stat(path).st_mtime_ns
+
+
+def test_compile_directories_skips_unchanged_templates(tmpdir, capsys):
+    tmpl = tmpdir.join('foo.tmpl')
+    tmpl.write('Hello world')
+    py = tmpdir.join('foo.py')
+    compile_directories([tmpdir.strpath])
+    assert 'Compiling' in capsys.readouterr().out
+    os.utime(py.strpath, ns=(0, 0))
+
+    compile_directories([tmpdir.strpath])
+    assert capsys.readouterr().out == ''
+    assert _mtime_ns(py.strpath) == 0
+
+    tmpl.write('Hello there')
+    compile_directories([tmpdir.strpath])
+    assert 'Compiling' in capsys.readouterr().out
+    assert run_python(py.strpath) == 'Hello there'
+
+
+def test_main_flatten_keep(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    tmpdir.join('base.tmpl').write('#def dynamic(): dynamic\n')
+    tmpdir.join('leaf.tmpl').write('#extends base\nleaf\n')
+    main(['leaf.tmpl', '--flatten'])
+    assert 'def dynamic(' not in tmpdir.join('leaf.py').read()
+    main(['leaf.tmpl', '--flatten', '--keep', 'dynamic'])
+    assert 'def dynamic(' in tmpdir.join('leaf.py').read()
+
+
+def test_main_keep_without_flatten():
+    with pytest.raises(SystemExit):
+        main(['--keep', 'dynamic'])
+
+
+@pytest.mark.parametrize('jobs', (1, 2))
+def test_main_manifest(tmpdir, capsys, jobs):
+    for directory in ('a', 'b/c'):
+        tmpdir.join(directory, 'foo.tmpl').write('Hello world', ensure=True)
+    manifest = tmpdir.join('build/manifest.json')
+    manifest.write('', ensure=True)
+    argv = [
+        tmpdir.join('a').strpath, tmpdir.join('b').strpath,
+        '--manifest', manifest.strpath, f'-j{jobs}',
+    ]
+    main(argv)
+    assert capsys.readouterr().out.count('Compiling') == 2
+    assert set(json.loads(manifest.read())) == {
+        '../a/foo.tmpl', '../b/c/foo.tmpl',
+    }
+    assert not tmpdir.join('a', MANIFEST_FILENAME).exists()
+
+    main(argv)
+    assert capsys.readouterr().out == ''
+    tmpdir.join('b/c/foo.tmpl').write('Hello there')
+    main(argv)
+    assert capsys.readouterr().out.count('Compiling') == 1
+
+
+def test_compile_directories_recompiles_with_other_settings(tmpdir, capsys):
+    tmpdir.join('foo.tmpl').write('Hello world')
+    compile_directories([tmpdir.strpath])
+    compile_directories([tmpdir.strpath], settings={'final': True})
+    assert capsys.readouterr().out.count('Compiling') == 2
+
+
+def test_compile_directories_recompiles_missing_output(tmpdir, capsys):
+    tmpdir.join('foo.tmpl').write('Hello world')
+    compile_directories([tmpdir.strpath])
+    tmpdir.join('foo.py').remove()
+    compile_directories([tmpdir.strpath])
+    assert capsys.readouterr().out.count('Compiling') == 2
+    assert tmpdir.join('foo.py').exists()
+
+
+def test_compile_force(tmpdir, capsys):
+    tmpdir.join('foo.tmpl').write('Hello world')
+    main([tmpdir.strpath])
+    main([tmpdir.strpath])
+    main([tmpdir.strpath, '--force'])
+    assert capsys.readouterr().out.count('Compiling') == 2
+
+
+def test_compile_does_not_rewrite_identical_output(tmpdir):
+    tmpdir.join('foo.tmpl').write('Hello world')
+    py = tmpdir.join('foo.py')
+    main([tmpdir.join('foo.tmpl').strpath])
+    os.utime(py.strpath, ns=(0, 0))
+    main([tmpdir.join('foo.tmpl').strpath])
+    assert _mtime_ns(py.strpath) == 0
+
+
+def test_compile_in_parallel(tmpdir, capsys):
+    for i in range(5):
+        tmpdir.join(f'a{i}.tmpl').write(f'Hello {i}')
+    main([tmpdir.strpath, '-j', '2'])
+    assert capsys.readouterr().out == (
+        f'Creating {tmpdir.join("__init__.py").strpath}\n' +
+        ''.join(
+            f'Compiling {tmpdir.join(f"a{i}.tmpl").strpath}\n'
+            for i in range(5)
+        )
+    )
+    for i in range(5):
+        assert run_python(tmpdir.join(f'a{i}.py').strpath) == f'Hello {i}'
+
+    main([tmpdir.strpath, '-j', '2'])
+    assert capsys.readouterr().out == ''
+
+
+def test_compile_files_in_parallel(template_writer):
+    tmpl1 = template_writer.write('foo')
+    tmpl2 = template_writer.write('bar')
+    main([tmpl1, tmpl2, '--jobs', '2'])
+    assert run_python(tmpl1.replace('.tmpl', '.py')) == 'foo'
+    assert run_python(tmpl2.replace('.tmpl', '.py')) == 'bar'
+
+
+@pytest.mark.parametrize('jobs', (1, 2))
+def test_compile_reports_first_error(tmpdir, capsys, jobs):
+    tmpdir.join('a.tmpl').write('ok')
+    tmpdir.join('b.tmpl').write('#end if\n')
+    tmpdir.join('c.tmpl').write('#end for\n')
+    with pytest.raises(ParseError) as excinfo:
+        _compile_files_in_directory(
+            tmpdir.strpath, ('a.tmpl', 'b.tmpl', 'c.tmpl'), jobs=jobs,
+        )
+    msg = str(excinfo.value)
+    assert '#end found, but nothing to end' in msg
+    assert 'Line 1, column 8' in msg
+    assert capsys.readouterr().out.splitlines()[-1] == (
+        f'Compiling {tmpdir.join("b.tmpl").strpath}'
+    )
+
+    # the template compiled before the error is not compiled again
+    tmpdir.join('b.tmpl').write('fixed')
+    tmpdir.join('c.tmpl').write('fixed')
+    compile_directories([tmpdir.strpath], jobs=None)
+    assert 'a.tmpl' not in capsys.readouterr().out
+
+
+def test_compile_in_worker(tmpdir):
+    tmpdir.join('a.tmpl').write('ok')
+    _compile_in_worker(tmpdir.join('a.tmpl').strpath)
+    assert tmpdir.join('a.py').exists()
+    tmpdir.join('b.tmpl').write('#end if\n')
+    with pytest.raises(ParseError):
+        _compile_in_worker(tmpdir.join('b.tmpl').strpath)
+
+
+def test_compile_in_worker_unpicklable_error(tmpdir, monkeypatch):
+    class Unpicklable(Exception):
+        pass
+
+    def compile_file(filename, **kwargs):
+        raise Unpicklable('oh no')
+
+    monkeypatch.setattr(cheetah_compile, 'compile_file', compile_file)
+    with pytest.raises(CompileError) as excinfo:
+        _compile_in_worker('a.tmpl')
+    assert str(excinfo.value) == 'a.tmpl: Unpicklable: oh no'
+
+
+def test_compile_bytecode(tmpdir):
+    tmpdir.join('foo.tmpl').write('Hello world')
+    main([tmpdir.strpath, '--bytecode', 'checked-hash'])
+    assert tmpdir.join('foo.py').exists()
+    pycache = tmpdir.join('__pycache__').listdir()
+    assert [pyc.basename.split('.')[0] for pyc in pycache] == ['foo']
+
+
+def test_compile_sourceless(tmpdir, capsys):
+    tmpdir.join('foo.tmpl').write('Hello world')
+    main([tmpdir.strpath, '--sourceless'])
+    assert not tmpdir.join('foo.py').exists()
+    assert run_python(tmpdir.join('foo.pyc').strpath) == 'Hello world'
+    assert 'Compiling' in capsys.readouterr().out
+
+    main([tmpdir.strpath, '--sourceless'])
+    assert capsys.readouterr().out == ''
+
+
+def test_compile_sourceless_after_source(tmpdir):
+    tmpl = tmpdir.join('foo.tmpl')
+    tmpl.write('old')
+    main([tmpdir.strpath, '--bytecode', 'timestamp'])
+    assert tmpdir.join('__pycache__').listdir()
+    tmpl.write('new')
+    main([tmpdir.strpath, '--sourceless'])
+    assert not tmpdir.join('foo.py').exists()
+    assert not tmpdir.join('__pycache__').listdir()
+    assert subprocess.check_output(
+        (sys.executable, '-c', 'import foo; print(foo.__file__)'),
+        cwd=tmpdir.strpath,
+    ).decode() == f'{tmpdir.join("foo.pyc").strpath}\n'
+    assert run_python(tmpdir.join('foo.pyc').strpath) == 'new'
+
+
+class FakeWatcher:
+    def __init__(self, tmpdir, *changes):
+        self.tmpdir = tmpdir
+        self._changes = changes
+        self.closed = False
+
+    def changes(self):
+        for change in self._changes:
+            for name, src in change.items():
+                self.tmpdir.join(name).write(src)
+            yield {self.tmpdir.join(name).strpath for name in change}
+
+    def close(self):
+        self.closed = True
+
+
+def test_watch(tmpdir, capsys, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    tmpdir.join('base.tmpl').write('base')
+    tmpdir.join('leaf.tmpl').write('#extends base\n')
+    tmpdir.join('other.tmpl').write('other')
+    watcher = FakeWatcher(
+        tmpdir,
+        {'base.tmpl': 'changed'},
+        {'other.tmpl': '#end if\n'},
+        {'other.tmpl': 'fixed'},
+    )
+    watch([tmpdir.strpath], watcher=watcher, flatten=True, jobs=2)
+    assert watcher.closed
+    out, err = capsys.readouterr()
+    assert out.splitlines()[-5:] == [
+        'Watching for changes...',
+        f'Compiling {tmpdir.join("base.tmpl").strpath}',
+        f'Compiling {tmpdir.join("leaf.tmpl").strpath}',
+        f'Compiling {tmpdir.join("other.tmpl").strpath}',
+        f'Compiling {tmpdir.join("other.tmpl").strpath}',
+    ]
+    assert '#end found, but nothing to end' in err
+    assert run_python(tmpdir.join('leaf.py').strpath) == 'changed'
+    assert run_python(tmpdir.join('other.py').strpath) == 'fixed'
+
+
+def test_watch_skips_unchanged_dependents(tmpdir, capsys, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    tmpdir.join('base.tmpl').write('base')
+    tmpdir.join('leaf.tmpl').write('#extends base\n')
+    watcher = FakeWatcher(tmpdir, {'base.tmpl': 'changed'})
+    watch([tmpdir.strpath], watcher=watcher)
+    assert capsys.readouterr().out.splitlines()[-2:] == [
+        'Watching for changes...',
+        f'Compiling {tmpdir.join("base.tmpl").strpath}',
+    ]
+
+
+def test_watch_shared_manifest(tmpdir, capsys, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    tmpdir.join('base.tmpl').write('base')
+    tmpdir.join('leaf.tmpl').write('#extends base\n')
+    watcher = FakeWatcher(tmpdir, {'base.tmpl': 'changed'})
+    watch([tmpdir.strpath], watcher=watcher, manifest_filename='m.json')
+    assert capsys.readouterr().out.splitlines()[-2:] == [
+        'Watching for changes...',
+        f'Compiling {tmpdir.join("base.tmpl").strpath}',
+    ]
+    assert set(json.loads(tmpdir.join('m.json').read())) == {
+        'base.tmpl', 'leaf.tmpl',
+    }
+
+
+def test_watch_reports_initial_errors(tmpdir, capsys, monkeypatch):
+    monkeypatch.setattr(
+        cheetah_compile, 'get_watcher', lambda *args: FakeWatcher(tmpdir),
+    )
+    tmpdir.join('bad.tmpl').write('#end if\n')
+    watch([tmpdir.strpath])
+    assert '#end found, but nothing to end' in capsys.readouterr().err
+
+
+def test_main_watch(tmpdir, monkeypatch):
+    def fake_watch(directories, **kwargs):
+        assert directories == [tmpdir.strpath]
+        assert kwargs['jobs'] == 3
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(cheetah_compile, 'watch', fake_watch)
+    tmpdir.join('foo.tmpl').write('foo')
+    main([tmpdir.strpath, tmpdir.join('foo.tmpl').strpath, '--watch', '-j3'])
+    assert tmpdir.join('foo.py').exists()
+
+
+def test_main_deps(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    tmpdir.join('pkg/base.tmpl').write('base', ensure=True)
+    tmpdir.join('pkg/leaf.tmpl').write('#extends pkg.base\n')
+    tmpdir.join('other.tmpl').write('other')
+    main(['pkg', 'other.tmpl', '--deps', '--deps-json', 'deps.json', '-j1'])
+    assert tmpdir.join('pkg/leaf.d').read() == (
+        'pkg/leaf.py: pkg/leaf.tmpl \\\n'
+        '  pkg/base.tmpl\n'
+    )
+    assert tmpdir.join('other.d').exists()
+    assert sorted(json.loads(tmpdir.join('deps.json').read())) == [
+        'other.tmpl', 'pkg/base.tmpl', 'pkg/leaf.tmpl',
+    ]
+
+
+def test_main_deps_watch(tmpdir):
+    with pytest.raises(SystemExit):
+        main([tmpdir.strpath, '--watch', '--deps'])
+
+
+def test_compile_directories_checks_partials_again(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    tmpdir.join('lib.tmpl').write('#def f()\n#end def\n')
+    tmpdir.join('user.tmpl').write('#from lib import f\n$f()\n')
+    compile_directories((tmpdir.strpath,))
+    assert '_v = f()' in tmpdir.join('user.py').read()
+    tmpdir.join('lib.tmpl').write(
+        '#extends Cheetah.partial_template\n#def f()\n#end def\n',
+    )
+    compile_directories((tmpdir.strpath,))
+    assert '_v = f(self)' in tmpdir.join('user.py').read()
+
+
+def test_main_compiles_in_one_process_by_default(tmpdir, monkeypatch):
+    def fake_compile_directories(directories, **kwargs):
+        assert kwargs['jobs'] == 1
+
+    monkeypatch.setattr(
+        cheetah_compile, 'compile_directories', fake_compile_directories,
+    )
+    main([tmpdir.strpath])
+
+
+def test_format_depfile():
+    assert format_depfile('a b.py', ['a b.tmpl', 'c$#.tmpl']) == (
+        'a\\ b.py: a\\ b.tmpl \\\n'
+        '  c$$\\#.tmpl\n'
+    )
+
+
+def test_depfile_path():
+    assert depfile_path('foo/bar.py') == 'foo/bar.d'
+    assert depfile_path('foo/bar.pyc') == 'foo/bar.d'
+
+
+@pytest.fixture
+def templates(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    tmpdir.join('pkg/base.tmpl').write('base\n', ensure=True)
+    tmpdir.join('pkg/middle.tmpl').write('#extends pkg.base\n')
+    yield tmpdir
+
+
+def test_write_dependencies(templates):
+    graph = write_dependencies(
+        ['pkg/middle.tmpl', 'pkg/base.tmpl'], json_filename='deps.json',
+    )
+    assert templates.join('pkg/middle.d').read() == (
+        'pkg/middle.py: pkg/middle.tmpl \\\n'
+        '  pkg/base.tmpl\n'
+    )
+    assert templates.join('pkg/base.d').read() == 'pkg/base.py: pkg/base.tmpl\n'
+    assert json.loads(templates.join('deps.json').read()) == graph
+    assert graph['pkg/middle.tmpl'] == {
+        'target': 'pkg/middle.py',
+        'extends': 'pkg.base',
+        'imports': [],
+        'partials': [],
+        'files': ['pkg/base.tmpl'],
+    }
+
+
+def test_write_dependencies_sourceless_no_depfiles(templates):
+    graph = write_dependencies(
+        ['pkg/base.tmpl'], depfiles=False, sourceless=True,
+    )
+    assert graph['pkg/base.tmpl']['target'] == 'pkg/base.pyc'
+    assert not templates.join('pkg/base.d').exists()
@@ -0,0 +1,187 @@
+import os
+from unittest import mock
+
+import pytest
+
+from Cheetah import compile as compile_module
+from Cheetah import compile_cache
+from Cheetah import dependencies
+from Cheetah.compile import compile_source
+from Cheetah.compile import compile_to_class
+from Cheetah.compile_cache import cache_key
+from Cheetah.compile_cache import CompileCache
+from Cheetah.legacy_compiler import LegacyCompiler
+
+
+class OtherCompiler(LegacyCompiler):
+    pass
+
+
+def test_cache_key():
+    key = cache_key('hello')
+    assert cache_key('hello', None, LegacyCompiler, {}) == key
+    assert len({
+        key,
+        cache_key('hello!'),
+        cache_key('hello', settings={'final': True}),
+        cache_key('hello', compiler_cls=OtherCompiler),
+        cache_key('hello', constants={'x': 1}),
+    }) == 5
+
+
+def test_cache_key_depends_on_partial_imports(monkeypatch):
+    src = '#from testing.templates.src.super_base import foo\n'
+    key = cache_key(src)
+    monkeypatch.setattr(
+        dependencies, 'partial_template_names', lambda name: frozenset(),
+    )
+    partial_key = cache_key(src)
+    assert partial_key != key
+    monkeypatch.setattr(
+        dependencies, 'partial_template_names', lambda name: {'foo'},
+    )
+    assert cache_key(src) != partial_key
+
+
+@pytest.fixture
+def no_compiles(monkeypatch):
+    def no_compiles():
+        monkeypatch.setattr(LegacyCompiler, 'getModuleCode', None)
+    yield no_compiles
+
+
+def test_compile_source_cached(no_compiles):
+    cache = CompileCache()
+    compiled = compile_source('Hello $name', cache=cache)
+    assert len(cache) == 1
+    no_compiles()
+    assert compile_source('Hello $name', cache=cache) == compiled
+    with pytest.raises(TypeError):
+        compile_source('Hello $name', settings={'final': True}, cache=cache)
+
+
+def test_compile_to_class_cached(no_compiles, monkeypatch):
+    cache = CompileCache()
+    compile_source('Hello $name', cache=cache)
+    # the code object is added to the entry of the source
+    compile_to_class('Hello $name', cache=cache)
+    assert len(cache) == 1
+    no_compiles()
+    monkeypatch.setattr(compile_module, 'compile', None, raising=False)
+    cls = compile_to_class('Hello $name', cache=cache)
+    assert cls(namespace={'name': 'world'}).respond() == 'Hello world'
+
+
+def test_compile_to_class_cache_miss(monkeypatch):
+    cache = CompileCache()
+    keys = []
+    real_cache_key = compile_cache.cache_key
+
+    def cache_key(*args, **kwargs):
+        keys.append(real_cache_key(*args, **kwargs))
+        return keys[-1]
+    monkeypatch.setattr(compile_cache, 'cache_key', cache_key)
+    monkeypatch.setattr(cache, 'set', mock.Mock(wraps=cache.set))
+
+    compile_to_class('Hello $name', cache=cache)
+    assert len(keys) == 1
+    cache.set.assert_called_once_with(keys[0], (mock.ANY, mock.ANY))
+    with pytest.raises(TypeError):
+        compile_to_class(b'Hello $name', cache=cache)
+
+
+def test_default_cache(no_compiles, monkeypatch):
+    cache = CompileCache()
+    monkeypatch.setattr(compile_cache, 'DEFAULT_CACHE', cache)
+    compile_to_class('hi')
+    no_compiles()
+    assert compile_to_class('hi')().respond() == 'hi'
+    assert compile_source('hi')
+
+
+def test_memory_lru():
+    cache = CompileCache(maxsize=2)
+    cache.set('a', ('a', None))
+    cache.set('b', ('b', None))
+    assert cache.get('a') == ('a', None)
+    cache.set('c', ('c', None))
+    assert cache.get('b') is None
+    assert cache.get('a') == ('a', None)
+    assert len(cache) == 2
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_disk_cache(tmpdir, no_compiles):
+    directory = tmpdir.join('cache').strpath
+    compile_to_class('Hello $name', cache=CompileCache(directory))
+    no_compiles()
+    cls = compile_to_class('Hello $name', cache=CompileCache(directory))
+    assert cls(namespace={'name': 'world'}).respond() == 'Hello world'
+
+
+@pytest.mark.parametrize('data', (b'', b'bad magic', None))
+def test_disk_cache_bad_files(tmpdir, data):
+    cache = CompileCache(tmpdir.strpath)
+    cache.set('key', ('source', None))
+    filename = tmpdir.join('key.cache')
+    if data is None:
+        data = filename.read_binary()[:-2]
+    filename.write_binary(data)
+    assert CompileCache(tmpdir.strpath).get('key') is None
+
+
+def test_disk_cache_unwritable(tmpdir):
+    cache = CompileCache(tmpdir.join('cache').strpath)
+    tmpdir.join('cache').remove()
+    cache.set('key', ('source', None))
+    assert cache.get('key') == ('source', None)
+    assert CompileCache(tmpdir.join('other').strpath).get('key') is None
+
+
+def _entry_size(tmpdir, name):
+    return os.path.getsize(tmpdir.join(f'{name}.cache').strpath)
+
+
+def test_disk_cache_evicts_least_recently_used(tmpdir):
+    cache = CompileCache(tmpdir.strpath)
+    cache.set('a', ('x' * 100, None))
+    size = _entry_size(tmpdir, 'a')
+
+    cache = CompileCache(tmpdir.strpath, max_bytes=size * 4)
+    for i, name in enumerate('bcd'):
+        cache.set(name, ('x' * 100, None))
+        os.utime(tmpdir.join(f'{name}.cache').strpath, ns=(i, i))
+    os.utime(tmpdir.join('a.cache').strpath, ns=(10, 10))
+    assert len(tmpdir.listdir()) == 4
+
+    # over the limit: the least recently used are removed down to 3/4
+    cache.set('e', ('x' * 100, None))
+    assert sorted(p.basename for p in tmpdir.listdir()) == [
+        'a.cache', 'd.cache', 'e.cache',
+    ]
+    # a hit on disk counts as a use
+    CompileCache(tmpdir.strpath).get('d')
+    assert os.stat(tmpdir.join('d.cache').strpath).st_mtime_ns > 10
+
+
+def test_disk_cache_eviction_races(tmpdir, monkeypatch):
+    tmpdir.join('vanished.cache').mksymlinkto(tmpdir.join('missing'))
+    tmpdir.join('other').write('x' * 1000)
+    cache = CompileCache(tmpdir.strpath, max_bytes=1)
+
+    def remove(path):
+        raise FileNotFoundError(path)
+
+    monkeypatch.setattr(compile_cache.os, 'remove', remove)
+    cache.set('a', ('source', None))
+    assert tmpdir.join('a.cache').exists()
+
+
+def test_disk_cache_clear(tmpdir):
+    cache = CompileCache(tmpdir.strpath)
+    cache.set('a', ('source', None))
+    tmpdir.join('other').write('')
+    cache.clear()
+    assert [p.basename for p in tmpdir.listdir()] == ['other']
+    assert cache.get('a') is None
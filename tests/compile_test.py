@@ -1,4 +1,6 @@
+import importlib.util
 import os.path
+import py_compile
 import subprocess
 import sys
 import textwrap
@@ -86,6 +88,44 @@ def test_compile_file_destination(tmpfile, tmpdir):
     assert "write('''Hello, world!''')" in python_file_contents
 
 
+@pytest.mark.parametrize(
+    ('mode', 'flags'),
+    (
+        (py_compile.PycInvalidationMode.TIMESTAMP, 0),
+        (py_compile.PycInvalidationMode.CHECKED_HASH, 3),
+        (py_compile.PycInvalidationMode.UNCHECKED_HASH, 1),
+    ),
+)
+def test_compile_file_bytecode(tmpfile, mode, flags):
+    target = compile_file(tmpfile, bytecode=mode)
+    with open(importlib.util.cache_from_source(target), 'rb') as f:
+        pyc = f.read()
+    assert pyc[:4] == importlib.util.MAGIC_NUMBER
+    assert int.from_bytes(pyc[4:8], 'little') == flags
+
+    # the bytecode is valid: importing doesn't rewrite it
+    subprocess.check_call(
+        (sys.executable, '-c', 'import temp'), cwd=os.path.dirname(target),
+    )
+    with open(importlib.util.cache_from_source(target), 'rb') as f:
+        assert f.read() == pyc
+
+
+def test_compile_file_sourceless(tmpfile):
+    target = compile_file(tmpfile, sourceless=True)
+    assert target == os.path.splitext(tmpfile)[0] + '.pyc'
+    assert not os.path.exists(os.path.splitext(tmpfile)[0] + '.py')
+    assert not os.path.exists(importlib.util.cache_from_source(target[:-1]))
+    out = subprocess.check_output(
+        (
+            sys.executable, '-c',
+            'import temp; print(temp.__file__, temp.YelpCheetahTemplate().respond())',
+        ),
+        cwd=os.path.dirname(target),
+    ).decode()
+    assert out == f'{target} Hello, world!\n'
+
+
 def test_compile_file_as_script(tmpfile):
     subprocess.check_call(['cheetah-compile', tmpfile])
     pyfile = tmpfile.replace('.tmpl', '.py')
@@ -264,6 +304,10 @@ $arr
 #with self.ctx()
     inside ctx
 #end with
+
+#cache key=$foo ttl=60
+    cached
+#end cache
     """
     compiled_templates = [compile_source(MEGA_TEMPLATE) for _ in range(5)]
     assert len(set(compiled_templates)) == 1
@@ -274,3 +318,33 @@ $arr
 
     # also make sure MEGA_TEMPLATE renders
     assert compile_to_class(MEGA_TEMPLATE)().respond()
+
+
+def test_compile_source_constants():
+    tmpl = (
+        '#if $locale == "en"\n'
+        'english $locale\n'
+        '#elif $locale == "fr"\n'
+        'french\n'
+        '#end if\n'
+        '$count.real $name\n'
+    )
+    ret = compile_source(tmpl, constants={'locale': 'en', 'count': 3})
+    assert 'french' not in ret
+    assert 'VFNS("locale", NS)' not in ret
+    assert 'VFNS("name", NS)' in ret
+
+    cls = compile_to_class(tmpl, constants={'locale': 'en', 'count': 3})
+    assert cls({'name': 'x'}).respond() == 'english en\n3 x\n'
+
+
+def test_compile_source_constants_locals_take_precedence():
+    tmpl = '#py locale = "fr"\n$locale\n'
+    cls = compile_to_class(tmpl, constants={'locale': 'en'})
+    assert cls().respond() == 'fr\n'
+
+
+@pytest.mark.parametrize('value', (object(), float('nan'), range(3)))
+def test_compile_source_constants_must_be_literals(value):
+    with pytest.raises(ValueError):
+        compile_source('$x', constants={'x': value})
@@ -1,8 +1,15 @@
 import pytest
 
+from Cheetah import template_finder
 from Cheetah.cheetah_compile import compile_directories
 
 
 @pytest.fixture(autouse=True, scope='session')
 def compile_testing_templates():
     compile_directories(('testing/templates/src',))
+
+
+@pytest.fixture(autouse=True)
+def clear_template_finder_caches():
+    # tests write templates in (and chdir to) their own directories
+    template_finder.cache_clear()
@@ -0,0 +1,76 @@
+import pytest
+
+from Cheetah.dependencies import DependencyGraph
+from Cheetah.dependencies import template_dependencies
+
+
+@pytest.fixture
+def templates(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    tmpdir.join('pkg/base.tmpl').write('base\n', ensure=True)
+    tmpdir.join('pkg/middle.tmpl').write('#extends pkg.base\n')
+    tmpdir.join('pkg/partial.tmpl').write(
+        '#extends Cheetah.partial_template\n'
+        '#def p()\n'
+        '#end def\n',
+    )
+    tmpdir.join('pkg/helpers.tmpl').write('#from pkg.partial import p\n')
+    tmpdir.join('pkg/leaf.tmpl').write(
+        '#extends pkg.middle\n'
+        '#import os.path\n'
+        '#import pkg.helpers as helpers\n'
+        '#from pkg.partial import p\n'
+        '#from pkg import base\n'
+        '#from . import relative\n',
+    )
+    yield tmpdir
+
+
+def test_template_dependencies(templates):
+    with open('pkg/leaf.tmpl') as f:
+        assert template_dependencies(f.read()) == {
+            'extends': 'pkg.middle',
+            'imports': ['pkg.base', 'pkg.helpers'],
+            'partials': ['pkg.partial'],
+        }
+
+
+def test_template_dependencies_not_templates(templates):
+    assert template_dependencies('#extends Cheetah.Template\n') == {
+        'extends': None, 'imports': [], 'partials': [],
+    }
+
+
+def test_template_dependencies_compiled_partial(templates):
+    templates.join('compiled_partial.py').write(
+        'from Cheetah.partial_template import YelpCheetahTemplate as Base\n',
+    )
+    assert template_dependencies('#from compiled_partial import f\n') == {
+        'extends': None, 'imports': [], 'partials': ['compiled_partial'],
+    }
+
+
+def test_template_dependencies_only_directives(templates):
+    assert template_dependencies('##import pkg.base\n')['imports'] == []
+    # lines which aren't complete directives, found by parsing it all
+    assert template_dependencies(
+        '$foo("#from")\n'
+        '#import pkg.helpers, \\\n'
+        '    pkg.base\n',
+    )['imports'] == ['pkg.base', 'pkg.helpers']
+    assert template_dependencies('#from nowhere\n')['imports'] == []
+    assert template_dependencies('#import $x\n')['imports'] == []
+
+
+def test_dependency_graph_files(templates):
+    graph = DependencyGraph()
+    assert graph.files('pkg/leaf.tmpl') == [
+        'pkg/base.tmpl', 'pkg/helpers.tmpl', 'pkg/middle.tmpl',
+        'pkg/partial.tmpl',
+    ]
+    assert graph.files('pkg/base.tmpl') == []
+
+
+def test_dependency_graph_cycle(templates):
+    templates.join('pkg/base.tmpl').write('#import pkg.middle\n')
+    assert DependencyGraph().files('./pkg/base.tmpl') == ['pkg/middle.tmpl']
@@ -0,0 +1,229 @@
+import os.path
+
+import pytest
+
+from Cheetah.cheetah_compile import main
+from Cheetah.compile import _create_module_from_source
+from Cheetah.flatten import flatten_file
+from Cheetah.flatten import flatten_source
+from Cheetah.flatten import FlattenError
+from testing.util import run_python
+
+
+def _flatten_to_class(source, **kwargs):
+    module = _create_module_from_source(flatten_source(source, **kwargs))
+    return module.YelpCheetahTemplate
+
+
+def _sources(**sources):
+    return sources.get
+
+
+def test_flatten_source_requires_text():
+    with pytest.raises(TypeError):
+        flatten_source(b'not text')
+
+
+def test_flatten_no_extends_same_as_compile():
+    cls = _flatten_to_class('Hello $name')
+    assert cls({'name': 'world'}).respond() == 'Hello world'
+
+
+def test_flatten_super_child():
+    from testing.templates.src.super_child import YelpCheetahTemplate
+    with open('testing/templates/src/super_child.tmpl') as f:
+        src = f.read()
+    flattened = flatten_source(src)
+    assert 'testing.templates.src.super_base' not in flattened
+    assert 'super(YelpCheetahTemplate' not in flattened
+
+    cls = _flatten_to_class(src)
+    assert YelpCheetahTemplate.__mro__[1].__module__ != 'Cheetah.Template'
+    assert cls.__mro__[1].__module__ == 'Cheetah.Template'
+    assert cls().respond() == YelpCheetahTemplate().respond()
+
+
+def test_flatten_resolves_overrides_and_drops_unused():
+    get_source = _sources(
+        base=(
+            '<html>$self.title() $self.body()</html>\n'
+            '#def title(): base title\n'
+            '#def body(): base body\n'
+            '#def unused(): unused\n'
+        ),
+    )
+    src = (
+        '#extends base\n'
+        '#implements body\n'
+        'child body\n'
+        '#def title(): child title\n'
+    )
+    flattened = flatten_source(src, get_source=get_source)
+    assert 'def unused(' not in flattened
+    assert 'base title' not in flattened
+    assert 'base body' not in flattened
+
+    cls = _flatten_to_class(src, get_source=get_source)
+    assert cls().respond() == '<html>child title child body\n</html>\n'
+
+
+def test_flatten_keep():
+    get_source = _sources(base='#def unused(): unused\n')
+    cls = _flatten_to_class(
+        '#extends base\n', get_source=get_source, keep=('unused',),
+    )
+    assert cls().unused() == 'unused'
+    cls = _flatten_to_class(
+        '#extends base\n', get_source=get_source, drop_unused=False,
+    )
+    assert cls().unused() == 'unused'
+
+
+def test_flatten_super_through_several_levels():
+    get_source = _sources(
+        base='$self.foo()\n#def foo(): base\n',
+        middle=(
+            '#extends base\n'
+            '#implements dummy\n'
+            '#def foo()\n'
+            '#super\n'
+            ' middle#slurp\n'
+            '#end def\n'
+        ),
+    )
+    src = (
+        '#extends middle\n'
+        '#implements dummy\n'
+        '#def foo()\n'
+        '#super\n'
+        ' leaf#slurp\n'
+        '#end def\n'
+    )
+    assert _flatten_to_class(src, get_source=get_source)().respond() == (
+        'base middle leaf\n'
+    )
+
+
+def test_flatten_stops_at_non_template_base():
+    src = (
+        '#extends testing.templates.extends_test_template\n'
+        '#implements respond\n'
+        '$self.spacer()\n'
+    )
+    flattened = flatten_source(src)
+    assert (
+        'from testing.templates.extends_test_template import '
+        'YelpCheetahTemplate as YelpCheetahBaseClass'
+    ) in flattened
+    assert _flatten_to_class(src)().respond() == (
+        '<img src="spacer.gif" width="1" height="1" alt="" />\n'
+    )
+
+
+def test_flatten_merges_imports_and_attributes():
+    get_source = _sources(
+        base=(
+            '#import os.path\n'
+            '#attr a = 1\n'
+            '#attr b = 2\n'
+            '$os.path.join("x", "y") $self.a $self.b\n'
+        ),
+    )
+    src = (
+        '#extends base\n'
+        '#import os\n'
+        '#attr b = 3\n'
+    )
+    cls = _flatten_to_class(src, get_source=get_source)
+    assert cls().respond() == 'x/y 1 3\n'
+
+
+def test_flatten_import_aliases():
+    get_source = _sources(
+        base='#import os.path as osp\n#from os.path import *\n$osp.sep',
+    )
+    flattened = flatten_source(
+        '#extends base\n#import os.path as osp\n', get_source=get_source,
+    )
+    assert flattened.count('import os.path as osp\n') == 1
+    with pytest.raises(FlattenError):
+        flatten_source(
+            '#extends base\n#import sys as osp\n', get_source=get_source,
+        )
+
+
+def test_flatten_lazy_imports():
+    get_source = _sources(
+        base=(
+            '#import os.path\n'
+            '#from os.path import join\n'
+            '$join("x", "y") $os.path.sep\n'
+        ),
+    )
+    src = '#extends base\n#import os.path as osp\n#from os import sep\n'
+    settings = {'lazyImports': True}
+    flattened = flatten_source(src, settings=settings, get_source=get_source)
+    assert "join = LAZY_FROM('os.path', 'join')" in flattened
+    cls = _flatten_to_class(src, settings=settings, get_source=get_source)
+    assert cls().respond() == 'x/y /\n'
+    with pytest.raises(FlattenError):
+        flatten_source(
+            '#extends base\n#from sys import path as join\n',
+            settings=settings,
+            get_source=get_source,
+        )
+
+
+def test_flatten_file_target(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    tmpdir.join('base.tmpl').write('base')
+    tmpdir.join('leaf.tmpl').write('#extends base\n')
+    target = tmpdir.join('out.py').strpath
+    assert flatten_file(tmpdir.join('leaf.tmpl').strpath, target) == target
+    assert run_python(target) == 'base'
+
+
+def test_flatten_file_sourceless(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    tmpdir.join('base.tmpl').write('base')
+    tmpdir.join('leaf.tmpl').write('#extends base\n')
+    target = flatten_file(tmpdir.join('leaf.tmpl').strpath, sourceless=True)
+    assert target == tmpdir.join('leaf.pyc').strpath
+    assert run_python(target) == 'base'
+
+
+def test_flatten_import_conflict():
+    get_source = _sources(base='#from os import path\n')
+    with pytest.raises(FlattenError) as excinfo:
+        flatten_source(
+            '#extends base\n#from sys import path\n', get_source=get_source,
+        )
+    assert str(excinfo.value) == (
+        'Cannot flatten: `path` refers to both os:path and sys:path'
+    )
+
+
+def test_flatten_cyclic_extends():
+    get_source = _sources(base='#extends base\n')
+    with pytest.raises(FlattenError):
+        flatten_source('#extends base\n', get_source=get_source)
+
+
+def test_cheetah_compile_flatten(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    tmpdir.join('base.tmpl').write('<$self.body()>\n#def body(): base')
+    tmpl = tmpdir.join('leaf.tmpl')
+    tmpl.write('#extends base\n#def body(): leaf')
+
+    def get_py():
+        with open(tmpdir.join('leaf.py').strpath) as f:
+            return f.read()
+
+    main([tmpl.strpath])
+    assert 'from base import' in get_py()
+    main(['--flatten', tmpl.strpath])
+    assert 'from base import' not in get_py()
+
+    # The flattened module does not need the base to run
+    os.remove(tmpdir.join('base.tmpl').strpath)
+    assert run_python(tmpdir.join('leaf.py').strpath) == '<leaf>\n'
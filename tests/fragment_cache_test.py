@@ -0,0 +1,197 @@
+import functools
+import subprocess
+import sys
+
+import pytest
+
+from Cheetah import filters
+from Cheetah import fragment_cache
+from Cheetah.compile import compile_to_class
+from Cheetah.fragment_cache import fragment_key
+from Cheetah.fragment_cache import MemoryCache
+from Cheetah.fragment_cache import SqliteCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture(params=('memory', 'sqlite'))
+def cache(request, tmpdir, clock):
+    if request.param == 'memory':
+        return MemoryCache(clock=clock)
+    else:
+        return SqliteCache(tmpdir.join('cache.db').strpath, clock=clock)
+
+
+def test_cache_get_set(cache):
+    assert cache.get('k') is None
+    cache.set('k', 'value')
+    assert cache.get('k') == 'value'
+    cache.set('k', 'other')
+    assert cache.get('k') == 'other'
+    cache.clear()
+    assert cache.get('k') is None
+
+
+def test_cache_ttl(cache, clock):
+    cache.set('k', 'value', ttl=10)
+    clock.now += 9
+    assert cache.get('k') == 'value'
+    clock.now += 1
+    assert cache.get('k') is None
+
+
+def test_memory_cache_is_lru():
+    cache = MemoryCache(maxsize=2)
+    cache.set('a', '1')
+    cache.set('b', '2')
+    assert cache.get('a') == '1'
+    cache.set('c', '3')
+    assert cache.get('b') is None
+    assert cache.get('a') == '1'
+    assert len(cache) == 2
+
+
+def test_sqlite_cache_shared_and_purged(tmpdir, clock):
+    filename = tmpdir.join('cache.db').strpath
+    SqliteCache(filename, clock=clock).set('k', 'value', ttl=1)
+    cache = SqliteCache(filename, clock=clock)
+    assert cache.get('k') == 'value'
+    clock.now += 1
+    cache.purge_expired()
+    clock.now -= 1
+    assert cache.get('k') is None
+
+
+def test_fragment_key():
+    key = fragment_key('mod', 'hash', 1, 2, filters.markup_filter, ('a', 1))
+    assert key == fragment_key(
+        'mod', 'hash', 1, 2, filters.markup_filter, ('a', 1),
+    )
+    for other in (
+            fragment_key('mod2', 'hash', 1, 2, filters.markup_filter, ('a', 1)),
+            fragment_key('mod', 'hash2', 1, 2, filters.markup_filter, ('a', 1)),
+            fragment_key('mod', 'hash', 1, 3, filters.markup_filter, ('a', 1)),
+            fragment_key('mod', 'hash', 1, 2, filters.unicode_filter, ('a', 1)),
+            fragment_key('mod', 'hash', 1, 2, filters.markup_filter, ('a', 2)),
+    ):
+        assert other != key
+
+
+def test_fragment_key_filters():
+    def named(module, qualname):
+        return type('f', (), {'__module__': module, '__qualname__': qualname})
+
+    assert fragment_key(
+        'mod', 'hash', 1, 2, named('x.y', 'z'), None,
+    ) != fragment_key(
+        'mod', 'hash', 1, 2, named('x', 'y.z'), None,
+    )
+    assert fragment_key(
+        'mod', 'hash', 1, 2, functools.partial(str, 'x'), None,
+    ) != fragment_key(
+        'mod', 'hash', 1, 2, functools.partial(str, 'y'), None,
+    )
+
+
+TMPL = (
+    'header $user\n'
+    '#cache key=$user ttl=$ttl\n'
+    'sidebar $user $count\n'
+    '#end cache\n'
+    '#cache\n'
+    'footer $count\n'
+    '#end cache\n'
+)
+
+
+def test_cache_directive(cache, clock):
+    cls = compile_to_class(TMPL)
+
+    def render(**namespace):
+        return cls(namespace, fragment_cache=cache).respond()
+
+    assert render(user='a', count=1, ttl=60) == (
+        'header a\nsidebar a 1\nfooter 1\n'
+    )
+    assert render(user='a', count=2, ttl=60) == (
+        'header a\nsidebar a 1\nfooter 1\n'
+    )
+    assert render(user='b', count=3, ttl=60) == (
+        'header b\nsidebar b 3\nfooter 1\n'
+    )
+    clock.now += 60
+    assert render(user='a', count=4, ttl=60) == (
+        'header a\nsidebar a 4\nfooter 1\n'
+    )
+
+
+def test_cache_directive_source_change_invalidates(cache):
+    ns = {'user': 'a', 'count': 1, 'ttl': None}
+    cls = compile_to_class(TMPL)
+    assert cls(ns, fragment_cache=cache).respond().endswith('footer 1\n')
+    ns['count'] = 2
+    cls = compile_to_class(TMPL + '\n')
+    assert cls(ns, fragment_cache=cache).respond().endswith('footer 2\n\n')
+
+
+def test_cache_directive_exception_not_cached(cache):
+    cls = compile_to_class('#cache\n${1 / $x}\n#end cache\n')
+    with pytest.raises(ZeroDivisionError):
+        cls({'x': 0}, fragment_cache=cache).respond()
+    assert cls({'x': 1}, fragment_cache=cache).respond() == '1.0\n'
+
+
+def test_cache_directive_expressions(cache):
+    cls = compile_to_class(
+        '#cache key=($x, {"y": [$y]}) ttl=(60 * 60):\n'
+        '$x $y\n'
+        '#end cache\n',
+    )
+    assert cls({'x': 1, 'y': 2}, fragment_cache=cache).respond() == '1 2\n'
+    assert cls({'x': 1, 'y': 3}, fragment_cache=cache).respond() == '1 3\n'
+    assert cls({'x': 1, 'y': 2}, fragment_cache=cache).respond() == '1 2\n'
+
+
+def test_cache_directive_in_def_and_nested(cache):
+    cls = compile_to_class(
+        '#def foo(x)\n'
+        '#cache key=x\n'
+        '<#cache key=x#$x $y#end cache#>\n'
+        '#end cache\n'
+        '#end def\n'
+        '$self.foo(1)$self.foo(2)',
+    )
+    assert cls({'y': 1}, fragment_cache=cache).respond() == '<1 1>\n<2 1>\n'
+    assert cls({'y': 2}, fragment_cache=cache).respond() == '<1 1>\n<2 1>\n'
+    assert cls({'y': 2}, fragment_cache=cache).foo(3) == '<3 2>\n'
+
+
+def test_cache_directive_default_cache(monkeypatch):
+    cache = MemoryCache()
+    monkeypatch.setattr(fragment_cache, 'DEFAULT_CACHE', cache)
+    cls = compile_to_class('#cache\n$x\n#end cache\n')
+    assert cls({'x': 1}).respond() == '1\n'
+    assert len(cache) == 1
+    assert cls({'x': 2}).respond() == '1\n'
+
+
+def test_templates_do_not_import_fragment_cache():
+    subprocess.check_call((
+        sys.executable, '-c',
+        'import sys\n'
+        'from Cheetah.compile import compile_to_class\n'
+        'compile_to_class("$x")({"x": 1}).respond()\n'
+        'assert "Cheetah.fragment_cache" not in sys.modules, sys.modules\n'
+        'assert "sqlite3" not in sys.modules, sys.modules\n',
+    ))
@@ -0,0 +1,128 @@
+import importlib
+import os.path
+import sys
+
+import pytest
+
+from Cheetah import import_hook
+
+
+@pytest.fixture
+def templates(tmpdir, monkeypatch):
+    monkeypatch.syspath_prepend(tmpdir.strpath)
+    monkeypatch.setattr(sys, 'dont_write_bytecode', False)
+    import_hook.install()
+    before = set(sys.modules)
+    try:
+        yield tmpdir
+    finally:
+        import_hook.uninstall()
+        for name in set(sys.modules) - before:
+            del sys.modules[name]
+
+
+def _import_fresh(name):
+    sys.modules.pop(name, None)
+    importlib.invalidate_caches()
+    return importlib.import_module(name)
+
+
+def test_import_template(templates):
+    templates.join('hello.tmpl').write('Hello $name')
+    module = _import_fresh('hello')
+    assert module.__file__ == templates.join('hello.tmpl').strpath
+    tmpl = module.YelpCheetahTemplate(namespace={'name': 'world'})
+    assert tmpl.respond() == 'Hello world'
+
+
+def test_import_template_in_package(templates):
+    templates.join('pkg/__init__.py').ensure()
+    templates.join('pkg/sub/__init__.py').ensure()
+    templates.join('pkg/sub/foo.tmpl').write('foo')
+    module = _import_fresh('pkg.sub.foo')
+    assert module.YelpCheetahTemplate().respond() == 'foo'
+
+
+def test_template_wins_over_stale_output(templates):
+    templates.join('foo.tmpl').write('new')
+    templates.join('foo.py').write('raise AssertionError("stale")\n')
+    assert _import_fresh('foo').YelpCheetahTemplate().respond() == 'new'
+
+
+def test_packages_without_templates_are_not_hijacked(templates):
+    templates.join('notemplates/__init__.py').write('x = 1\n', ensure=True)
+    assert _import_fresh('notemplates').x == 1
+    with pytest.raises(ImportError):
+        _import_fresh('does_not_exist')
+
+
+def test_bytecode_is_cached(templates, monkeypatch):
+    tmpl = templates.join('foo.tmpl')
+    tmpl.write('foo')
+    _import_fresh('foo')
+    assert os.path.exists(import_hook.cache_path(tmpl.strpath))
+
+    monkeypatch.setattr(import_hook, 'compile_source', None)
+    assert _import_fresh('foo').YelpCheetahTemplate().respond() == 'foo'
+
+
+def test_changed_template_is_recompiled(templates):
+    tmpl = templates.join('foo.tmpl')
+    tmpl.write('foo')
+    _import_fresh('foo')
+    tmpl.write('bar')
+    assert _import_fresh('foo').YelpCheetahTemplate().respond() == 'bar'
+
+
+@pytest.mark.parametrize('data', (b'', b'garbage', None))
+def test_bad_cache_is_recompiled(templates, data):
+    tmpl = templates.join('foo.tmpl')
+    tmpl.write('foo')
+    _import_fresh('foo')
+    cache = import_hook.cache_path(tmpl.strpath)
+    if data is None:
+        with open(cache, 'rb') as f:
+            data = f.read()[:-10]
+    with open(cache, 'wb') as f:
+        f.write(data)
+    assert _import_fresh('foo').YelpCheetahTemplate().respond() == 'foo'
+    with open(cache, 'rb') as f:
+        assert f.read() != data
+
+
+def test_unwritable_cache(templates):
+    templates.join('__pycache__').write('not a directory')
+    templates.join('foo.tmpl').write('foo')
+    assert _import_fresh('foo').YelpCheetahTemplate().respond() == 'foo'
+
+
+def test_dont_write_bytecode(templates, monkeypatch):
+    monkeypatch.setattr(sys, 'dont_write_bytecode', True)
+    tmpl = templates.join('foo.tmpl')
+    tmpl.write('foo')
+    _import_fresh('foo')
+    assert not os.path.exists(import_hook.cache_path(tmpl.strpath))
+
+
+def test_earlier_path_entries_win(tmpdir, monkeypatch):
+    tmpdir.join('a/foo.py').write('x = "a"\n', ensure=True)
+    tmpdir.join('b/foo.tmpl').write('b', ensure=True)
+    tmpdir.join('b/bar.tmpl').write('bar')
+    monkeypatch.syspath_prepend(tmpdir.join('b').strpath)
+    monkeypatch.syspath_prepend(tmpdir.join('a').strpath)
+    import_hook.install()
+    try:
+        assert _import_fresh('foo').x == 'a'
+        assert _import_fresh('bar').YelpCheetahTemplate().respond() == 'bar'
+    finally:
+        import_hook.uninstall()
+        sys.modules.pop('foo', None)
+        sys.modules.pop('bar', None)
+
+
+def test_install_is_idempotent(templates):
+    import_hook.install()
+    assert sys.path_hooks.count(import_hook._path_hook) == 1
+    import_hook.uninstall()
+    import_hook.uninstall()
+    assert import_hook._path_hook not in sys.path_hooks
@@ -0,0 +1,142 @@
+import pytest
+
+from Cheetah import ir
+from Cheetah.compile import compile_source
+from Cheetah.compile import compile_to_class
+from Cheetah.compile_cache import cache_key
+from Cheetah.legacy_compiler import LegacyCompiler
+from Cheetah.legacy_parser import CheetahVar
+from Cheetah.legacy_parser import LegacyParser
+from Cheetah.legacy_parser import ParseError
+
+
+def test_parse():
+    assert ir.parse('Hello $name\n') == (
+        ir.Node('addStrConst', ('Hello ',), 6),
+        ir.Node('addPlaceholder', ((CheetahVar('name'),), '$name', (1, 7)), 11),
+        ir.Node('addStrConst', ('\n',), 12),
+    )
+
+
+def test_parse_is_cached():
+    assert ir.parse('#if True\nhi\n#end if\n') is ir.parse(
+        '#if True\nhi\n#end if\n',
+    )
+
+
+def test_parse_errors_are_raised():
+    with pytest.raises(ParseError):
+        ir.parse('#end if\n')
+
+
+def test_merge_text():
+    text = ir.Node('addStrConst', ('a\n',), 0)
+    nodes = (text, text, ir.Node('addComment', (' hi',), 0), text)
+    assert ir.merge_text(nodes) == (
+        ir.Node('addStrConst', ('a\na\n',), 0),
+        ir.Node('addComment', (' hi',), 0),
+        text,
+    )
+
+
+def test_merge_text_keeps_last_line_for_whitespace_handling():
+    nodes = (
+        ir.Node('addStrConst', ('a\n',), 0),
+        ir.Node('addStrConst', ('  ',), 0),
+        ir.Node('addDecorator', ('@foo',), 0),
+    )
+    assert ir.merge_text(nodes) == nodes
+
+
+def test_merge_text_removes_whitespace_before_directives():
+    nodes = (
+        ir.Node('addStrConst', ('a\n',), 0),
+        ir.Node('addStrConst', ('b\n  ',), 0),
+        ir.Node('handleWSBeforeDirective', (), 0),
+        ir.Node('addIf', (('True',), (2, 3)), 0),
+    )
+    assert ir.merge_text(nodes) == (
+        ir.Node('addStrConst', ('a\nb\n',), 0),
+        ir.Node('addIf', (('True',), (2, 3)), 0),
+    )
+
+
+@pytest.mark.parametrize(
+    'src',
+    (
+        'Hello $name\n',
+        'a \\$ b \\# c\n',
+        'before\n    #if $x\n    yes\n    #else\n    no\n    #end if\nafter',
+        'text #slurp\nmore  #py x = 1\n',
+        '#def foo()\n  ## comment\n  $bar  #pass\n#end def\n',
+        '#import contextlib\n#@contextlib.contextmanager\n'
+        '    #def foo(x): $x\n#block b\n b\n#end block\n',
+        'x#for i in range(3)#$i#end for#y',
+        '  #compiler-settings\nfinal = True\n#end compiler-settings\na\n',
+    ),
+)
+def test_merge_text_same_output(src):
+    assert compile_source(src) == compile_source(src, settings={'passes': ()})
+
+
+def test_strip_comments():
+    src = '## Hello\nworld\n'
+    assert '# Hello' in compile_source(src)
+    stripped = compile_source(
+        src, settings={'passes': ('merge_text', 'strip_comments')},
+    )
+    assert '# Hello' not in stripped
+
+
+def test_unknown_pass():
+    with pytest.raises(ValueError) as excinfo:
+        compile_source('hi', settings={'passes': ('inline_everything',)})
+    assert str(excinfo.value) == (
+        "'inline_everything' is not a compiler pass "
+        '(expected one of: merge_text, strip_comments)'
+    )
+
+
+def test_compiling_with_other_settings_reuses_the_parse():
+    parsers = []
+
+    class CountingParser(LegacyParser):
+        def __init__(self, *args, **kwargs):
+            parsers.append(self)
+            super().__init__(*args, **kwargs)
+
+    class CountingCompiler(LegacyCompiler):
+        parserClass = CountingParser
+
+    src = '#def foo(): hi\n$self.foo()\n'
+    compile_source(src, compiler_cls=CountingCompiler)
+    cls = compile_to_class(
+        src, settings={'final': True}, compiler_cls=CountingCompiler,
+    )
+    assert cls().respond() == 'hi\n'
+    assert len(parsers) == 1
+
+
+class CatsToDogsParser(LegacyParser):
+    def __init__(self, src, compiler):
+        super().__init__(src.replace('cat', 'dog'), compiler)
+
+
+class CatsToDogsCompiler(LegacyCompiler):
+    parserClass = CatsToDogsParser
+
+
+def test_compiler_parser_class():
+    src = 'a cat\n'
+    assert compile_to_class(src)().respond() == 'a cat\n'
+    cls = compile_to_class(src, compiler_cls=CatsToDogsCompiler)
+    assert cls().respond() == 'a dog\n'
+    assert ir.parse(src) != ir.parse(src, CatsToDogsParser)
+    assert cache_key(src, compiler_cls=CatsToDogsCompiler) != cache_key(src)
+
+
+def test_compiler_errors_point_at_the_node():
+    with pytest.raises(ParseError) as excinfo:
+        compile_source('hello\n#return 1\n#yield 2\n')
+    assert 'AssertionError' in str(excinfo.value)
+    assert 'Line 3, column 9' in str(excinfo.value)
@@ -0,0 +1,127 @@
+import sys
+
+import pytest
+
+from Cheetah.compile import compile_source
+from Cheetah.compile import compile_to_class
+from Cheetah.lazy import lazy_from
+from Cheetah.lazy import lazy_import
+
+
+@pytest.fixture
+def modules(tmpdir, monkeypatch):
+    """A package whose modules record when they are executed."""
+    monkeypatch.syspath_prepend(tmpdir.strpath)
+    executed = []
+    monkeypatch.setattr(sys, 'executed', executed, raising=False)
+    pkg = tmpdir.join('lazypkg')
+    pkg.join('__init__.py').write(
+        'import sys\nsys.executed.append(__name__)\nVALUE = 1\n', ensure=True,
+    )
+    for name in ('a', 'b'):
+        pkg.join(f'{name}.py').write(
+            'import sys\nsys.executed.append(__name__)\n'
+            f'NAME = {name!r}\n',
+        )
+    before = set(sys.modules)
+    try:
+        yield executed
+    finally:
+        for name in set(sys.modules) - before:
+            del sys.modules[name]
+
+
+def test_lazy_import(modules):
+    module = lazy_import('lazypkg.a')
+    assert modules == ['lazypkg']
+    assert sys.modules['lazypkg.a'] is module
+    assert sys.modules['lazypkg'].a is module
+    assert module.NAME == 'a'
+    assert modules == ['lazypkg', 'lazypkg.a']
+
+
+def test_lazy_import_already_imported(modules):
+    import lazypkg.a
+    assert lazy_import('lazypkg.a') is lazypkg.a
+
+
+def test_lazy_import_missing(modules):
+    with pytest.raises(ModuleNotFoundError):
+        lazy_import('lazypkg.missing')
+
+
+def test_lazy_import_top_level(modules):
+    module = lazy_import('lazypkg')
+    assert modules == []
+    assert module.VALUE == 1
+    assert modules == ['lazypkg']
+
+
+def test_lazy_import_other_loaders_are_not_lazy(modules, tmpdir):
+    tmpdir.join('lazyns/mod.py').ensure()
+    module = lazy_import('lazyns')
+    assert type(module).__name__ == 'module'
+    assert module.__path__
+
+
+def test_lazy_from(modules):
+    assert lazy_from('lazypkg', 'VALUE') == 1
+    module = lazy_from('lazypkg', 'b')
+    assert modules == ['lazypkg']
+    assert module.NAME == 'b'
+    with pytest.raises(ModuleNotFoundError):
+        lazy_from('lazypkg', 'missing')
+
+
+def test_lazy_from_not_a_package(modules):
+    with pytest.raises(ImportError) as excinfo:
+        lazy_from('lazypkg.a', 'missing')
+    assert str(excinfo.value) == (
+        "cannot import name 'missing' from 'lazypkg.a'"
+    )
+
+
+def test_lazy_imports_setting(modules):
+    cls = compile_to_class(
+        '#import lazypkg.a\n'
+        '#import lazypkg.a as aa\n'
+        '#from lazypkg import b\n'
+        '#from lazypkg import VALUE as v\n'
+        '$lazypkg.a.NAME $aa.NAME\n',
+        settings={'lazyImports': True},
+    )
+    assert modules == ['lazypkg']
+    assert cls().respond() == 'a a\n'
+    assert modules == ['lazypkg', 'lazypkg.a']
+
+
+def test_lazy_imports_setting_generated_code():
+    src = (
+        '#import os.path, json as j, sys\n'
+        '#from xml import dom as d, sax\n'
+        '#from . import x\n'
+        '#from os import *\n'
+    )
+    compiled = compile_source(src, settings={'lazyImports': True})
+    assert (
+        'from Cheetah.lazy import lazy_import as LAZY_IMPORT\n'
+        "LAZY_IMPORT('os.path')\n"
+        'import os\n'
+        "j = LAZY_IMPORT('json')\n"
+        "sys = LAZY_IMPORT('sys')\n"
+        'from Cheetah.lazy import lazy_from as LAZY_FROM\n'
+        "d = LAZY_FROM('xml', 'dom')\n"
+        "sax = LAZY_FROM('xml', 'sax')\n"
+        'from . import x\n'
+        'from os import *\n'
+    ) in compiled
+    assert 'LAZY' not in compile_source(src)
+
+
+def test_lazy_imports_inline_imports_are_not_lazy():
+    compiled = compile_source(
+        '$x\n#import json\n',
+        settings={'lazyImports': True, 'useLegacyImportMode': False},
+    )
+    assert 'LAZY' not in compiled
+    assert '        import json\n' in compiled
@@ -1,4 +1,7 @@
+from Cheetah.compile import compile_source
 from Cheetah.legacy_compiler import get_defined_method_names
+from Cheetah.legacy_compiler import LegacyCompiler
+from Cheetah.legacy_parser import LegacyParser
 
 
 def test_get_method_names_trivial():
@@ -7,3 +10,33 @@ def test_get_method_names_trivial():
 
 def test_get_method_names_a_method():
     assert get_defined_method_names('#def foo(): 1') == {'foo'}
+
+
+def test_get_method_names_blocks_and_nested_defs():
+    src = '#block foo\n#def bar(): 1\n#end block\n'
+    assert get_defined_method_names(src) == {'foo', 'bar'}
+
+
+PARTIAL_SRC = (
+    '#extends Cheetah.partial_template\n'
+    '#def foo(x): $bar($x)\n'
+    '#def bar(x): <$x>\n'
+)
+
+
+def test_partial_template_is_parsed_once():
+    parsers = []
+
+    class CountingParser(LegacyParser):
+        def __init__(self, *args, **kwargs):
+            parsers.append(self)
+            super().__init__(*args, **kwargs)
+
+    class CountingCompiler(LegacyCompiler):
+        parserClass = CountingParser
+
+    compiled = compile_source(PARTIAL_SRC, compiler_cls=CountingCompiler)
+    assert len(parsers) == 1
+    # `bar` is known to be a partial function of this template
+    assert "_v = bar(x) # '$bar($x)'" in compiled
+    assert 'VFNS(' not in compiled
@@ -0,0 +1,75 @@
+import json
+import os.path
+
+from Cheetah import dependencies
+from Cheetah import manifest
+from Cheetah.manifest import compiler_version
+from Cheetah.manifest import Manifest
+from Cheetah.manifest import MANIFEST_FILENAME
+from Cheetah.manifest import template_key
+
+
+def test_template_key_depends_on_source_and_settings():
+    key = template_key('hello')
+    assert template_key('hello') == key
+    assert template_key('hello!') != key
+    assert template_key('hello', settings={'final': True}) != key
+    assert template_key('hello', flatten=True) != key
+
+
+def test_compiler_version_depends_on_the_extension(tmpdir, monkeypatch):
+    version = compiler_version()
+    extension = tmpdir.join('_cheetah.so')
+    extension.write_binary(b'other')
+    monkeypatch.setattr(manifest._cheetah, '__file__', extension.strpath)
+    compiler_version.cache_clear()
+    try:
+        assert compiler_version() != version
+    finally:
+        compiler_version.cache_clear()
+
+
+def test_template_key_depends_on_partial_imports(monkeypatch):
+    src = '#from testing.templates.src.super_base import foo\n'
+    key = template_key(src)
+    monkeypatch.setattr(
+        dependencies, 'partial_template_names', lambda name: frozenset(),
+    )
+    partial_key = template_key(src)
+    assert partial_key != key
+    monkeypatch.setattr(
+        dependencies, 'partial_template_names', lambda name: {'foo'},
+    )
+    assert template_key(src) != partial_key
+
+
+def test_manifest_is_fresh(tmpdir):
+    target = tmpdir.join('foo.py')
+    manifest = Manifest(tmpdir.strpath)
+    assert not manifest.is_fresh('foo.tmpl', 'key', target.strpath)
+    manifest.record('foo.tmpl', 'key')
+    assert not manifest.is_fresh('foo.tmpl', 'key', target.strpath)
+    target.write('')
+    assert manifest.is_fresh('foo.tmpl', 'key', target.strpath)
+    assert not manifest.is_fresh('foo.tmpl', 'other', target.strpath)
+
+
+def test_manifest_save_and_load(tmpdir):
+    manifest = Manifest(tmpdir.strpath)
+    manifest.save()
+    assert not tmpdir.join(MANIFEST_FILENAME).exists()
+    manifest.record(os.path.join(tmpdir.strpath, 'foo.tmpl'), 'key')
+    manifest.save()
+    saved = json.loads(tmpdir.join(MANIFEST_FILENAME).read())
+    assert saved == {'foo.tmpl': 'key'}
+    tmpdir.join('foo.py').write('')
+    assert Manifest(tmpdir.strpath).is_fresh(
+        'foo.tmpl', 'key', tmpdir.join('foo.py').strpath,
+    )
+
+
+def test_manifest_ignores_corrupt_file(tmpdir):
+    tmpdir.join(MANIFEST_FILENAME).write('{not json')
+    tmpdir.join('foo.py').write('')
+    manifest = Manifest(tmpdir.strpath)
+    assert not manifest.is_fresh('foo.tmpl', 'key', tmpdir.join('foo.py'))
@@ -0,0 +1,91 @@
+import pytest
+
+from Cheetah import filters
+from Cheetah.compile import compile_to_class
+from Cheetah.memoize import memoize
+from Cheetah.memoize import NotAValue
+from Cheetah.memoize import value_key
+
+
+@pytest.mark.parametrize(
+    ('a', 'b'),
+    (
+        (1, True),
+        (1, 1.0),
+        (0.0, -0.0),
+        ((1,), (True,)),
+        (frozenset((1,)), frozenset((True,))),
+        ('a', b'a'),
+    ),
+)
+def test_value_key_distinguishes_rendering(a, b):
+    assert value_key(a) != value_key(b)
+
+
+@pytest.mark.parametrize('value', ([], object(), (1, []), filters))
+def test_value_key_not_a_value(value):
+    with pytest.raises(NotAValue):
+        value_key(value)
+
+
+@pytest.fixture
+def cls():
+    tmpl_cls = compile_to_class(
+        '#def foo(x, y=None)\n'
+        '<$x $y>#slurp\n'
+        '#end def\n',
+    )
+    calls = []
+    orig = tmpl_cls.foo
+
+    def foo(self, *args, **kwargs):
+        calls.append((args, kwargs))
+        return orig(self, *args, **kwargs)
+
+    tmpl_cls.foo = memoize(maxsize=2)(foo)
+    tmpl_cls.calls = calls
+    yield tmpl_cls
+
+
+def test_memoize_caches_output(cls):
+    assert cls().foo(1) == '<1 >'
+    assert cls().foo(1) == '<1 >'
+    assert cls().foo(1, y=2) == '<1 2>'
+    assert cls().foo(True) == '<True >'
+    assert cls.calls == [((1,), {}), ((1,), {'y': 2}), ((True,), {})]
+
+
+def test_memoize_bounded(cls):
+    for x in (1, 2, 3, 1):
+        cls().foo(x)
+    assert len(cls.calls) == 4
+    cls().foo(3)
+    assert len(cls.calls) == 4
+    cls.foo.cache_clear()
+    cls().foo(3)
+    assert len(cls.calls) == 5
+
+
+def test_memoize_keyed_on_filter(cls):
+    inst = cls(filter_fn=filters.unicode_filter)
+    assert inst.foo('&') == '<& >'
+    assert cls().foo('&') == '<&amp; >'
+    assert len(cls.calls) == 2
+
+
+def test_memoize_unhashable_arguments_not_cached(cls):
+    assert cls().foo([1]) == '<[1] >'
+    assert cls().foo([1]) == '<[1] >'
+    assert len(cls.calls) == 2
+
+
+def test_memoize_writes_to_transaction():
+    tmpl_cls = compile_to_class(
+        '#@memoize\n'
+        '#def foo(x)\n'
+        '$x#slurp\n'
+        '#end def\n'
+        '$self.foo(1)$self.foo(2)$self.foo(1)\n',
+    )
+    assert tmpl_cls().respond() == '121\n'
+    assert tmpl_cls().respond() == '121\n'
@@ -1,4 +1,5 @@
 import contextlib
+import pickle
 
 import pytest
 
@@ -231,6 +232,22 @@ def test_parse_error_on_attr_with_dollar_sign():
     )
 
 
+def test_parse_error_on_attr_without_equals():
+    assert_parse_error(
+        '\n\n'
+        'AssertionError: \n'
+        '\n'
+        'Line 1, column 11\n'
+        '\n'
+        'Line|Cheetah Code\n'
+        '----|-------------------------------------------------------------\n'
+        '1   |#attr foo 1\n'
+        '               ^\n',
+
+        '#attr foo 1\n',
+    )
+
+
 def test_invalid_line_continuation():
     assert_parse_error(
         '\n\n'
@@ -541,6 +558,57 @@ def test_errors_on_blinged_kwarg():
     )
 
 
+def test_errors_on_blinged_kwarg_between_placeholders():
+    assert_parse_error(
+        '\n\n'
+        'SyntaxError: expression cannot contain assignment, perhaps you '
+        'meant "=="? (<unknown>, line 1)\n\n'
+        'Line 3, column 16\n\n'
+        'Line|Cheetah Code\n'
+        '----|-------------------------------------------------------------\n'
+        '1   |#def foo(x)\n'
+        '2   |$x\n'
+        '3   |$foo($bar=$baz)\n'
+        '                    ^\n'
+        '4   |${x}\n'
+        '5   |#end def\n',
+
+        '#def foo(x)\n'
+        '$x\n'
+        '$foo($bar=$baz)\n'
+        '${x}\n'
+        '#end def\n',
+    )
+
+
+def test_comprehension_without_in():
+    assert_parse_error(
+        '\n\n'
+        'AssertionError: None\n\n'
+        'Line 1, column 18\n\n'
+        'Line|Cheetah Code\n'
+        '----|-------------------------------------------------------------\n'
+        '1   |#py [a for b if c]\n'
+        '                      ^\n',
+
+        '#py [a for b if c]',
+    )
+
+
+def test_unmatched_brace_in_expression():
+    assert_parse_error(
+        '\n\n'
+        "SyntaxError: unmatched ')' (<unknown>, line 1)\n\n"
+        'Line 1, column 10\n\n'
+        'Line|Cheetah Code\n'
+        '----|-------------------------------------------------------------\n'
+        '1   |#py x = 1)\n'
+        '              ^\n',
+
+        '#py x = 1)',
+    )
+
+
 def test_weird_def_parsing():
     assert_parse_error(
         '\n\n'
@@ -604,3 +672,62 @@ def test_old_placeholders(placeholder):
 
         placeholder,
     )
+
+
+def test_cache_invalid_argument():
+    assert_parse_error(
+        '\n\n'
+        'Invalid argument: foo (expected one of: key, ttl)\n'
+        'Line 1, column 8\n'
+        '\n'
+        'Line|Cheetah Code\n'
+        '----|-------------------------------------------------------------\n'
+        '1   |#cache foo=1\n'
+        '            ^\n'
+        '2   |x\n'
+        '3   |#end cache\n',
+
+        '#cache foo=1\nx\n#end cache\n',
+    )
+
+
+def test_cache_positional_argument():
+    assert_parse_error(
+        '\n\n'
+        'Expected name=expression\n'
+        'Line 1, column 8\n'
+        '\n'
+        'Line|Cheetah Code\n'
+        '----|-------------------------------------------------------------\n'
+        '1   |#cache $foo\n'
+        '            ^\n'
+        '2   |x\n'
+        '3   |#end cache\n',
+
+        '#cache $foo\nx\n#end cache\n',
+    )
+
+
+def test_cache_missing_expression():
+    assert_parse_error(
+        '\n\n'
+        'Expected an expression for ttl=\n'
+        'Line 1, column 8\n'
+        '\n'
+        'Line|Cheetah Code\n'
+        '----|-------------------------------------------------------------\n'
+        '1   |#cache key=1 ttl=\n'
+        '            ^\n'
+        '2   |x\n'
+        '3   |#end cache\n',
+
+        '#cache key=1 ttl=\nx\n#end cache\n',
+    )
+
+
+def test_parse_error_can_be_pickled():
+    with pytest.raises(UnknownDirectiveError) as excinfo:
+        compile_source('a\n#not_a_directive\n')
+    unpickled = pickle.loads(pickle.dumps(excinfo.value))
+    assert type(unpickled) is UnknownDirectiveError
+    assert str(unpickled) == str(excinfo.value)
@@ -1,7 +1,16 @@
+import io
+import threading
+
+import _cheetah
 import pytest
 
+from Cheetah.compile import compile_source
+from Cheetah.compile import compile_to_class
 from Cheetah.partial_template import default_self
 from Cheetah.partial_template import PartialMethodNotCalledFromTemplate
+from Cheetah.partial_template import py_get_caller_self
+from Cheetah.partial_template import render_partial
+from Cheetah.partial_template import RenderContext
 from Cheetah.Template import Template
 
 
@@ -124,3 +133,146 @@ def test_partial_with_same_name_retains_class_and_keeps_function():
     assert partial_with_same_name.partial_with_same_name(
         Template(),
     ) == '    Hello world\n'
+
+
+@pytest.mark.parametrize(
+    'get_caller_self', (py_get_caller_self, _cheetah.get_caller_self),
+)
+def test_get_caller_self(get_caller_self):
+    def partial_function():
+        return get_caller_self()
+
+    self = object()
+    assert partial_function() is self
+
+    def not_from_a_method():
+        return partial_function()
+
+    with pytest.raises(KeyError):
+        not_from_a_method()
+
+
+def test_partial_template_functions_get_self_explicitly():
+    src = compile_source(
+        '#from testing.templates.src.partial_template import render\n'
+        '$render("a") $render($self, "b") $render(self) $render()\n'
+        '#def f(render)\n'
+        '$render("c")\n'
+        '#end def\n',
+    )
+    assert '_v = render(self, "a") #' in src
+    assert '_v = render(self, "b") #' in src
+    assert "_v = render(self) # '$render(self)'" in src
+    assert "_v = render(self) # '$render()'" in src
+    assert '_v = render("c") #' in src
+
+
+def test_partial_template_keyword_arguments_do_not_get_self():
+    src = compile_source(
+        '#from testing.templates.src.partial_template import render\n'
+        "$render(self=self, text='a') $render(text='b')\n",
+    )
+    assert "_v = render(self=self, text='a') #" in src
+    assert "_v = render(text='b') #" in src
+
+
+def test_partial_template_placeholder_argument_does_not_get_self():
+    src = compile_source(
+        '#from testing.templates.src.partial_template import render\n'
+        '$render($other_template, "a") $render(*$args) $render(["b"])\n',
+    )
+    assert '_v = render(VFNS("other_template"' in src
+    assert '_v = render(*VFNS("args"' in src
+    assert '_v = render(self, ["b"]) #' in src
+
+
+def test_partial_template_multi_line_call():
+    cls = compile_to_class(
+        '#from testing.templates.src.partial_template import render\n'
+        '${render(\n\n\n\n\n\n    "y",\n)}\n',
+    )
+    assert cls().respond() == '    From partial: y\n\n'
+
+
+def test_partial_template_explicit_template_and_keyword_self():
+    from testing.templates.src.partial_template import render
+    other = Template()
+    cls = compile_to_class(
+        '#from testing.templates.src.partial_template import render\n'
+        "$render($other, 'x')$render(self=self, text='y')\n",
+    )
+    assert cls(namespace={'other': other}).respond() == (
+        '    From partial: x\n'
+        '    From partial: y\n'
+        '\n'
+    )
+    assert render(other, 'z') == '    From partial: z\n'
+
+
+def test_partial_template_module_helpers_do_not_get_self(tmpdir, monkeypatch):
+    monkeypatch.syspath_prepend(tmpdir.strpath)
+    tmpdir.join('helper_partial.tmpl').write(
+        '#extends Cheetah.partial_template\n'
+        '#from os.path import basename\n'
+        '#def render(x)\n$x\n#end def\n',
+    )
+    src = compile_source(
+        '#from helper_partial import basename, render\n'
+        '$basename("a/b") $render("c")\n',
+    )
+    assert '_v = basename("a/b") #' in src
+    assert '_v = render(self, "c") #' in src
+
+
+def test_non_partial_imports_do_not_get_self():
+    src = compile_source('#from os.path import join\n$join("a", "b")\n')
+    assert '_v = join("a", "b") #' in src
+
+
+def test_render_partial():
+    from testing.templates.src.partial_template import render
+    assert render_partial(render, '<b>') == '    From partial: &lt;b&gt;\n'
+
+
+def test_render_context_filter():
+    from testing.templates.src.partial_template import render
+    context = RenderContext(filter_fn=str)
+    assert context.render(render, '<b>') == '    From partial: <b>\n'
+
+
+def test_render_context_nested_partials():
+    from testing.templates.src.uses_partial import YelpCheetahTemplate
+    ret = RenderContext().render(YelpCheetahTemplate.respond)
+    assert ret == YelpCheetahTemplate().respond()
+
+
+def test_render_context_after_exception():
+    from testing.templates.src.partial_template import render
+
+    class Broken:
+        def __str__(self):
+            raise ValueError('broken')
+
+    context = RenderContext()
+    with pytest.raises(ValueError):
+        context.render(render, Broken())
+    assert context.get_template().transaction is None
+    assert context.render(render, 'ok') == '    From partial: ok\n'
+
+
+def test_render_context_state_is_per_thread():
+    from testing.templates.src.partial_template import render
+    context = RenderContext()
+    context.get_template().transaction = io.StringIO()
+    results = []
+
+    def target():
+        with context.get_template().set_filter(str):
+            results.append(context.render(render, '<b>'))
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+    assert results == ['    From partial: <b>\n']
+    assert context.get_template().transaction.getvalue() == ''
+    assert context.render(render, '<b>') == '    From partial: &lt;b&gt;\n'
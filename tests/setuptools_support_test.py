@@ -5,6 +5,7 @@ import sys
 from unittest import mock
 
 import pytest
+from setuptools.command.build_py import build_py as _build_py
 from setuptools.dist import Distribution
 
 from Cheetah import setuptools_support
@@ -61,6 +62,18 @@ def test_get_run_method():
     base_cls.run.assert_called_once_with(inst)
 
 
+def test_setup_callback_jobs(pkg_layout):
+    dist = Distribution()
+    setuptools_support.setup_callback(
+        dist, 'yelp_cheetah', {'directories': pkg_layout, 'jobs': 2},
+    )
+    with mock.patch.object(
+            setuptools_support, 'compile_directories',
+    ) as compile_directories, mock.patch.object(_build_py, 'run'):
+        dist.cmdclass['build_py'].run(mock.sentinel.instance)
+    compile_directories.assert_called_once_with(pkg_layout, jobs=2)
+
+
 def test_integration(tmpdir):
     pip = (sys.executable, '-m', 'pip.__main__')
     subprocess.call(pip + ('uninstall', '-y', 'pkg'))
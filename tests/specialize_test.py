@@ -0,0 +1,66 @@
+from Cheetah.specialize import compile_variants
+
+
+TMPL = (
+    '#if $theme == "dark"\n'
+    'dark#slurp\n'
+    '#else\n'
+    'light#slurp\n'
+    '#end if\n'
+    ' $mobile\n'
+)
+
+
+def test_compile_variants_dispatches_on_namespace():
+    dispatcher = compile_variants(
+        TMPL, ('theme', 'mobile'), (('dark', True), ('light', False)),
+    )
+    for theme in ('dark', 'light'):
+        for mobile in (True, False):
+            ns = {'theme': theme, 'mobile': mobile}
+            assert dispatcher(ns).respond() == f'{theme} {mobile}\n'
+
+    assert dispatcher.select({'theme': 'dark', 'mobile': True}) is not (
+        dispatcher.generic
+    )
+    assert dispatcher.select({'theme': 'dark', 'mobile': False}) is (
+        dispatcher.generic
+    )
+
+
+def test_compile_variants_fallback():
+    dispatcher = compile_variants(TMPL, ('theme', 'mobile'), (('dark', 1),))
+    # `True == 1`, but it renders differently
+    assert dispatcher.select({'theme': 'dark', 'mobile': True}) is (
+        dispatcher.generic
+    )
+    assert dispatcher.select({'theme': 'dark'}) is dispatcher.generic
+    assert dispatcher.select({'theme': [], 'mobile': 1}) is dispatcher.generic
+    assert dispatcher.select() is dispatcher.generic
+    assert dispatcher({'theme': 'dark', 'mobile': 1}).respond() == 'dark 1\n'
+    assert dispatcher.select({'theme': bytearray(), 'mobile': 1}) is (
+        dispatcher.generic
+    )
+
+
+def test_compile_variants_unhashable_constants():
+    dispatcher = compile_variants(
+        '$items $options\n',
+        ('items', 'options'),
+        (([1, 2], {'a': [3], 'b': {4}}), ([], {})),
+    )
+    ns = {'items': [1, 2], 'options': {'a': [3], 'b': {4}}}
+    assert dispatcher.select(ns) is not dispatcher.generic
+    assert dispatcher(ns).respond() == (
+        '[1, 2] {&#39;a&#39;: [3], &#39;b&#39;: {4}}\n'
+    )
+    assert dispatcher.select({'items': [], 'options': {}}) is not (
+        dispatcher.generic
+    )
+    for items, options in (
+            ((1, 2), {'a': [3], 'b': {4}}),
+            ([1, 2], {'b': {4}, 'a': [3]}),
+            ([1, 2], {'a': [3], 'b': frozenset({4})}),
+    ):
+        ns = {'items': items, 'options': options}
+        assert dispatcher.select(ns) is dispatcher.generic
@@ -0,0 +1,71 @@
+from Cheetah import template_finder
+from Cheetah.template_finder import find_module_file
+from Cheetah.template_finder import find_template_source
+from Cheetah.template_finder import is_partial_template_module
+from Cheetah.template_finder import partial_template_names
+
+
+def test_find_template_source(tmpdir):
+    tmpdir.join('pkg/base.tmpl').write('hello', ensure=True)
+    search_path = (tmpdir.strpath,)
+    assert find_template_source('pkg.base', search_path) == 'hello'
+    assert find_template_source('pkg.other', search_path) is None
+
+
+def test_find_module_file_relative():
+    assert find_module_file('.partial_template', '.tmpl') is None
+
+
+def test_is_partial_template_module_tmpl():
+    assert is_partial_template_module('testing.templates.src.partial_template')
+    assert not is_partial_template_module('testing.templates.src.super_base')
+
+
+def test_is_partial_template_module_compiled(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    tmpdir.join('compiled_partial.py').write(
+        'from Cheetah.partial_template import YelpCheetahTemplate as Base\n',
+    )
+    assert is_partial_template_module('compiled_partial')
+    assert not is_partial_template_module('Cheetah.compile')
+    assert not is_partial_template_module('does.not.exist')
+
+
+def test_cache_clear(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    tmpdir.join('becomes_partial.tmpl').write('hello')
+    assert not is_partial_template_module('becomes_partial')
+    tmpdir.join('becomes_partial.tmpl').write(
+        '#extends Cheetah.partial_template\n',
+    )
+    assert not is_partial_template_module('becomes_partial')
+    template_finder.cache_clear()
+    assert is_partial_template_module('becomes_partial')
+
+
+def test_partial_template_names(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    tmpdir.join('partial.tmpl').write(
+        '#extends Cheetah.partial_template\n'
+        '#from os.path import basename\n'
+        '#def render(x)\n$x\n#end def\n'
+        '#block b\n#end block\n',
+    )
+    tmpdir.join('broken_partial.tmpl').write(
+        '#extends Cheetah.partial_template\n#end if\n',
+    )
+    tmpdir.join('compiled_partial.py').write(
+        'from Cheetah.partial_template import YelpCheetahTemplate as Base\n'
+        'x = 1\n'
+        'class YelpCheetahTemplate(Base):\n'
+        '    def render(self): pass\n'
+        '    y = 2\n',
+    )
+    tmpdir.join('no_class_partial.py').write(
+        'from Cheetah.partial_template import YelpCheetahTemplate as Base\n',
+    )
+    assert partial_template_names('partial') == {'render', 'b'}
+    assert partial_template_names('broken_partial') == frozenset()
+    assert partial_template_names('compiled_partial') == {'render'}
+    assert partial_template_names('no_class_partial') == frozenset()
+    assert partial_template_names('Cheetah.compile') is None
@@ -0,0 +1,106 @@
+import gc
+
+import pytest
+
+from Cheetah.compile_cache import CompileCache
+from Cheetah.legacy_compiler import LegacyCompiler
+from Cheetah.template_loader import TemplateLoader
+
+
+@pytest.fixture
+def no_compiles(monkeypatch):
+    def no_compiles():
+        monkeypatch.setattr(LegacyCompiler, 'getModuleCode', None)
+    yield no_compiles
+
+
+def test_from_source_deduplicates(no_compiles):
+    loader = TemplateLoader()
+    cls = loader.from_source('Hello $name')
+    no_compiles()
+    assert loader.from_source('Hello $name') is cls
+    assert cls(namespace={'name': 'world'}).respond() == 'Hello world'
+    stats = loader.stats()
+    assert (stats.hits, stats.misses, stats.cached, stats.alive) == (1, 1, 1, 1)
+    assert stats.code_bytes > 0
+
+
+def test_from_source_compile_kwargs():
+    loader = TemplateLoader(constants={'locale': 'fr'})
+    assert loader.from_source('$locale')().respond() == 'fr'
+    with pytest.raises(TypeError):
+        loader.from_source(b'bytes')
+
+
+def test_from_source_uses_compile_cache(no_compiles):
+    cache = CompileCache()
+    TemplateLoader(cache=cache).from_source('hi')
+    no_compiles()
+    assert TemplateLoader(cache=cache).from_source('hi')().respond() == 'hi'
+
+
+def test_lru_and_weak_references():
+    loader = TemplateLoader(maxsize=2)
+    a = loader.from_source('a')
+    loader.from_source('b')
+    loader.from_source('c')
+    gc.collect()
+    stats = loader.stats()
+    # `a` is evicted but still used, `b` is evicted and collected
+    assert (stats.evictions, stats.cached, stats.alive) == (1, 2, 3)
+
+    instance = a()
+    del a
+    gc.collect()
+    assert loader.from_source('a') is type(instance)
+    gc.collect()
+    stats = loader.stats()
+    assert (stats.hits, stats.misses, stats.evictions) == (1, 3, 2)
+    assert (stats.cached, stats.alive) == (2, 2)
+
+    del instance
+    loader.clear()
+    gc.collect()
+    assert loader.stats()[3:] == (0, 0, 0)
+
+
+def test_load(tmpdir, no_compiles):
+    template = tmpdir.join('pkg/welcome.tmpl')
+    template.write('Welcome $name', ensure=True)
+    loader = TemplateLoader((tmpdir.strpath,))
+    cls = loader.load('pkg.welcome')
+    assert cls(namespace={'name': 'x'}).respond() == 'Welcome x'
+    assert loader.load('pkg.welcome') is cls
+    # another template with the same source
+    tmpdir.join('copy.tmpl').write('Welcome $name')
+    no_compiles()
+    assert loader.load('copy') is cls
+    assert loader.stats()[:2] == (2, 1)
+
+
+def test_load_changed(tmpdir):
+    template = tmpdir.join('t.tmpl')
+    template.write('before')
+    loader = TemplateLoader((tmpdir.strpath,))
+    assert loader.load('t')().respond() == 'before'
+    template.write('after!')
+    assert loader.load('t')().respond() == 'after!'
+    loader.clear()
+    assert loader.load('t')().respond() == 'after!'
+
+
+def test_load_collected(tmpdir):
+    tmpdir.join('t.tmpl').write('t')
+    loader = TemplateLoader((tmpdir.strpath,), maxsize=0)
+    loader.load('t')
+    gc.collect()
+    # the file is unchanged but its class is gone
+    assert loader.load('t')().respond() == 't'
+    assert loader.stats()[:3] == (0, 2, 2)
+
+
+def test_load_missing(tmpdir):
+    with pytest.raises(ModuleNotFoundError):
+        TemplateLoader((tmpdir.strpath,)).load('missing')
+    with pytest.raises(ModuleNotFoundError):
+        TemplateLoader((tmpdir.strpath,)).load('.relative')
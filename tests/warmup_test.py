@@ -0,0 +1,53 @@
+import gc
+import subprocess
+import sys
+
+import pytest
+
+import testing.templates.src
+from Cheetah.warmup import warmup
+
+
+@pytest.fixture
+def unfreeze():
+    try:
+        yield
+    finally:
+        gc.unfreeze()
+
+
+def test_warmup(unfreeze):
+    result = warmup(
+        (testing.templates.src,),
+        namespaces={'testing.templates.src.super_child': {}},
+    )
+    # the package's modules are all compiled templates
+    assert result.modules == result.templates == 8
+    assert result.rendered == 1
+    assert result.frozen > 0
+    assert result.seconds > 0
+
+
+def test_warmup_without_freezing():
+    result = warmup((testing.templates,), freeze=False)
+    assert result.modules > result.templates == 8
+    assert result.frozen == 0
+
+
+def test_warmup_unknown_namespaces():
+    with pytest.raises(ValueError) as excinfo:
+        warmup(
+            (testing.templates.src,),
+            namespaces={'testing.templates.src.missing': {}},
+            freeze=False,
+        )
+    assert str(excinfo.value) == 'Not templates: testing.templates.src.missing'
+
+
+def test_warmup_does_not_need_the_testing_extra():
+    subprocess.check_call((
+        sys.executable, '-c',
+        'import sys\n'
+        'import Cheetah.warmup\n'
+        'assert "Cheetah.testing" not in sys.modules, sys.modules\n',
+    ))
@@ -0,0 +1,209 @@
+import os.path
+import sys
+import threading
+from unittest import mock
+
+import pytest
+
+from Cheetah import watch
+from Cheetah.watch import Dependencies
+from Cheetah.watch import get_watcher
+from Cheetah.watch import InotifyWatcher
+from Cheetah.watch import PollingWatcher
+from Cheetah.watch import walk_templates
+
+
+@pytest.fixture
+def watched(tmpdir):
+    tmpdir.join('a.tmpl').write('a')
+    tmpdir.join('sub/b.tmpl').write('b', ensure=True)
+    tmpdir.join('sub/b.py').write('')
+    yield tmpdir
+
+
+def test_walk_templates(watched):
+    assert sorted(walk_templates((watched.strpath,))) == [
+        watched.join('a.tmpl').strpath, watched.join('sub/b.tmpl').strpath,
+    ]
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='inotify')
+def test_inotify_watcher(watched):
+    watcher = InotifyWatcher((watched.strpath,))
+    try:
+        changes = watcher.changes()
+        watched.join('sub/b.tmpl').write('bb')
+        watched.join('sub/b.py').write('ignored')
+        assert next(changes) == {watched.join('sub/b.tmpl').strpath}
+
+        # editors often save by renaming a temporary file
+        watched.join('a.tmpl.swp').write('aa')
+        watched.join('a.tmpl.swp').rename(watched.join('a.tmpl'))
+        assert next(changes) == {watched.join('a.tmpl').strpath}
+
+        # new directories are watched, with their templates
+        watched.join('tmp/c.tmpl').write('c', ensure=True)
+        watched.join('tmp').rename(watched.join('new'))
+        assert next(changes) == {watched.join('new/c.tmpl').strpath}
+        watched.join('new/d.tmpl').write('d')
+        assert next(changes) == {watched.join('new/d.tmpl').strpath}
+    finally:
+        watcher.close()
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='inotify')
+def test_inotify_watcher_only_yields_templates(watched):
+    watcher = InotifyWatcher((watched.strpath,))
+    timer = threading.Timer(.1, watched.join('a.tmpl').write, ('aa',))
+    try:
+        watched.join('sub/b.py').write('ignored')
+        timer.start()
+        assert next(watcher.changes()) == {watched.join('a.tmpl').strpath}
+    finally:
+        timer.join()
+        watcher.close()
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='inotify')
+def test_inotify_watcher_batches_changes(watched, monkeypatch):
+    monkeypatch.setattr(watch, 'SETTLE_TIME', .3)
+    watcher = InotifyWatcher((watched.strpath,))
+    timer = threading.Timer(.1, watched.join('a.tmpl').write, ('aa',))
+    try:
+        watched.join('sub/b.tmpl').write('bb')
+        timer.start()
+        assert next(watcher.changes()) == {
+            watched.join('a.tmpl').strpath, watched.join('sub/b.tmpl').strpath,
+        }
+    finally:
+        timer.join()
+        watcher.close()
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='inotify')
+def test_inotify_watcher_nothing_to_read(watched):
+    watcher = InotifyWatcher((watched.strpath,))
+    try:
+        assert watcher._read() == set()
+        # directories which are gone before they can be watched
+        watched.join('gone').mkdir()
+        watched.join('gone').remove()
+        assert watcher._read() == set()
+        # events of unknown watches (after an overflow) are skipped
+        watched.join('a.tmpl').write('aa')
+        watcher._directories.clear()
+        assert watcher._read() == set()
+    finally:
+        watcher.close()
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='inotify')
+def test_inotify_watcher_missing_directory(tmpdir):
+    with pytest.raises(OSError):
+        InotifyWatcher((tmpdir.strpath,))._watch(
+            tmpdir.join('missing').strpath,
+        )
+
+
+def test_inotify_watcher_init_fails(tmpdir, monkeypatch):
+    libc = mock.Mock(**{'inotify_init1.return_value': -1})
+    monkeypatch.setattr(watch.ctypes, 'CDLL', mock.Mock(return_value=libc))
+    with pytest.raises(OSError):
+        InotifyWatcher((tmpdir.strpath,))
+
+
+def test_polling_watcher(watched, monkeypatch):
+    watcher = PollingWatcher((watched.strpath,), interval=0)
+
+    sleeps = []
+
+    def sleep(interval):
+        # nothing changes during the first interval
+        sleeps.append(interval)
+        if len(sleeps) == 2:
+            watched.join('a.tmpl').write('changed size')
+            watched.join('sub/c.tmpl').write('c')
+
+    monkeypatch.setattr(watch.time, 'sleep', sleep)
+    assert next(watcher.changes()) == {
+        watched.join('a.tmpl').strpath, watched.join('sub/c.tmpl').strpath,
+    }
+    watcher.close()
+
+
+def test_polling_watcher_file_vanishes(watched):
+    watcher = PollingWatcher((watched.strpath,), interval=0)
+    real_stat = os.stat
+
+    def stat(filename):
+        if filename.endswith('a.tmpl'):
+            raise FileNotFoundError(filename)
+        return real_stat(filename)
+
+    with mock.patch.object(watch.os, 'stat', stat):
+        assert watcher._scan() == {
+            watched.join('sub/b.tmpl').strpath: mock.ANY,
+        }
+
+
+def test_get_watcher(watched, monkeypatch):
+    watcher = get_watcher((watched.strpath,))
+    assert isinstance(watcher, InotifyWatcher)
+    watcher.close()
+
+    monkeypatch.setattr(
+        watch, 'InotifyWatcher', mock.Mock(side_effect=OSError),
+    )
+    assert isinstance(get_watcher((watched.strpath,)), PollingWatcher)
+
+    monkeypatch.setattr(sys, 'platform', 'darwin')
+    assert isinstance(get_watcher((watched.strpath,)), PollingWatcher)
+
+
+def test_dependencies(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    base = tmpdir.join('pkg/base.tmpl')
+    base.write('base', ensure=True)
+    middle = tmpdir.join('pkg/middle.tmpl')
+    middle.write('#extends pkg.base\n')
+    leaf = tmpdir.join('leaf.tmpl')
+    leaf.write(
+        '#extends pkg.middle\n'
+        '#from pkg.partial import f\n'
+        '#from pkg.base import g\n',
+    )
+    imports = tmpdir.join('imports.tmpl')
+    imports.write('#import pkg.partial\n')
+    broken = tmpdir.join('broken.tmpl')
+    broken.write('$foo("#from")\n#import pkg.base\n#end if\n')
+    partial = tmpdir.join('pkg/partial.tmpl')
+    partial.write('#extends Cheetah.partial_template\n')
+    other = tmpdir.join('other.tmpl')
+    other.write('#extends Cheetah.Template\n')
+
+    dependencies = Dependencies(
+        [
+            os.path.abspath(p.strpath)
+            for p in (base, middle, leaf, other, imports, broken)
+        ],
+    )
+    assert dependencies.with_dependents([base.strpath]) == sorted(
+        (base.strpath, middle.strpath, leaf.strpath),
+    )
+    assert dependencies.with_dependents([partial.strpath]) == sorted(
+        (partial.strpath, leaf.strpath, imports.strpath),
+    )
+    assert dependencies.with_dependents([other.strpath]) == [other.strpath]
+
+    middle.write('no longer extends\n')
+    dependencies.update(middle.strpath)
+    assert dependencies.with_dependents([base.strpath]) == sorted(
+        (base.strpath, leaf.strpath),
+    )
+
+    # a removed template has no dependencies, its dependents are kept
+    middle.remove()
+    dependencies.update(middle.strpath)
+    assert dependencies.with_dependents([middle.strpath]) == sorted(
+        (middle.strpath, leaf.strpath),
+    )